@@ -0,0 +1,11 @@
+# -*- coding:utf-8 -*-
+"""
+性能基准（不属于程序本身）：
+
+    python -m benchmarks generate <目录>        # 用 ffmpeg lavfi 生成合成视频库
+    python -m benchmarks run <目录> --out a.json # 运行基准（库不存在时先生成）
+    python -m benchmarks compare a.json b.json   # 对比两次结果
+    python -m benchmarks.startup                 # 界面启动耗时（需要 PyQt6）
+
+需要在仓库根目录下运行。
+"""
@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+import sys
+import json
+import argparse
+
+from .library import DEFAULTS, generate_library, ensure_library
+from .suite import (
+    BENCHMARKS, CACHE_RECORDS, TABLE_ROWS, PROBE_FILES, COMPRESS_FILES,
+    log, run_benchmarks, make_report, compare_reports, load_report,
+)
+
+
+def _add_library_options(p):
+    p.add_argument("library", help="合成视频库目录")
+    p.add_argument("--tiny", type=int, default=DEFAULTS["tiny"], help="小文件数")
+    p.add_argument("--long", type=int, default=DEFAULTS["long"], help="长视频数")
+    p.add_argument("--long-secs", type=int, default=DEFAULTS["long_secs"], help="长视频时长（秒）")
+    p.add_argument("--depth", type=int, default=DEFAULTS["depth"], help="目录树最大深度")
+    p.add_argument("--dirs", type=int, default=DEFAULTS["dirs"], help="目录数")
+    p.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    p.add_argument("--workers", type=int, help="生成时并行的 ffmpeg 数，默认 CPU 核数")
+
+
+def _library_params(args):
+    return {key: getattr(args, key) for key in DEFAULTS}
+
+
+def cmd_generate(args):
+    manifest = generate_library(args.library, workers=args.workers, log=log, **_library_params(args))
+    log(f"合成视频库: {len(manifest['files'])} 个视频，{manifest['dirs']} 个目录，"
+         f"格式 {', '.join(manifest['formats'])}")
+    return 1 if manifest["errors"] else 0
+
+
+def cmd_run(args):
+    manifest = ensure_library(args.library, workers=args.workers, log=log, **_library_params(args))
+    results, options = run_benchmarks(
+        args.library, manifest, names=args.only, repeat=args.repeat,
+        probe_files=args.probe_files, cache_records=args.cache_records, table_rows=args.table_rows,
+        compress_files=args.compress_files, encoder=args.encoder, crf=args.crf, jobs=args.jobs,
+    )
+    report = json.dumps(make_report(args.library, manifest, results, options, args.repeat),
+                        ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        log(f"结果已写入 {args.out}")
+    else:
+        print(report)
+    return 0
+
+
+def cmd_compare(args):
+    old, new = load_report(args.old), load_report(args.new)
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    if old.get("options") != new.get("options") or old["library"]["params"] != new["library"]["params"]:
+        print("注意：两次运行的基准参数或合成库不同，结果不能直接比较")
+    for name, metric, before, after, change, better in compare_reports(old, new):
+        mark = {True: "+", False: "-", None: " "}[better] if abs(change) >= args.threshold else " "
+        print(f"{mark} {name + '.' + metric:<32} {before:>14.4f} {after:>14.4f} {change:>+8.1f}%")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmarks", description="videocore 性能基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="生成（或补齐）合成视频库")
+    _add_library_options(p)
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("run", help="运行基准，输出 JSON")
+    _add_library_options(p)
+    p.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="只运行这几项")
+    p.add_argument("--repeat", type=int, default=3, help="每项重复次数，结果取中位数")
+    p.add_argument("--out", help="结果写入该文件（默认打印到标准输出）")
+    p.add_argument("--probe-files", type=int, default=PROBE_FILES, help="探测延迟测多少个文件")
+    p.add_argument("--cache-records", type=int, default=CACHE_RECORDS, help="缓存基准的记录数")
+    p.add_argument("--table-rows", type=int, default=TABLE_ROWS, help="表格基准的行数")
+    p.add_argument("--compress-files", type=int, default=COMPRESS_FILES, help="压缩基准的文件数")
+    p.add_argument("--encoder", default="libx264")
+    p.add_argument("--crf", type=int, default=28)
+    p.add_argument("--jobs", type=int, default=2, help="压缩并发数")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="对比两次结果（+ 变好，- 变差）")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=5.0, help="变化小于该百分比时不标记")
+    p.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# -*- coding:utf-8 -*-
+"""
+合成视频库：用 ffmpeg 的 lavfi 测试源生成，不需要真实素材。
+  tiny/  大量 1~3 秒的小文件，覆盖多种编码/容器，分布在较深的目录树里
+  long/  少量长视频（默认超过分段编码的时长门槛）
+同样的参数和 seed 生成同样的库；已生成的文件会复用，只补齐缺少的。
+"""
+import os
+import json
+import random
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST = "library.json"
+LIBRARY_VERSION = 1
+
+# 名称, 扩展名, 视频编码参数, 音频编码参数
+FORMATS = [
+    ("h264_mp4", ".mp4", ["-c:v", "libx264", "-preset", "ultrafast"], ["-c:a", "aac", "-b:a", "64k"]),
+    ("h264_mov", ".mov", ["-c:v", "libx264", "-preset", "ultrafast"], ["-c:a", "aac", "-b:a", "64k"]),
+    ("h264_ts", ".ts", ["-c:v", "libx264", "-preset", "ultrafast"], ["-c:a", "aac", "-b:a", "64k"]),
+    ("hevc_mkv", ".mkv", ["-c:v", "libx265", "-preset", "ultrafast", "-x265-params", "log-level=error"],
+     ["-c:a", "aac", "-b:a", "64k"]),
+    ("vp9_webm", ".webm", ["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "300k"],
+     ["-c:a", "libopus", "-b:a", "48k"]),
+    ("av1_mkv", ".mkv", ["-c:v", "libaom-av1", "-cpu-used", "8", "-crf", "40", "-b:v", "0"], ["-c:a", "flac"]),
+    ("mpeg4_avi", ".avi", ["-c:v", "mpeg4", "-q:v", "5"], ["-c:a", "ac3", "-b:a", "96k"]),
+    ("mpeg2_mpg", ".mpg", ["-c:v", "mpeg2video", "-q:v", "5"], ["-c:a", "mp2", "-b:a", "128k"]),
+    ("wmv2_wmv", ".wmv", ["-c:v", "wmv2", "-q:v", "5"], ["-c:a", "wmav2", "-b:a", "64k"]),
+    ("flv1_flv", ".flv", ["-c:v", "flv", "-q:v", "5"], ["-c:a", "aac", "-b:a", "64k"]),
+]
+LONG_FORMATS = ("h264_mp4", "hevc_mkv")
+SOURCES = ("testsrc2", "smptehdbars", "mandelbrot", "life", "cellauto")
+TINY_SIZES = ((160, 90), (320, 180), (426, 240))
+LONG_SIZE = (320, 180)
+TINY_SECS = (1.0, 3.0)
+EXTRA_FILES = ("cover.jpg", "readme.txt", "movie.nfo")  # 混在目录里的非视频文件
+
+DEFAULTS = {
+    "tiny": 300,
+    "long": 2,
+    "long_secs": 1500,  # 默认超过 CHUNK_MIN_SECS，长视频会走分段编码
+    "depth": 8,
+    "dirs": 60,
+    "seed": 1,
+}
+
+
+def ffmpeg_version():
+    try:
+        out = subprocess.run(["ffmpeg", "-hide_banner", "-version"], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    return out.splitlines()[0] if out else None
+
+
+def available_encoders():
+    try:
+        out = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    except OSError:
+        return set()
+    names = set()
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            names.add(parts[1])
+    return names
+
+
+def _codecs(args):
+    return {args[i + 1] for i, a in enumerate(args) if a in ("-c:v", "-c:a")}
+
+
+def usable_formats():
+    """
+    本机 ffmpeg 能生成的格式（缺编码器的跳过）
+    """
+    encoders = available_encoders()
+    return [f for f in FORMATS if _codecs(f[2] + f[3]) <= encoders]
+
+
+def build_tree(rng, dirs, depth):
+    """
+    相对目录列表：先保证一条满深度的链，其余随机挂在深度未满的目录下
+    """
+    tree = [""]
+    for level in range(depth):
+        tree.append(os.path.join(tree[-1], f"d{level:02d}"))
+    while len(tree) < dirs + 1:
+        parent = rng.choice([d for d in tree if d.count(os.sep) + 1 < depth] or [""])
+        tree.append(os.path.join(parent, f"d{len(tree):03d}"))
+    return tree
+
+
+def plan_library(tiny=DEFAULTS["tiny"], long=DEFAULTS["long"], long_secs=DEFAULTS["long_secs"],
+                 depth=DEFAULTS["depth"], dirs=DEFAULTS["dirs"], seed=DEFAULTS["seed"], formats=None):
+    """
+    只生成文件清单（相对路径与生成参数），不调用 ffmpeg
+    """
+    rng = random.Random(seed)
+    formats = formats if formats is not None else usable_formats()
+    if not formats:
+        raise RuntimeError("本机 ffmpeg 没有可用的编码器，无法生成合成视频库")
+    tree = build_tree(rng, dirs, depth)
+    files = []
+    for i in range(tiny):
+        name, ext, vargs, aargs = formats[i % len(formats)]
+        w, h = rng.choice(TINY_SIZES)
+        files.append({
+            "path": os.path.join("tiny", rng.choice(tree), f"clip_{i:05d}{ext}"),
+            "kind": "tiny",
+            "format": name,
+            "source": rng.choice(SOURCES),
+            "width": w,
+            "height": h,
+            "fps": rng.choice((24, 25, 30)),
+            "duration": round(rng.uniform(*TINY_SECS), 2),
+            "tone": rng.randrange(200, 2000),
+        })
+    by_name = {f[0]: f for f in formats}
+    long_formats = [by_name[n] for n in LONG_FORMATS if n in by_name] or formats[:1]
+    for i in range(long):
+        name, ext, _, _ = long_formats[i % len(long_formats)]
+        files.append({
+            "path": os.path.join("long", f"long_{i:02d}{ext}"),
+            "kind": "long",
+            "format": name,
+            "source": SOURCES[i % len(SOURCES)],
+            "width": LONG_SIZE[0],
+            "height": LONG_SIZE[1],
+            "fps": 25,
+            "duration": float(long_secs),
+            "tone": 440,
+        })
+    extras = [os.path.join("tiny", d, rng.choice(EXTRA_FILES)) for d in tree[::3]]
+    return files, extras
+
+
+def _encode_cmd(spec, fmt, dst):
+    _, _, vargs, aargs = fmt
+    src = f"{spec['source']}=size={spec['width']}x{spec['height']}:rate={spec['fps']}"
+    return [
+        "ffmpeg", "-hide_banner", "-nostdin", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", src,
+        "-f", "lavfi", "-i", f"sine=frequency={spec['tone']}:sample_rate=48000",
+        "-t", str(spec["duration"]),
+        "-map", "0:v", "-map", "1:a",
+        *vargs, "-pix_fmt", "yuv420p", *aargs, "-ac", "2",
+        dst,
+    ]
+
+
+def _generate_one(root, spec, fmt):
+    dst = os.path.join(root, spec["path"])
+    if os.path.exists(dst):
+        return spec["path"], None
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    base, ext = os.path.splitext(dst)
+    tmp = f"{base}.partial{ext}"  # 保留扩展名，ffmpeg 按它选封装格式
+    r = subprocess.run(_encode_cmd(spec, fmt, tmp), capture_output=True, text=True)
+    if r.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return spec["path"], r.stderr.strip()[-500:] or f"ffmpeg 退出码 {r.returncode}"
+    os.replace(tmp, dst)
+    return spec["path"], None
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def generate_library(root, workers=None, log=print, **params):
+    """
+    生成（或补齐）合成视频库，返回清单；参数见 DEFAULTS
+    """
+    params = {**DEFAULTS, **params}
+    formats = usable_formats()
+    by_name = {f[0]: f for f in formats}
+    skipped = [f[0] for f in FORMATS if f[0] not in by_name]
+    if skipped:
+        log(f"本机 ffmpeg 缺少编码器，跳过格式: {', '.join(skipped)}")
+    files, extras = plan_library(formats=formats, **params)
+
+    root = os.path.abspath(root)
+    os.makedirs(root, exist_ok=True)
+    missing = [s for s in files if not os.path.exists(os.path.join(root, s["path"]))]
+    if missing:
+        log(f"生成 {len(missing)} 个视频（共 {len(files)} 个）...")
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for path, err in pool.map(lambda s: _generate_one(root, s, by_name[s["format"]]), missing):
+            if err:
+                errors[path] = err
+                log(f"生成失败 {path}: {err}")
+    for rel in extras:
+        path = os.path.join(root, rel)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("not a video\n")
+
+    for spec in files:
+        path = os.path.join(root, spec["path"])
+        spec["size"] = os.path.getsize(path) if os.path.exists(path) else 0
+    manifest = {
+        "version": LIBRARY_VERSION,
+        "params": params,
+        "ffmpeg": ffmpeg_version(),
+        "formats": sorted(by_name),
+        "dirs": len({os.path.dirname(s["path"]) for s in files}),
+        "files": [s for s in files if s["path"] not in errors],
+        "extras": extras,
+        "errors": errors,
+    }
+    with open(os.path.join(root, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def ensure_library(root, workers=None, log=print, **params):
+    """
+    清单存在且参数一致、文件齐全时直接复用，否则生成
+    """
+    manifest = load_manifest(root)
+    if (manifest and manifest.get("version") == LIBRARY_VERSION
+            and manifest.get("params") == {**DEFAULTS, **params}
+            and all(os.path.exists(os.path.join(root, s["path"])) for s in manifest["files"])):
+        return manifest
+    return generate_library(root, workers=workers, log=log, **params)
+
+
+def fake_info(i, rng):
+    """
+    一条与 analyze_video 结构相同的假记录（缓存/表格规模测试用，不对应真实文件）
+    """
+    duration = rng.uniform(30, 7200)
+    size = int(duration * rng.uniform(50_000, 1_500_000))
+    size_mb = size / 1024 / 1024
+    path = os.path.join(os.sep, "library", f"d{i // 500:04d}", f"video_{i:07d}.mkv")
+    return {
+        "name": os.path.basename(path),
+        "path": path,
+        "size": size,
+        "mtime": 1_700_000_000 + i,
+        "duration": duration,
+        "size_mb": round(size_mb, 2),
+        "mb_per_min": round(size_mb / (duration / 60), 2),
+        "audio_cnt": rng.randint(1, 3),
+        "sub_cnt": rng.randint(0, 4),
+        "codec": rng.choice(["h264", "hevc", "mpeg4", "vp9", "av1", "wmv3"]),
+        "bitrate_kbps": int(size * 8 / duration / 1000),
+        "width": 1920,
+        "height": 1080,
+        "compress_score": rng.randint(0, 100),
+        "save_pct": rng.randint(0, 70),
+    }
+
+
+def fake_infos(count, seed=0):
+    rng = random.Random(seed)
+    return [fake_info(i, rng) for i in range(count)]
@@ -0,0 +1,118 @@
+# -*- coding:utf-8 -*-
+"""
+启动基准：在临时目录里造 N 条分析记录的缓存，分别测量
+  first_paint  进程启动到主窗口第一次收到 Paint 事件
+  full_table   进程启动到后台历史加载完、表格行数达到 N
+每次都新开一个解释器，import 的耗时也算在内。
+
+用法：python -m benchmarks.startup [--sizes 10000 100000] [--repeat 3]
+结果以 JSON 打印到标准输出。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+from videocore.cache import SqliteCache, CACHE_DB
+from .library import fake_infos
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD_TIMEOUT = 600  # 秒，单次启动超过该时间视为失败
+
+
+def build_cache(workdir, count):
+    with SqliteCache(os.path.join(workdir, CACHE_DB), migrate_from=None) as cache:
+        for info in fake_infos(count, seed=count):
+            cache[info["path"]] = info
+
+
+def run_child(count):
+    """
+    子进程：启动界面，记录首次绘制与表格填满的时间点（time.time()）后退出
+    """
+    from PyQt6.QtCore import QObject, QEvent, QTimer
+    from PyQt6.QtWidgets import QApplication
+    import videomanager
+
+    marks = {"imported": time.time()}
+
+    class PaintProbe(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint and "first_paint" not in marks:
+                marks["first_paint"] = time.time()
+                # 首次绘制时还没加载的模块：验证延迟导入确实生效
+                marks["deferred"] = [m for m in ("psutil", "videocore.predict", "videocore.encode") if m not in sys.modules]
+            return False
+
+    app = QApplication(sys.argv[:1])
+    win = videomanager.VideoScanner()
+    probe = PaintProbe()
+    win.installEventFilter(probe)
+    win.show()
+
+    def poll():
+        if "first_paint" in marks and win.model.rowCount() >= count:
+            marks["full_table"] = time.time()
+            marks["rows"] = win.model.rowCount()
+            win.close()
+            app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(5)
+    app.exec()
+    print(json.dumps(marks))
+
+
+def measure(count, repeat):
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="vm_startup_") as workdir:
+        started = time.monotonic()
+        build_cache(workdir, count)
+        build_secs = time.monotonic() - started
+        env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"),
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        for _ in range(repeat):
+            t0 = time.time()
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--child", str(count)],
+                cwd=workdir, env=env, capture_output=True, text=True, timeout=CHILD_TIMEOUT, check=True,
+            ).stdout
+            marks = json.loads(out.strip().splitlines()[-1])
+            runs.append({
+                "import": marks["imported"] - t0,
+                "first_paint": marks["first_paint"] - t0,
+                "full_table": marks["full_table"] - t0,
+                "rows": marks["rows"],
+                "deferred_modules": marks["deferred"],
+            })
+    return {
+        "videos": count,
+        "build_cache_secs": round(build_secs, 3),
+        "runs": runs,
+        "median": {key: round(statistics.median(r[key] for r in runs), 4)
+                   for key in ("import", "first_paint", "full_table")},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="界面启动基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="缓存记录数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模启动几次")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child is not None:
+        run_child(args.child)
+        return 0
+    results = [measure(count, args.repeat) for count in args.sizes]
+    print(json.dumps({"benchmark": "startup", "python": sys.version.split()[0], "results": results},
+                     ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+# -*- coding:utf-8 -*-
+"""
+基准测试：扫描吞吐、单文件探测延迟、缓存读写、表格填充、短视频压缩。
+每项在独立的临时工作目录里运行（缓存、任务队列、遥测都写在当前目录），
+结果是 JSON，可以保存下来在版本之间用 compare 对比。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import statistics
+import subprocess
+import tempfile
+
+from videocore.cache import CACHE_BACKENDS, load_cache, save_cache
+from videocore.probe import probe_media, clear_probe_memo
+from videocore.scan import SCAN_WORKERS, ScanThread
+from .library import ffmpeg_version, fake_infos
+
+RESULTS_VERSION = 1
+CACHE_RECORDS = 100_000
+CACHE_LOOKUPS = 2000
+TABLE_ROWS = 100_000
+TABLE_SINGLE_ROWS = 2000  # 逐行 add_video 的行数（界面扫描时就是这样一条条加进来的）
+PROBE_FILES = 200
+COMPRESS_FILES = 4
+
+
+class BenchmarkSkipped(Exception):
+    """
+    本机环境不满足（缺 ffmpeg / PyQt6 等），该项记为跳过
+    """
+
+
+def log(msg):
+    print(f"[{time.strftime('%H:%M:%S')}] {msg}", file=sys.stderr, flush=True)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _require_ffmpeg():
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        raise BenchmarkSkipped("找不到 ffmpeg / ffprobe")
+
+
+def _library_paths(ctx, kind=None):
+    return [os.path.join(ctx["library"], s["path"]) for s in ctx["manifest"]["files"]
+            if kind is None or s["kind"] == kind]
+
+
+def bench_scan(ctx):
+    """
+    ScanThread 扫描整个合成库：冷扫描（空缓存、无探测记忆）和紧接着的热扫描（目录索引命中）
+    """
+    _require_ffmpeg()
+    result = {}
+    for phase in ("cold", "warm"):
+        if phase == "cold":
+            clear_probe_memo()
+        stats = {}
+        scan = ScanThread(ctx["library"], workers=ctx["options"]["scan_workers"])
+        scan.scan_finished.connect(stats.update)
+        scan.run()
+        result[f"{phase}_secs"] = stats["seconds"]
+        result[f"{phase}_files_per_sec"] = stats["files_per_sec"]
+        result["files"] = stats["files"]
+        result["videos"] = stats["videos"]
+    return result
+
+
+def bench_probe(ctx):
+    """
+    逐个文件 probe_media 的延迟（每次都真正调用 ffprobe）
+    """
+    _require_ffmpeg()
+    paths = _library_paths(ctx)
+    random.Random(0).shuffle(paths)
+    latencies = []
+    for path in paths[:ctx["options"]["probe_files"]]:
+        started = time.perf_counter()
+        probe_media(path, refresh=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "files": len(latencies),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "max_ms": max(latencies, default=0.0),
+    }
+
+
+def bench_cache(ctx):
+    """
+    load_cache / save_cache 在大规模记录下的写入、全量读出、随机查找和增量更新
+    """
+    count = ctx["options"]["cache_records"]
+    infos = fake_infos(count)
+    rng = random.Random(0)
+    result = {"records": count}
+    for backend in CACHE_BACKENDS:
+        started = time.perf_counter()
+        cache = load_cache(backend)
+        for info in infos:
+            cache[info["path"]] = info
+        save_cache(cache)
+        cache.close()
+        result[f"{backend}_write_secs"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with load_cache(backend) as cache:
+            loaded = sum(1 for _ in cache.values())
+        result[f"{backend}_load_secs"] = time.perf_counter() - started
+        assert loaded == count, (backend, loaded)
+
+        lookups = [rng.choice(infos)["path"] for _ in range(CACHE_LOOKUPS)]
+        with load_cache(backend) as cache:
+            started = time.perf_counter()
+            for path in lookups:
+                cache.get(path)
+            result[f"{backend}_lookup_us"] = (time.perf_counter() - started) / len(lookups) * 1e6
+
+            # 扫描时的典型写法：少量记录更新后保存
+            started = time.perf_counter()
+            for path in lookups[:count // 100 or 1]:
+                info = dict(cache[path], compress_score=50)
+                cache[path] = info
+            save_cache(cache)
+            result[f"{backend}_update_secs"] = time.perf_counter() - started
+    return result
+
+
+def bench_plan(ctx):
+    """
+    plan_compress 给大量候选排序、按时长/节省预算截取的耗时
+    """
+    from videocore.planner import plan_compress
+    count = ctx["options"]["cache_records"]
+    infos = fake_infos(count)
+    result = {"candidates": count}
+    budgets = {"all": {}, "hours": {"budget_secs": 8 * 3600}, "bytes": {"budget_bytes": 2 * 1024 ** 4}}
+    for name, budget in budgets.items():
+        started = time.perf_counter()
+        selected, _, _ = plan_compress(infos, "libx265", 23, profile={}, cores=16, **budget)
+        result[f"{name}_secs"] = time.perf_counter() - started
+        result[f"{name}_selected"] = len(selected)
+    return result
+
+
+def bench_table(ctx):
+    """
+    界面表格模型的填充：一次性批量插入、逐行 add_video、已有行原地刷新
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication
+        from videomanager import VideoTableModel, VideoFilterProxy
+    except ImportError as e:
+        raise BenchmarkSkipped(f"无法加载界面: {e}")
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    count = ctx["options"]["table_rows"]
+    infos = fake_infos(count + TABLE_SINGLE_ROWS)
+    model = VideoTableModel()
+    proxy = VideoFilterProxy()
+    proxy.setSourceModel(model)
+    proxy.sort(-1)
+
+    started = time.perf_counter()
+    model.add_videos(infos[:count])
+    bulk = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for info in infos[count:]:
+        model.add_videos([info])
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model.add_videos(infos[:count // 10])
+    refresh = time.perf_counter() - started
+    app.processEvents()
+    assert model.rowCount() == len(infos)
+    return {
+        "rows": count,
+        "bulk_secs": bulk,
+        "bulk_rows_per_sec": count / max(bulk, 1e-9),
+        "single_add_us": single / TABLE_SINGLE_ROWS * 1e6,
+        "refresh_secs": refresh,
+    }
+
+
+def bench_compress(ctx):
+    """
+    CompressThread 压缩几个短视频（每种格式各取一个，复制到工作目录里再压）
+    """
+    _require_ffmpeg()
+    opts = ctx["options"]
+    picked = {}
+    for spec in ctx["manifest"]["files"]:
+        if spec["kind"] == "tiny":
+            picked.setdefault(spec["format"], spec)
+    specs = list(picked.values())[:opts["compress_files"]]
+    os.makedirs("src", exist_ok=True)
+    files = []
+    for spec in specs:
+        dst = os.path.join(os.getcwd(), "src", os.path.basename(spec["path"]))
+        shutil.copyfile(os.path.join(ctx["library"], spec["path"]), dst)
+        files.append(dst)
+
+    from videocore.encode import CompressThread
+    states = {}
+    worker = CompressThread(files, encoder=opts["encoder"], crf=opts["crf"], jobs=opts["jobs"],
+                            abort_below_pct=None)
+    worker.job_state.connect(lambda src, state: states.__setitem__(src, state))
+    outputs = {}
+    worker.output_ready.connect(lambda src, dst: outputs.__setitem__(src, dst))
+    started = time.perf_counter()
+    worker.run()
+    elapsed = time.perf_counter() - started
+    worker.job_queue.close()
+
+    media_secs = sum(s["duration"] for s in specs)
+    in_bytes = sum(os.path.getsize(f) for f in files)
+    out_bytes = sum(os.path.getsize(d) for d in outputs.values() if os.path.exists(d))
+    return {
+        "files": len(files),
+        "done": sum(1 for s in states.values() if s == "done"),
+        "failed": sum(1 for s in states.values() if s == "failed"),
+        "secs": elapsed,
+        "media_secs_per_sec": media_secs / max(elapsed, 1e-9),
+        "out_in_ratio": out_bytes / in_bytes if in_bytes else 0.0,
+    }
+
+
+BENCHMARKS = {
+    "scan": bench_scan,
+    "probe": bench_probe,
+    "cache": bench_cache,
+    "plan": bench_plan,
+    "table": bench_table,
+    "compress": bench_compress,
+}
+
+
+def _summarize(runs):
+    keys = [k for k, v in runs[0].items() if isinstance(v, (int, float))]
+    return {k: statistics.median(r[k] for r in runs) for k in keys}
+
+
+def run_benchmarks(library, manifest, names=None, repeat=3, **options):
+    """
+    依次运行各项基准，每项重复 repeat 次，返回 {名称: {"runs": [...], "median": {...}}}
+    """
+    options = {
+        "scan_workers": SCAN_WORKERS,
+        "probe_files": PROBE_FILES,
+        "cache_records": CACHE_RECORDS,
+        "table_rows": TABLE_ROWS,
+        "compress_files": COMPRESS_FILES,
+        "encoder": "libx264",
+        "crf": 28,
+        "jobs": 2,
+        **options,
+    }
+    ctx = {"library": os.path.abspath(library), "manifest": manifest, "options": options}
+    results = {}
+    cwd = os.getcwd()
+    for name in names or BENCHMARKS:
+        runs = []
+        for i in range(repeat):
+            log(f"{name} {i + 1}/{repeat}")
+            with tempfile.TemporaryDirectory(prefix=f"vm_bench_{name}_") as workdir:
+                os.chdir(workdir)
+                try:
+                    runs.append(BENCHMARKS[name](ctx))
+                except BenchmarkSkipped as e:
+                    log(f"{name} 跳过: {e}")
+                    results[name] = {"skipped": str(e)}
+                    break
+                finally:
+                    os.chdir(cwd)
+        else:
+            results[name] = {"runs": runs, "median": _summarize(runs)}
+    return results, options
+
+
+def _git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        r = subprocess.run(["git", "-C", root, "describe", "--always", "--dirty"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return r.stdout.strip() or None
+
+
+def make_report(library, manifest, results, options, repeat):
+    files = manifest["files"]
+    return {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version(),
+        "library": {
+            "root": os.path.abspath(library),
+            "params": manifest["params"],
+            "formats": manifest["formats"],
+            "files": len(files),
+            "bytes": sum(s["size"] for s in files),
+            "media_secs": sum(s["duration"] for s in files),
+        },
+        "repeat": repeat,
+        "options": options,
+        "benchmarks": results,
+    }
+
+
+# 指标名后缀 -> 数值越大越好？
+_HIGHER_IS_BETTER = ("_per_sec",)
+_LOWER_IS_BETTER = ("_secs", "_ms", "_us", "_ratio")
+
+
+def compare_reports(old, new):
+    """
+    两份结果逐项对比，返回 [(基准, 指标, 旧值, 新值, 变化百分比, 是否变好)]
+    """
+    rows = []
+    for name, new_res in new["benchmarks"].items():
+        old_res = old["benchmarks"].get(name) or {}
+        for metric, value in (new_res.get("median") or {}).items():
+            before = (old_res.get("median") or {}).get(metric)
+            if before is None:
+                continue
+            change = (value - before) / before * 100 if before else 0.0
+            if metric.endswith(_HIGHER_IS_BETTER):
+                better = change > 0
+            elif metric.endswith(_LOWER_IS_BETTER):
+                better = change < 0
+            else:
+                better = None
+            rows.append((name, metric, before, value, change, better))
+    return rows
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,43 @@
+# -*- coding:utf-8 -*-
+"""
+视频库扫描/分析/压缩的核心逻辑，不依赖 PyQt6。
+图形界面 videomanager.py 和命令行（python -m videocore）共用这里的实现。
+
+子模块按需加载：from videocore import CompressThread 时才导入压缩相关代码，
+只用扫描/缓存的场景（比如界面启动）不会加载编码、预测、遥测和 psutil。
+"""
+import importlib
+
+_EXPORTS = {
+    "cache": ("CACHE_DB", "CACHE_BACKEND", "load_cache", "save_cache"),
+    "probe": ("VIDEO_EXTS", "ProbeResult", "StreamInfo", "probe_media", "analyze_video",
+              "classify_content", "ensure_content_class", "evaluate_compress_value", "audio_streams",
+              "ensure_audio_streams"),
+    "fingerprint": ("content_fingerprint", "find_duplicates"),
+    "audio": ("AUDIO_POLICY", "plan_audio", "build_audio_args", "audio_save_pct"),
+    "scan": ("ScanThread", "HistoryLoader", "library_roots", "add_library_root", "collect_orphans"),
+    "watch": ("WatchThread",),
+    "jobqueue": ("JOB_STATES", "JOB_STATE_TEXT", "JobQueue", "output_path_for"),
+    "defaults": ("GOVERNOR_POLICY", "remux_candidate", "plan_action", "encode_key"),
+    "encode": ("EncodeJob", "ChunkedEncodeJob", "CompressThread", "build_video_args", "build_encode_cmd",
+               "build_remux_cmd", "is_aborted", "drop_aborted", "drop_duplicates"),
+    "verify": ("verify_output",),
+    "staging": ("SCRATCH_DIR", "partial_path_for", "place_output", "Prefetcher"),
+    "governor": ("Governor", "parse_windows"),
+    "planner": ("plan_compress", "speed_profile", "estimate"),
+    "predict": ("PredictThread", "CrfSearchThread", "predict_encode", "ensure_prediction",
+                "search_crf", "ensure_target_crf", "resolve_metric"),
+    "telemetry": ("throughput_history",),
+    "signals": ("Signal", "Worker"),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+__all__ = sorted(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+"""
+音轨策略：无损音轨和码率明显偏高的有损音轨转成 Opus/AAC（按声道数定码率），
+第一条无损音轨可以原样保留，其余音轨直接复制。
+音轨信息来自分析结果里的 "audio"（见 probe.audio_streams）。
+"""
+AUDIO_ENCODERS = {"libopus": "Opus", "aac": "AAC"}
+AUDIO_POLICY = {
+    "codec": "libopus",
+    "kbps_per_channel": 64,
+    "keep_lossless": 1,  # 原样保留的无损音轨数（按音轨顺序）
+    "bloat_ratio": 2.0,  # 有损音轨码率超过目标码率的这个倍数也转码
+}
+OPUS_LAYOUTS = "7.1|5.1|stereo|mono"  # libopus 不接受 5.1(side) 等布局，先规整
+
+
+def audio_policy(policy=None):
+    """
+    补全缺省项；policy 为 None 表示不处理音轨
+    """
+    return None if policy is None else {**AUDIO_POLICY, **policy}
+
+
+def target_kbps(channels, policy):
+    return max(channels, 1) * int(policy["kbps_per_channel"])
+
+
+def plan_audio(streams, policy):
+    """
+    每条音轨的处理：None 为原样复制，否则为转码后的码率（kbps）
+    """
+    policy = audio_policy(policy)
+    plan = []
+    kept = 0
+    for s in streams:
+        kbps = target_kbps(s["channels"], policy)
+        if s["lossless"] and kept < policy["keep_lossless"]:
+            kept += 1
+            plan.append(None)
+        elif s["lossless"] or s["bitrate_kbps"] > kbps * policy["bloat_ratio"]:
+            plan.append(kbps)
+        else:
+            plan.append(None)
+    return plan
+
+
+def build_audio_args(streams, policy):
+    """
+    音频编码参数：默认全部复制，需要转码的音轨按输出序号单独指定编码器和码率
+    """
+    args = ["-c:a", "copy"]
+    if policy is None:
+        return args
+    policy = audio_policy(policy)
+    for s, kbps in zip(streams, plan_audio(streams, policy)):
+        if kbps is None:
+            continue
+        n = s["index"]
+        args += [f"-c:a:{n}", policy["codec"], f"-b:a:{n}", f"{kbps}k"]
+        if policy["codec"] == "libopus" and s["channels"] > 2:
+            args += [f"-filter:a:{n}", f"aformat=channel_layouts={OPUS_LAYOUTS}", f"-mapping_family:a:{n}", "1"]
+    return args
+
+
+def audio_save_bytes(streams, duration, policy):
+    """
+    按策略转码音轨预计省下的字节数
+    """
+    if policy is None:
+        return 0
+    saved = 0.0
+    for s, kbps in zip(streams, plan_audio(streams, policy)):
+        if kbps is not None and s["bitrate_kbps"] > kbps:
+            saved += (s["bitrate_kbps"] - kbps) * 1000 / 8 * duration
+    return int(saved)
+
+
+def audio_save_pct(info, policy):
+    if not info.get("size"):
+        return 0.0
+    saved = audio_save_bytes(info.get("audio") or [], info["duration"], policy)
+    return min(saved / info["size"] * 100, 100.0)
+
+
+def transcoded_tracks(info, policy):
+    """
+    会被转码的音轨数（0 表示只处理音轨时没有事可做）
+    """
+    if policy is None:
+        return 0
+    return sum(1 for kbps in plan_audio(info.get("audio") or [], policy) if kbps is not None)
@@ -0,0 +1,389 @@
+# -*- coding:utf-8 -*-
+"""
+分析缓存：JSON / SQLite 两种后端，接口都是 path -> 分析结果 的映射
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+
+CONFIG_FILE = "config.json"  # 旧版 JSON 缓存
+CACHE_DB = "videomanager.db"
+CACHE_BACKEND = "sqlite"  # 可选 "sqlite" / "json"
+
+
+class CacheBackend:
+    """
+    分析缓存后端：以绝对路径为键存取 analyze_video 生成的 dict。
+    子类需要提供 get / [] / in / len / values / items / commit / close。
+    get_meta / set_meta 用于保存少量键值状态（JSON 可序列化）。
+    find_fingerprint 按内容指纹找记录（文件移动/改名后找回分析结果）。
+    """
+
+    def get_meta(self, key, default=None):
+        return self._meta.get(key, default)
+
+    def set_meta(self, key, value):
+        self._meta[key] = value
+
+    # 目录索引：目录路径 -> {"mtime_ns", "entries", "subdirs", "videos"}
+    def get_dir(self, path):
+        return self._dirs.get(path)
+
+    def put_dir(self, path, record):
+        self._dirs[path] = record
+
+    def keys_under(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        return [p for p in self.keys() if p.startswith(prefix)]
+
+    def delete_dir_tree(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        for d in [d for d in self._dirs if d == path or d.startswith(prefix)]:
+            del self._dirs[d]
+
+    def find_fingerprint(self, fingerprint):
+        return [info for info in self.values() if info.get("fingerprint") == fingerprint]
+
+    def duplicate_fingerprints(self):
+        """
+        被不止一条记录共用的指纹
+        """
+        counts = {}
+        for info in self.values():
+            if info.get("fingerprint"):
+                counts[info["fingerprint"]] = counts.get(info["fingerprint"], 0) + 1
+        return [fp for fp, n in counts.items() if n > 1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.commit()
+        self.close()
+
+
+class JsonCache(CacheBackend, dict):
+    """
+    旧版后端：整个 config.json 一次读入、一次写回
+    """
+
+    def __init__(self, path=CONFIG_FILE):
+        dict.__init__(self)
+        self.path = path
+        self._meta = {}
+        self._dirs = {}  # JSON 后端的目录索引只在内存中
+        self._fingerprints = {}  # 指纹 -> 路径集合，载入时建立（扫描线程会同时写入，不能边遍历边建）
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.update(json.load(f))
+            except Exception:
+                pass
+        for p, info in dict.items(self):
+            if isinstance(info, dict) and info.get("fingerprint"):
+                self._fingerprints.setdefault(info["fingerprint"], set()).add(p)
+
+    def __setitem__(self, path, info):
+        dict.__setitem__(self, path, info)
+        if info.get("fingerprint"):
+            with self._lock:
+                self._fingerprints.setdefault(info["fingerprint"], set()).add(path)
+
+    def find_fingerprint(self, fingerprint):
+        with self._lock:
+            paths = list(self._fingerprints.get(fingerprint, ()))
+        # 索引只增不删，取出时再核对
+        found = []
+        for p in paths:
+            info = self.get(p)
+            if info is not None and info.get("fingerprint") == fingerprint:
+                found.append(info)
+        return found
+
+    def commit(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(self), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        pass
+
+
+class SqliteCache(CacheBackend):
+    """
+    SQLite(WAL) 后端：逐行 upsert / delete，批量自动提交。
+    完整的分析结果以 JSON 存在 data 列，常用字段单独成列以便建索引。
+    未提交的写入占着数据库写锁（任务队列等其它连接会等待），所以最迟 COMMIT_INTERVAL 秒后由定时器提交。
+    """
+    COMMIT_EVERY = 256  # 累计多少行写入后自动提交
+    COMMIT_INTERVAL = 2.0  # 秒，有未提交的写入时最迟这么久后提交
+
+    # user_version -> 升级到该版本需要执行的语句
+    MIGRATIONS = {
+        1: [
+            """CREATE TABLE IF NOT EXISTS videos (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                compress_score INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_videos_size_mtime ON videos(size, mtime)",
+            "CREATE INDEX IF NOT EXISTS idx_videos_score ON videos(compress_score)",
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        ],
+        2: [
+            """CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,
+                videos TEXT NOT NULL
+            )""",
+        ],
+        3: [
+            "ALTER TABLE videos ADD COLUMN fingerprint TEXT",
+            "CREATE INDEX IF NOT EXISTS idx_videos_fingerprint ON videos(fingerprint)",
+        ],
+    }
+
+    def __init__(self, path=CACHE_DB, migrate_from=CONFIG_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._timer = None
+        self._closed = False
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._upgrade_schema()
+        if migrate_from:
+            self._migrate_json(migrate_from)
+
+    @property
+    def schema_version(self):
+        return self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _upgrade_schema(self):
+        with self._lock:
+            current = self.schema_version
+            for version in sorted(v for v in self.MIGRATIONS if v > current):
+                for stmt in self.MIGRATIONS[version]:
+                    self._conn.execute(stmt)
+                self._conn.execute(f"PRAGMA user_version = {int(version)}")
+            self._conn.commit()
+
+    def _migrate_json(self, json_path):
+        """
+        一次性把旧版 config.json 导入数据库，完成后改名为 config.json.migrated
+        """
+        if not os.path.exists(json_path) or self.get_meta("migrated_from_json"):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                old = json.load(f)
+        except Exception:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO videos (path, size, mtime, compress_score, fingerprint, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self._row(path, info) for path, info in old.items()
+                 if isinstance(info, dict) and "size" in info and "mtime" in info)
+            )
+            self.set_meta("migrated_from_json", os.path.abspath(json_path))
+            self._conn.commit()
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            pass
+
+    @staticmethod
+    def _row(path, info):
+        return (
+            path,
+            info["size"],
+            info["mtime"],
+            int(info.get("compress_score", 0)),
+            info.get("fingerprint"),
+            json.dumps(info, ensure_ascii=False),
+        )
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY or time.monotonic() - self._last_commit >= self.COMMIT_INTERVAL:
+            self.commit()
+        elif self._timer is None:
+            # 后面不一定还有写入（比如预测线程写完一条要算好几分钟），到时由定时器提交
+            self._timer = threading.Timer(self.COMMIT_INTERVAL, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if self._pending and not self._closed:
+                self.commit()
+
+    def get(self, path, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM videos WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, path):
+        info = self.get(path)
+        if info is None:
+            raise KeyError(path)
+        return info
+
+    def __setitem__(self, path, info):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos (path, size, mtime, compress_score, fingerprint, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(path, info)
+            )
+            self._wrote()
+
+    def __delitem__(self, path):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM videos WHERE path = ?", (path,))
+            if cur.rowcount == 0:
+                raise KeyError(path)
+            self._wrote()
+
+    def __contains__(self, path):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM videos WHERE path = ?", (path,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def _iter_rows(self, sql, chunk=1000):
+        with self._lock:
+            cur = self._conn.execute(sql)
+            rows = cur.fetchmany(chunk)
+        while rows:
+            yield from rows
+            with self._lock:
+                rows = cur.fetchmany(chunk)
+
+    def keys(self):
+        return (path for path, in self._iter_rows("SELECT path FROM videos"))
+
+    def keys_under(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM videos WHERE path >= ? AND path < ?", (prefix, upper)
+            ).fetchall()
+        return [path for path, in rows]
+
+    def __iter__(self):
+        return self.keys()
+
+    def values(self):
+        return (json.loads(data) for data, in self._iter_rows("SELECT data FROM videos"))
+
+    def items(self):
+        return ((path, json.loads(data)) for path, data in self._iter_rows("SELECT path, data FROM videos"))
+
+    def find_fingerprint(self, fingerprint):
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM videos WHERE fingerprint = ?", (fingerprint,)).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def duplicate_fingerprints(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fingerprint FROM videos WHERE fingerprint IS NOT NULL "
+                "GROUP BY fingerprint HAVING COUNT(*) > 1"
+            ).fetchall()
+        return [fp for fp, in rows]
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+            self._wrote()
+
+    def get_dir(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, entries, subdirs, videos FROM dirs WHERE path = ?", (path,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "mtime_ns": row[0],
+            "entries": row[1],
+            "subdirs": json.loads(row[2]),
+            "videos": json.loads(row[3]),
+        }
+
+    def put_dir(self, path, record):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, entries, subdirs, videos) VALUES (?, ?, ?, ?, ?)",
+                (path, record["mtime_ns"], record["entries"],
+                 json.dumps(record["subdirs"], ensure_ascii=False),
+                 json.dumps(record["videos"], ensure_ascii=False))
+            )
+            self._wrote()
+
+    def delete_dir_tree(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        # 用区间比较代替 LIKE，路径里的 % 和 _ 不需要转义
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, prefix, upper)
+            )
+            self._wrote()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+            self._last_commit = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._closed = True
+            self._conn.commit()
+            self._conn.close()
+
+
+CACHE_BACKENDS = {
+    "sqlite": SqliteCache,
+    "json": JsonCache,
+}
+
+
+def load_cache(backend=None):
+    return CACHE_BACKENDS[backend or CACHE_BACKEND]()
+
+
+def save_cache(cache):
+    if isinstance(cache, CacheBackend):
+        cache.commit()
+        return
+    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
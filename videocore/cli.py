@@ -0,0 +1,542 @@
+# -*- coding:utf-8 -*-
+"""
+命令行入口（不加载 PyQt6），用于无界面的转码服务器：
+
+    python -m videocore scan <文件夹>
+    python -m videocore analyze <文件...>
+    python -m videocore compress <文件...> --encoder libx265 --crf 23
+    python -m videocore queue [list|run|retry|clear]
+    python -m videocore plan --budget-hours 8   # 按节省字节/CPU 秒排序缓存里的候选
+    python -m videocore daemon          # 监视视频库并持续处理压缩队列
+    python -m videocore stats           # 按 编码器/预设/分辨率 的历史吞吐
+    python -m videocore dupes           # 内容相同的重复文件
+    python -m videocore gc              # 清理文件已不存在的缓存记录
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+
+from .cache import load_cache
+from .fingerprint import find_duplicates
+from .probe import analyze_video, ensure_content_class
+from .scan import SCAN_WORKERS, ScanThread, library_roots, add_library_root, collect_orphans
+from .watch import WatchThread
+from .jobqueue import JOB_STATES, JOB_STATE_TEXT, ENCODER_TAGS, JobQueue
+from .audio import AUDIO_ENCODERS, AUDIO_POLICY, audio_save_pct, transcoded_tracks
+from .defaults import (
+    CHUNK_PARALLEL, ABORT_BELOW_PCT, ACTION_TEXT, STREAM_COPY_ACTIONS, GOVERNOR_POLICY, plan_action, remux_candidate,
+)
+from .encode import CompressThread, drop_aborted, drop_duplicates
+from .governor import parse_windows
+from .planner import plan_compress
+from .staging import SCRATCH_DIR
+from .predict import QUALITY_METRICS, QUALITY_DEFAULT_TARGET, CrfSearchThread, ensure_prediction, resolve_metric
+from .telemetry import PROMETHEUS_TEXTFILE, format_secs, throughput_history
+
+DAEMON_POLL_SECS = 5  # 守护进程检查队列的间隔
+
+
+def _log(msg):
+    print(f"[{time.strftime('%H:%M:%S')}] {msg}", flush=True)
+
+
+def _run_worker(worker):
+    """
+    在前台运行后台线程，Ctrl+C 时让它自己停下来（保存进度、清理半成品）
+    """
+    worker.start()
+    try:
+        while not worker.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        _log("正在停止...")
+        worker.stop()
+        worker.wait()
+        return False
+    return True
+
+
+def _print_info(info, as_json):
+    if as_json:
+        print(json.dumps(info, ensure_ascii=False), flush=True)
+        return
+    content = f" | {info['content']}" if info.get("content") else ""
+    tracks = ", ".join(
+        f"{a['codec']} {a['channels']}ch {a['bitrate_kbps']}k" + ("（无损）" if a["lossless"] else "")
+        for a in info.get("audio") or []
+    )
+    audio_save = audio_save_pct(info, AUDIO_POLICY)
+    audio = f" | 音轨: {tracks}" if tracks else ""
+    if audio_save >= 1:
+        audio += f"（转码可再省 ~{audio_save:.0f}%）"
+    output = info.get("output")
+    action = (f" | 已{ACTION_TEXT[output['action']]}: {output['path']}" if output
+              else f" | 建议{ACTION_TEXT[plan_action(info)]}")
+    measured = "".join(
+        f" | {key} 实测节省 {pred['save_pct']}%（置信度 {pred['confidence']:.0%}）"
+        for key, pred in (info.get("predictions") or {}).items()
+    )
+    print(
+        f"{info['path']} | {info['size_mb']:.0f} MB | {info['duration'] / 60:.1f} 分钟 | "
+        f"{info['codec']} {info['bitrate_kbps']} kbps | 评分 {info['compress_score']} | "
+        f"预计节省 ~{info['save_pct']}%{content}{measured}{audio}{action}",
+        flush=True
+    )
+
+
+def cmd_scan(args):
+    folder = add_library_root(args.folder)
+    scan = ScanThread(folder, workers=args.workers, full_verify=args.full_verify,
+                      resume=not args.restart, classify=args.classify)
+    found = []
+
+    def on_found(batch):
+        found.extend(batch)
+        if args.json:
+            for info in batch:
+                _print_info(info, True)
+        else:
+            _log(f"已分析 {len(found)} 个视频")
+
+    scan.videos_found.connect(on_found)
+    scan.videos_removed.connect(lambda paths: _log(f"清理 {len(paths)} 条文件已不存在的缓存记录"))
+    scan.scan_finished.connect(lambda stats: _log(
+        f"{'扫描已停止（可再次运行继续）' if stats['stopped'] else '扫描完成'}: "
+        f"{stats['files']} 个文件 / {stats['seconds']:.1f} 秒，{stats['files_per_sec']:.1f} 文件/秒"
+    ))
+    return 0 if _run_worker(scan) else 130
+
+
+def cmd_analyze(args):
+    encoder, crf = args.predict.split(":") if args.predict else (None, None)
+    rc = 0
+    with load_cache() as cache:
+        for path in args.paths:
+            info = analyze_video(os.path.abspath(path), cache)
+            if not info:
+                print(f"无法分析: {path}", file=sys.stderr)
+                rc = 1
+                continue
+            if args.classify:
+                ensure_content_class(info, cache)
+            if encoder:
+                ensure_prediction(info, encoder, int(crf), cache)
+            _print_info(info, args.json)
+    return rc
+
+
+def _audio_policy(args):
+    if not (args.transcode_audio or args.audio_only):
+        return None
+    return {"codec": args.audio_codec, "kbps_per_channel": args.audio_kbps, "keep_lossless": args.keep_lossless}
+
+
+def _governor_policy(args):
+    if not (args.governor or args.windows or args.watch_process):
+        return None
+    return {
+        "windows": args.windows or "",
+        "cpu_nice": args.cpu_nice,
+        "cpu_suspend": args.cpu_suspend,
+        "iowait_nice": args.iowait_nice,
+        "iowait_suspend": args.iowait_suspend,
+        "processes": tuple(args.watch_process),
+    }
+
+
+def _compress_kwargs(args):
+    return {
+        "delete_source": args.delete_source,
+        "verify_decode": args.verify_decode,
+        "jobs": args.jobs,
+        "adaptive": args.adaptive,
+        "max_jobs": max(args.jobs, (os.cpu_count() or 1) // 4),
+        "pin_cpus": args.pin_cpus,
+        "chunked": args.chunked,
+        "chunk_parallel": args.chunk_parallel,
+        "abort_below_pct": None if args.abort_below < 0 else args.abort_below,
+        "remux": not args.no_remux,
+        "audio": _audio_policy(args),
+        "audio_only": args.audio_only,
+        "prom_textfile": args.prom_textfile,
+        "governor": _governor_policy(args),
+        "scratch_dir": args.scratch_dir,
+        "prefetch": args.prefetch,
+    }
+
+
+def _budget_kwargs(args):
+    return {
+        "budget_secs": args.budget_hours * 3600 if args.budget_hours else None,
+        "budget_bytes": int(args.budget_gb * 1024 ** 3) if args.budget_gb else None,
+    }
+
+
+def _plan(args, infos):
+    selected, deferred, totals = plan_compress(
+        infos, args.encoder, args.crf, audio=_audio_policy(args), remux=not args.no_remux,
+        audio_only=args.audio_only, **_budget_kwargs(args)
+    )
+    _log(
+        f"计划: {totals['files']} 个，预计节省 {totals['save_bytes'] / 1024 ** 3:.1f} GB，"
+        f"约 {format_secs(totals['wall_secs'])}（{totals['cpu_secs'] / 3600:.1f} CPU 小时）"
+        + (f"，{len(deferred)} 个超出预算未入选" if deferred else "")
+    )
+    return selected, deferred, totals
+
+
+def _run_compress(job_queue, files=(), encoder=None, crf=0, crfs=None, **kwargs):
+    compress = CompressThread(files, encoder=encoder, crf=crf, crfs=crfs, job_queue=job_queue, **kwargs)
+    compress.log.connect(_log)
+    compress.job_state.connect(lambda src, state: _log(f"{JOB_STATE_TEXT.get(state, state)}: {src}"))
+    compress.batch_telemetry.connect(lambda b: _log(
+        f"进度 {b['done_secs'] / b['total_secs'] * 100 if b['total_secs'] else 0:.0f}% | "
+        f"{b['speed']:.2f}x | {b['fps']:.0f} fps | 剩余 {format_secs(b['eta_secs'])}"
+    ))
+    return _run_worker(compress)
+
+
+def cmd_compress(args):
+    files = [os.path.abspath(p) for p in args.paths]
+    crfs = None
+    if args.target_metric:
+        metric = resolve_metric(args.target_metric)
+        target = QUALITY_DEFAULT_TARGET[metric] if args.target is None else args.target
+        if metric != args.target_metric:
+            # 分数刻度不同，不能沿用为 VMAF 给的目标值
+            target = QUALITY_DEFAULT_TARGET[metric]
+            _log(f"本机 ffmpeg 没有 libvmaf，改用 {metric.upper()} ≥ {target:g}")
+        search = CrfSearchThread(files, args.encoder, metric, target)
+        result = {}
+        search.searched.connect(lambda path, found: _log(
+            f"{os.path.basename(path)} -> crf {found['crf']}（{metric.upper()} {found['score']}）"
+        ))
+        search.log.connect(_log)
+        search.crf_ready.connect(result.update)
+        if not _run_worker(search):
+            return 130
+        crfs = result
+    return _compress_files(args, files, crfs)
+
+
+def _compress_files(args, files, crfs=None, priorities=None):
+    files, aborted = drop_aborted(files, args.encoder, args.crf, crfs)
+    for path in sorted(aborted):
+        _log(f"跳过（此前已提前放弃）: {path}")
+    if not files:
+        return 0
+    job_queue = JobQueue()
+    job_queue.recover()
+    files, duplicates = drop_duplicates(files, args.encoder, job_queue)
+    for path, same in sorted(duplicates.items()):
+        _log(f"跳过（与 {same} 内容相同）: {path}")
+    if args.prioritize and priorities is None:
+        with load_cache() as cache:
+            infos = [cache.get(path) or analyze_video(path, cache) for path in files]
+        selected, _, _ = _plan(args, infos)
+        files = [item["path"] for item in selected]
+        priorities = {item["path"]: item["priority"] for item in selected}
+    try:
+        ok = _run_compress(job_queue, files, args.encoder, args.crf, crfs, priorities=priorities,
+                           **_compress_kwargs(args), **_budget_kwargs(args))
+    finally:
+        job_queue.close()
+    return 0 if ok else 130
+
+
+def _own_output(path):
+    base = os.path.splitext(path)[0]
+    return base.endswith(tuple("_" + tag for tag in list(ENCODER_TAGS.values()) + list(STREAM_COPY_ACTIONS)))
+
+
+def cmd_plan(args):
+    """
+    给缓存里还没处理过的视频排计划；--run 时按计划压缩入选的文件
+    """
+    started = time.perf_counter()
+    with load_cache() as cache:
+        infos = [info for info in cache.values()
+                 if not info.get("output") and info.get("compress_score", 0) >= args.min_score
+                 and not _own_output(info["path"])]
+    loaded = time.perf_counter()
+    selected, deferred, totals = _plan(args, infos)
+    _log(f"读取缓存 {loaded - started:.2f} 秒，排序 {len(infos)} 个候选 {time.perf_counter() - loaded:.2f} 秒")
+    if args.json:
+        print(json.dumps({"totals": totals, "selected": selected, "deferred": deferred}, ensure_ascii=False))
+    else:
+        for item in selected[:args.limit]:
+            print(f"{item['save_bytes'] / 1024 ** 3:8.2f} GB {item['cpu_secs'] / 3600:8.2f} CPU 小时 "
+                  f"{ACTION_TEXT[item['action']]:<4} {item['path']}")
+        if len(selected) > args.limit:
+            print(f"...（共 {len(selected)} 个，--limit 调整显示数量）")
+    if not args.run:
+        return 0
+    files = [item["path"] for item in selected if os.path.exists(item["path"])]
+    return _compress_files(args, files, priorities={item["path"]: item["priority"] for item in selected})
+
+
+def cmd_queue(args):
+    job_queue = JobQueue()
+    try:
+        if args.action == "retry":
+            job_queue.retry_failed()
+        elif args.action == "clear":
+            job_queue.clear()
+        elif args.action == "run":
+            for dst in job_queue.recover():
+                _log(f"已清理上次中断的输出: {dst}")
+            return 0 if _run_compress(job_queue, **_compress_kwargs(args), **_budget_kwargs(args)) else 130
+        counts = job_queue.counts()
+        print("  ".join(f"{JOB_STATE_TEXT.get(s, s)}: {counts.get(s, 0)}" for s in JOB_STATES))
+        for job in job_queue.jobs():
+            err = job["error"].strip().splitlines()
+            print(f"{job['id']:>5} {JOB_STATE_TEXT.get(job['state'], job['state'])} "
+                  f"{job['attempts']}/{job['max_attempts']} {job['encoder']}/{job['crf']} {job['src']}"
+                  + (f" | {err[-1]}" if err else ""))
+        return 0
+    finally:
+        job_queue.close()
+
+
+def cmd_daemon(args):
+    """
+    监视视频库，新增/修改的视频可按评分自动入队；队列里有任务就压缩，直到收到 SIGINT/SIGTERM
+    """
+    roots = [os.path.abspath(r) for r in args.roots] or library_roots()
+    if not roots:
+        print("没有可监视的文件夹：先运行 scan，或用 --roots 指定", file=sys.stderr)
+        return 2
+    job_queue = JobQueue()
+    for dst in job_queue.recover():
+        _log(f"已清理上次中断的输出: {dst}")
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *a: stopping.append(True))
+
+    def on_found(batch):
+        for info in batch:
+            _log(f"入库: {info['path']}（评分 {info['compress_score']}）")
+            if _own_output(info["path"]):
+                continue  # 自己压缩/换封装/转音轨出来的文件
+            if args.audio_only:
+                wanted = transcoded_tracks(info, _audio_policy(args)) > 0
+            else:
+                wanted = info["compress_score"] >= args.min_score or (not args.no_remux and remux_candidate(info))
+            if args.auto_compress and wanted:
+                kept, _ = drop_aborted([info["path"]], args.encoder, args.crf)
+                kept, duplicates = drop_duplicates(kept, args.encoder, job_queue)
+                for same in duplicates.values():
+                    _log(f"不入队（与 {same} 内容相同）: {info['path']}")
+                if kept:
+                    job_queue.add(info["path"], args.encoder, args.crf, options={
+                        "delete_source": args.delete_source,
+                        "chunked": args.chunked,
+                        "chunk_parallel": args.chunk_parallel,
+                        "abort_below_pct": None if args.abort_below < 0 else args.abort_below,
+                        "remux": not args.no_remux,
+                        "audio": _audio_policy(args),
+                        "audio_only": args.audio_only,
+                        "verify_decode": args.verify_decode,
+                    }, duration=info["duration"])
+
+    watch = WatchThread(roots)
+    watch.videos_found.connect(on_found)
+    watch.videos_removed.connect(lambda paths: _log(f"移除 {len(paths)} 个视频"))
+    watch.log.connect(_log)
+    watch.start()
+    _log(f"守护进程已启动，监视 {len(roots)} 个文件夹")
+
+    compress = None
+    try:
+        while not stopping:
+            if (compress is None or not compress.isRunning()) and job_queue.counts().get("pending"):
+                compress = CompressThread(job_queue=JobQueue(), **_compress_kwargs(args))
+                compress.log.connect(_log)
+                compress.start()
+            time.sleep(DAEMON_POLL_SECS)
+    except KeyboardInterrupt:
+        pass
+    _log("正在停止...")
+    watch.stop()
+    if compress is not None:
+        compress.stop()
+        compress.wait()
+    watch.wait()
+    job_queue.close()
+    return 0
+
+
+def cmd_stats(args):
+    rows = throughput_history()
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return 0
+    if not rows:
+        print("还没有已完成任务的遥测记录")
+    for r in rows:
+        print(f"{r['encoder']:<12} {r['preset']:<12} {r['resolution']:<6} {r['jobs']:>4} 个任务 "
+              f"{r['media_hours']:>8} 小时 {r['speed']:>7}x {r['fps']:>7} fps CPU {r['cpu_pct']}% "
+              f"节省 {r['save_pct']}%")
+    return 0
+
+
+def cmd_dupes(args):
+    with load_cache() as cache:
+        groups = find_duplicates(cache, verify=args.verify)
+        sizes = [cache.get(g[0], {}).get("size", 0) for g in groups]
+    if args.json:
+        for group, size in zip(groups, sizes):
+            print(json.dumps({"size": size, "paths": group}, ensure_ascii=False))
+        return 0
+    if not groups:
+        print("没有发现重复文件")
+    for group, size in zip(groups, sizes):
+        print(f"{size / 1024 / 1024:.1f} MB x {len(group)}:")
+        for path in group:
+            print(f"    {path}")
+    if groups:
+        wasted = sum(size * (len(g) - 1) for g, size in zip(groups, sizes))
+        print(f"共 {len(groups)} 组，多占用 {wasted / 1024 / 1024 / 1024:.2f} GB"
+              f"{'' if args.verify else '（按指纹判断，--verify 逐字节确认）'}")
+    return 0
+
+
+def cmd_gc(args):
+    roots = [os.path.abspath(r) for r in args.roots] or library_roots()
+    removed = []
+    with load_cache() as cache:
+        for root in roots:
+            removed += collect_orphans(cache, root)
+    for path in removed:
+        _log(f"清理: {path}")
+    _log(f"共清理 {len(removed)} 条缓存记录")
+    return 0
+
+
+def _add_compress_options(p):
+    p.add_argument("--jobs", type=int, default=1, help="同时压缩的任务数")
+    p.add_argument("--adaptive", action="store_true", help="按 CPU 占用自动增减并发")
+    p.add_argument("--pin-cpus", action="store_true", help="每个任务绑定一组 CPU")
+    p.add_argument("--chunked", action="store_true", help="长视频分段并行编码")
+    p.add_argument("--chunk-parallel", type=int, default=CHUNK_PARALLEL)
+    p.add_argument("--abort-below", type=float, default=ABORT_BELOW_PCT,
+                   help="预计节省低于该百分比时提前放弃，-1 关闭（输出会比源文件大时总是放弃）")
+    p.add_argument("--no-remux", action="store_true",
+                   help="已是 HEVC/AV1/VP9 的老容器视频也重新编码（默认只换封装为 MKV）")
+    p.add_argument("--transcode-audio", action="store_true", help="无损/码率过高的音轨转码（默认全部复制）")
+    p.add_argument("--audio-codec", choices=sorted(AUDIO_ENCODERS), default=AUDIO_POLICY["codec"])
+    p.add_argument("--audio-kbps", type=int, default=AUDIO_POLICY["kbps_per_channel"], help="转码后每声道码率")
+    p.add_argument("--keep-lossless", type=int, default=AUDIO_POLICY["keep_lossless"],
+                   help="原样保留的无损音轨数")
+    p.add_argument("--audio-only", action="store_true", help="视频直接复制，只按上面的策略转码音轨")
+    p.add_argument("--delete-source", action="store_true", help="输出校验通过后删除源文件")
+    p.add_argument("--verify-decode", action="store_true",
+                   help="校验时再从输出里抽几段解码（默认只比较时长、流和章节）")
+    p.add_argument("--prom-textfile", default=PROMETHEUS_TEXTFILE, help="node_exporter textfile 路径")
+    p.add_argument("--scratch-dir", default=SCRATCH_DIR,
+                   help="写入中的输出放在这里（本地 SSD/tmpfs），完成后移到源文件旁边")
+    p.add_argument("--prefetch", action="store_true", help="编码时把队列里下一个源文件预读进页缓存")
+    g = p.add_argument_group("负载调速（给其它服务让路，调整记录在 telemetry/governor.jsonl）")
+    g.add_argument("--governor", action="store_true", help="按系统负载自动降低编码优先级或挂起编码")
+    g.add_argument("--windows", type=_time_windows, help="只在这些时段运行，如 01:00-08:00,13:00-15:00")
+    g.add_argument("--watch-process", action="append", default=[], metavar="NAME",
+                   help="该进程忙碌时挂起编码（可重复），如 EmbyServer")
+    g.add_argument("--cpu-nice", type=float, default=GOVERNOR_POLICY["cpu_nice"],
+                   help="其它进程占用的 CPU 百分比达到该值时降低编码优先级")
+    g.add_argument("--cpu-suspend", type=float, default=GOVERNOR_POLICY["cpu_suspend"], help="达到该值时挂起编码")
+    g.add_argument("--iowait-nice", type=float, default=GOVERNOR_POLICY["iowait_nice"])
+    g.add_argument("--iowait-suspend", type=float, default=GOVERNOR_POLICY["iowait_suspend"])
+
+
+def _time_windows(text):
+    try:
+        parse_windows(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def _add_budget_options(p):
+    p.add_argument("--budget-hours", type=float, help="运行这么多小时后停止，未完成的留在队列里")
+    p.add_argument("--budget-gb", type=float, help="实际节省达到这么多 GB 后不再启动新任务")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="videocore", description="视频库扫描与批量压缩（命令行）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", help="扫描文件夹并缓存分析结果")
+    p.add_argument("folder")
+    p.add_argument("--workers", type=int, default=SCAN_WORKERS)
+    p.add_argument("--full-verify", action="store_true", help="忽略目录索引，逐个文件校验")
+    p.add_argument("--restart", action="store_true", help="不从上次中断处继续")
+    p.add_argument("--classify", action="store_true", help="顺带识别动画/实拍")
+    p.add_argument("--json", action="store_true", help="每个视频输出一行 JSON")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("analyze", help="分析单个文件（结果写入缓存）")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--classify", action="store_true")
+    p.add_argument("--predict", metavar="ENCODER:CRF", help="采样试编码预测节省")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("compress", help="把文件加入压缩队列并处理")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--encoder", default="libx264")
+    p.add_argument("--crf", type=int, default=21)
+    p.add_argument("--target-metric", choices=QUALITY_METRICS, help="目标质量模式：按该指标为每个文件搜索 crf")
+    p.add_argument("--target", type=float, help="目标分数，默认 VMAF 93 / SSIM 0.985 / PSNR 42")
+    p.add_argument("--prioritize", action="store_true",
+                   help="按预计节省字节/CPU 秒排序，预算（--budget-*）不够的不入队")
+    _add_compress_options(p)
+    _add_budget_options(p)
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("queue", help="查看或处理持久化的压缩队列")
+    p.add_argument("action", nargs="?", default="list", choices=("list", "run", "retry", "clear"))
+    _add_compress_options(p)
+    _add_budget_options(p)
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("plan", help="按预计节省字节/CPU 秒给缓存里的视频排序，可按预算截取")
+    p.add_argument("--encoder", default="libx264")
+    p.add_argument("--crf", type=int, default=21)
+    p.add_argument("--min-score", type=int, default=0, help="只考虑压缩价值评分不低于该值的视频")
+    p.add_argument("--limit", type=int, default=20, help="显示前几个")
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--run", action="store_true", help="按计划压缩入选的文件")
+    _add_compress_options(p)
+    _add_budget_options(p)
+    p.set_defaults(func=cmd_plan, prioritize=True)
+
+    p = sub.add_parser("daemon", help="监视视频库并持续处理压缩队列")
+    p.add_argument("--roots", nargs="*", default=[], help="默认为扫描过的文件夹")
+    p.add_argument("--auto-compress", action="store_true", help="新视频评分达标（或只需换封装）时自动入队")
+    p.add_argument("--min-score", type=int, default=60)
+    p.add_argument("--encoder", default="libx265")
+    p.add_argument("--crf", type=int, default=23)
+    _add_compress_options(p)
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("stats", help="历史吞吐（按 编码器/预设/分辨率）")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("dupes", help="列出内容相同的重复文件")
+    p.add_argument("--verify", action="store_true", help="逐字节确认（读完整文件）")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_dupes)
+
+    p = sub.add_parser("gc", help="清理文件已不存在的缓存记录（移动/改名/删除后留下的）")
+    p.add_argument("roots", nargs="*", help="默认为扫描过的文件夹")
+    p.set_defaults(func=cmd_gc)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
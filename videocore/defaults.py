@@ -0,0 +1,50 @@
+# -*- coding:utf-8 -*-
+"""
+压缩相关的默认参数和处理方式判断。
+界面启动时只需要这些（控件默认值、表格里的"建议处理方式"），
+不必导入 encode/governor/staging/verify 等模块，那些在第一次压缩时才加载。
+"""
+CHUNK_MIN_SECS = 20 * 60  # 时长达到该值的视频才分段
+CHUNK_PARALLEL = 4  # 同一文件同时编码的分段数
+ABORT_BELOW_PCT = 10  # 预计节省低于该百分比时提前放弃（None 关闭；输出会比源文件大时总是放弃）
+ABORT_WARMUP_SECS = 60  # 至少编码这么多秒（媒体时长）后才开始判断
+ABORT_WARMUP_RATIO = 0.05  # 且至少编码全片的这个比例
+REMUX_CODECS = {"hevc", "av1", "vp9"}  # 已经足够高效、不值得重新编码的视频编码
+REMUX_CONTAINERS = (".avi", ".wmv", ".asf", ".flv", ".f4v", ".ts", ".mts", ".m2ts",
+                    ".mpg", ".mpeg", ".vob", ".rm", ".rmvb", ".3gp")  # 老旧/流式容器
+ACTION_TEXT = {"remux": "转封装", "encode": "重新编码", "audio": "音轨转码"}
+STREAM_COPY_ACTIONS = ("remux", "audio")  # 视频流直接复制的处理方式，输出为 <源文件>_<方式>.mkv
+
+# 负载调速的缺省策略（见 governor.Governor）
+GOVERNOR_POLICY = {
+    "windows": "",  # 允许运行的时段，如 "01:00-08:00,13:00-15:00"；空为全天
+    "cpu_nice": 50,  # 其它进程占用的系统 CPU 百分比达到该值时降低编码优先级
+    "cpu_suspend": 80,  # 达到该值时挂起编码
+    "iowait_nice": 20,  # iowait 百分比，含义同上
+    "iowait_suspend": 40,
+    "processes": (),  # 这些进程（按进程名）忙碌时挂起编码，如 ("EmbyServer", "ffmpeg-emby")
+    "process_cpu": 10,  # 上述进程合计 CPU（单核百分比）达到该值才算忙碌
+    "resume_secs": 60,  # 负载连续这么多秒低于阈值才放宽（避免来回切换）
+}
+
+
+def encode_key(encoder, crf):
+    """
+    缓存里按 编码器/crf 记录预测、放弃等结果时用的键
+    """
+    return f"{encoder}:{int(crf)}"
+
+
+def remux_candidate(info):
+    """
+    视频已是 HEVC/AV1/VP9、只是容器老旧：直接复制各路流换成 MKV 即可（此前换封装失败过的除外）
+    """
+    return bool(info and info.get("codec") in REMUX_CODECS and not info.get("remux_failed")
+                and info["path"].lower().endswith(REMUX_CONTAINERS))
+
+
+def plan_action(info):
+    """
+    按分析结果给出的处理方式："remux"（只换封装）或 "encode"（重新编码）
+    """
+    return "remux" if remux_candidate(info) else "encode"
@@ -0,0 +1,1204 @@
+# -*- coding:utf-8 -*-
+"""
+编码参数、单个压缩任务（整段/分段并行）和压缩调度线程
+"""
+import os
+import json
+import shutil
+import subprocess
+import threading
+import time
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .audio import audio_policy, build_audio_args, transcoded_tracks
+from .cache import load_cache, save_cache
+from .defaults import (
+    CHUNK_MIN_SECS, CHUNK_PARALLEL, ABORT_BELOW_PCT, ABORT_WARMUP_SECS, ABORT_WARMUP_RATIO, ACTION_TEXT,
+    STREAM_COPY_ACTIONS, encode_key, remux_candidate,
+)
+from .fingerprint import content_fingerprint, ensure_fingerprint
+from .governor import Governor
+from .jobqueue import JobQueue, JOB_STDERR_TAIL, output_path_for
+from .probe import (
+    _NO_WINDOW, probe_media, analyze_video, ensure_audio_streams, ensure_content_class, pick_ref_bframes,
+)
+from .signals import Signal, Worker
+from .staging import (
+    PARTIAL_SUFFIX, SCRATCH_DIR, SPACE_MARGIN, SPACE_RESERVE, Prefetcher, device_of, free_bytes, partial_path_for,
+    place_output,
+)
+from .verify import verify_output
+from .telemetry import (
+    TELEMETRY_DIR, TELEMETRY_INTERVAL, PROMETHEUS_TEXTFILE,
+    JobTelemetry, format_secs, video_preset, write_prometheus,
+)
+
+COMPRESS_CPU_HIGH = 95  # 平均 CPU 高于该值时减少并发
+COMPRESS_CPU_LOW = 75  # 平均 CPU 低于该值且还有排队任务时增加并发
+COMPRESS_ADAPT_INTERVAL = 15  # 秒，自适应并发的观测窗口
+CHUNK_SEGMENT_SECS = 120  # 分段编码时每段的目标时长（实际在关键帧处切分）
+PROGRESS_LINE_RE = re.compile(r"^[a-z0-9_]+=")  # -progress 输出的 key=value 行
+
+
+def is_aborted(info, encoder, crf):
+    """
+    该文件此前在同一编码器/crf 下因预计节省不足被提前放弃过
+    """
+    return bool(info and encode_key(encoder, crf) in (info.get("aborted") or {}))
+
+
+def drop_aborted(files, encoder, crf, crfs=None):
+    """
+    去掉此前在同一编码器/crf 下提前放弃过的文件（可以换封装的不算），返回 (保留, 放弃过的)
+    """
+    crfs = crfs or {}
+    with load_cache() as cache:
+        aborted = {f for f in files
+                   if is_aborted(cache.get(f), encoder, crfs.get(f, crf)) and not remux_candidate(cache.get(f))}
+    return [f for f in files if f not in aborted], aborted
+
+
+def drop_duplicates(files, encoder, job_queue=None):
+    """
+    内容相同（指纹一致）的文件只压缩一份：去掉批内重复的，以及和队列里同一编码器的任务重复的。
+    返回 (保留, {重复的文件: 与之内容相同的文件})
+    """
+    owners = {}
+    duplicates = {}
+    kept = []
+    with load_cache() as cache:
+        if job_queue is not None:
+            for job in job_queue.jobs(("pending", "running", "done")):
+                fingerprint = (cache.get(job["src"]) or {}).get("fingerprint")
+                if job["encoder"] == encoder and fingerprint:
+                    owners.setdefault(fingerprint, job["src"])
+        for path in files:
+            info = cache.get(path)
+            fingerprint = ensure_fingerprint(info, cache) if info else content_fingerprint(path)
+            owner = owners.get(fingerprint) if fingerprint else None
+            if owner is not None and owner != path:
+                duplicates[path] = owner
+                continue
+            if fingerprint:
+                owners[fingerprint] = path
+            kept.append(path)
+    return kept, duplicates
+
+
+def build_video_args(encoder, crf, width, height, is_animation, threads=0):
+    """
+    视频编码参数（-c:v 及之后），threads>0 时限制该编码任务使用的线程数
+    """
+    ref, bframes = pick_ref_bframes(width, height)
+    tune_hint = "animation" if is_animation else "film"
+
+    x264_params = (
+        f"ref={ref}:"
+        f"bframes={bframes}:b-adapt=2:"
+        "me=umh:subme=10:"
+        "rc-lookahead=50:"
+        "trellis=2:"
+        "aq-mode=3:aq-strength=1.1:"
+        r"psy-rd=1.0\:-0.15:"
+        r"deblock=-1\:-1"
+    )
+
+    if encoder == "libx264":
+        args = [
+            "-c:v", "libx264",
+            "-crf", str(crf),
+            "-preset", "slow",
+            "-tune", tune_hint,
+            "-x264-params", x264_params,
+        ]
+    elif encoder == "libx265":
+        args = ["-c:v", "libx265", "-crf", str(crf), "-preset", "slow"]
+        if is_animation:
+            args += ["-tune", "animation"]  # 实拍就别加 tune 了
+        x265_params = "log-level=error"
+        if threads:
+            x265_params += f":pools={threads}"
+        args += ["-x265-params", x265_params]
+    elif encoder == "libvpx-vp9":
+        args = [
+            "-c:v", "libvpx-vp9",
+            "-crf", str(crf),
+            "-b:v", "0",
+            "-deadline", "good",
+            "-cpu-used", "2",
+            "-row-mt", "1",
+        ]
+    elif encoder == "libaom-av1":
+        args = [
+            "-c:v", "libaom-av1",
+            "-crf", str(crf),
+            "-b:v", "0",
+            "-cpu-used", "6",
+            "-row-mt", "1",
+            "-tiles", "2x2",
+            "-strict", "-2",  # 启用实验性编码器
+        ]
+    else:
+        args = [
+            "-c:v", encoder,
+            "-crf", str(crf),
+        ]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
+
+
+# 第一路视频 + 全部音轨/字幕，元数据和章节照搬（重新编码和换封装共用）
+STREAM_MAP = ["-map", "0:v:0", "-map", "0:a?", "-map", "0:s?"]
+KEEP_METADATA = ["-map_metadata", "0", "-map_chapters", "0"]
+
+
+def build_encode_cmd(src, dst, encoder, crf, width, height, is_animation, threads=0, audio_args=None):
+    cmd = [
+        "ffmpeg", "-y",
+        "-hide_banner", "-v", "warning",
+        "-i", src,
+    ] + STREAM_MAP
+    cmd += build_video_args(encoder, crf, width, height, is_animation, threads)
+    cmd += (audio_args or ["-c:a", "copy"]) + [
+        "-c:s", "copy",
+    ] + KEEP_METADATA + [
+        "-progress", "pipe:1",
+        "-nostats",
+        "-f", "matroska",  # 先写到 .partial 临时文件，不能靠扩展名判断格式
+        dst
+    ]
+    return cmd
+
+
+def build_remux_cmd(src, dst, audio_args=None):
+    """
+    只换封装：所有流原样复制，速度只受磁盘限制；audio_args 可以让部分音轨转码
+    """
+    return [
+        "ffmpeg", "-y",
+        "-hide_banner", "-v", "warning",
+        "-fflags", "+genpts",  # avi/flv/ts 里常有缺失时间戳的包，MKV 需要
+        "-i", src,
+    ] + STREAM_MAP + [
+        "-c", "copy",
+    ] + (audio_args or []) + KEEP_METADATA + [
+        "-progress", "pipe:1",
+        "-nostats",
+        "-f", "matroska",
+        dst
+    ]
+
+
+class EncodeJob:
+    """
+    一个压缩任务：可单独暂停/继续/停止。
+    execute() 运行到结束并返回 ffmpeg 返回码，输出的最后几行保存在 tail 中。
+    ffmpeg 写的是 out（临时文件），成功后由调度器放到 dst。
+    """
+    chunked = False
+    action = "encode"
+
+    def __init__(self, src, dst, duration, cmd, cpus=None, abort_below_pct=None, out=None):
+        self.src = src
+        self.dst = dst
+        self.out = out or dst
+        self.duration = duration
+        self.cmd = cmd
+        self.cpus = cpus
+        self.abort_below_pct = abort_below_pct
+        self.src_size = os.path.getsize(src)
+        self.paused = False
+        self.stopped = False
+        self.aborted = None  # 提前放弃时为预计节省百分比
+        self.done_secs = 0.0
+        self.out_bytes = 0
+        self.percent = 0
+        self.tail = deque(maxlen=JOB_STDERR_TAIL)
+        self.on_log = None
+        self.telemetry = None
+        self._procs = []
+        self._live = {}  # pid -> 最近一次 -progress 的 fps/speed
+        self._procs_lock = threading.Lock()
+
+    def _popen(self, cmd):
+        p = subprocess.Popen(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             stdin=subprocess.PIPE,
+                             encoding="utf-8",
+                             errors="ignore",
+                             creationflags=_NO_WINDOW
+                             )
+        if self.cpus:
+            import psutil  # 延迟导入：只有真正启动编码时才需要
+            try:
+                psutil.Process(p.pid).cpu_affinity(self.cpus)
+            except (AttributeError, psutil.Error):
+                pass  # macOS 等平台不支持绑定 CPU
+        with self._procs_lock:
+            self._procs.append(p)
+            self._live[p.pid] = {}
+        if self.paused:
+            self._signal(p, "suspend")
+        return p
+
+    def _pump(self, p, on_time=None, on_size=None):
+        """
+        读取 -progress 输出直到进程结束，返回返回码
+        """
+        for line in p.stdout:
+            if self.stopped:
+                p.terminate()
+                break
+            if line.startswith("out_time_ms="):
+                value = line.split("=", 1)[1].strip()
+                if value.isdigit() and on_time:
+                    on_time(int(value) / 1_000_000)
+            elif line.startswith("total_size="):
+                value = line.split("=", 1)[1].strip()
+                if value.isdigit() and on_size:
+                    on_size(int(value))
+            elif line.startswith(("fps=", "speed=")):
+                key, value = line.strip().split("=", 1)
+                self._live[p.pid][key] = value.rstrip("x")
+            elif not PROGRESS_LINE_RE.match(line):
+                self.tail.append(line.rstrip())
+        rc = p.wait()
+        with self._procs_lock:
+            self._procs.remove(p)
+            self._live.pop(p.pid, None)
+        return rc
+
+    def pids(self):
+        with self._procs_lock:
+            return [p.pid for p in self._procs]
+
+    def live_stats(self):
+        with self._procs_lock:
+            return [dict(v) for v in self._live.values()]
+
+    def _run_quiet(self, cmd):
+        return self._pump(self._popen(cmd))
+
+    @staticmethod
+    def _signal(p, action):
+        import psutil
+        try:
+            getattr(psutil.Process(p.pid), action)()
+        except psutil.NoSuchProcess:
+            pass
+
+    def _each_process(self, action):
+        with self._procs_lock:
+            procs = list(self._procs)
+        for p in procs:
+            self._signal(p, action)
+
+    def projected_save_pct(self):
+        """
+        按已输出字节数/已编码时长线性外推最终体积，返回相对源文件的预计节省百分比
+        """
+        if self.done_secs <= 0 or self.out_bytes <= 0:
+            return None
+        projected = self.out_bytes / self.done_secs * self.duration
+        return (1 - projected / self.src_size) * 100
+
+    def _check_abort(self):
+        """
+        预计节省低于 abort_below_pct 时放弃；与阈值无关（包括关闭时），预计输出比源文件大、
+        或者已经写出的字节超过源文件时也放弃。只看重新编码，流复制的输出本来就和源文件差不多大
+        """
+        if self.action != "encode" or self.aborted is not None or self.stopped:
+            return
+        overrun = self.out_bytes > self.src_size  # 已经比源文件大，不必等预热
+        if not overrun and self.done_secs < max(ABORT_WARMUP_SECS, self.duration * ABORT_WARMUP_RATIO):
+            return
+        save_pct = self.projected_save_pct()
+        limit = max(self.abort_below_pct or 0, 0)
+        if save_pct is not None and (overrun or save_pct < limit):
+            self.aborted = round(save_pct, 1)
+            self.stop()
+
+    def _set_out_bytes(self, n):
+        self.out_bytes = n
+
+    def execute(self, on_progress):
+        def on_time(secs):
+            self.done_secs = min(secs, self.duration)
+            self._check_abort()
+            on_progress(self)
+        return self._pump(self._popen(self.cmd), on_time, self._set_out_bytes)
+
+    def pause(self):
+        if not self.paused:
+            self.paused = True
+            self._each_process("suspend")
+
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            self._each_process("resume")
+
+    def stop(self):
+        self.stopped = True
+        self.resume()  # 挂起的进程收不到 q
+        with self._procs_lock:
+            procs = list(self._procs)
+        for p in procs:
+            if p.stdin:
+                try:
+                    p.stdin.write("q\n")
+                    p.stdin.flush()
+                except Exception:
+                    pass
+
+
+class ChunkedEncodeJob(EncodeJob):
+    """
+    分段并行编码：按关键帧把视频流切成若干段（-c copy 的 segment 只会在关键帧处切），
+    各段用相同参数并行编码后无损拼接，再从源文件封装音轨、字幕、章节和元数据。
+    已完成的分段保存在 <dst>.parts 目录，停止/崩溃后重新运行会直接复用。
+    """
+    chunked = True
+
+    def __init__(self, src, dst, duration, video_args, signature,
+                 segment_secs=CHUNK_SEGMENT_SECS, parallel=CHUNK_PARALLEL, cpus=None, abort_below_pct=None,
+                 audio_args=None, out=None):
+        super().__init__(src, dst, duration, None, cpus, abort_below_pct, out)
+        self.video_args = video_args
+        self.audio_args = audio_args or []
+        self.signature = signature
+        self.segment_secs = segment_secs
+        self.parallel = max(1, parallel)
+        # 和输出放在一起（临时目录或目标旁边）；不带 .partial，停止后再次运行能找回
+        base = self.out[:-len(PARTIAL_SUFFIX)] if self.out.endswith(PARTIAL_SUFFIX) else self.out
+        self.work_dir = base + ".parts"
+        self._seg_done = {}
+        self._seg_bytes = {}  # 分段只含视频流，外推的体积偏小，放弃判断偏保守
+
+    def _manifest_path(self):
+        return os.path.join(self.work_dir, "manifest.json")
+
+    def _prepare_work_dir(self):
+        """
+        源文件或编码参数变了就清空重来；否则只清理上次没编完的 .partial 文件
+        """
+        st = os.stat(self.src)
+        expect = {
+            "src": self.src,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "signature": self.signature,
+            "segment_secs": self.segment_secs,
+        }
+        manifest = {}
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception:
+            pass
+        if any(manifest.get(k) != v for k, v in expect.items()):
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            manifest = dict(expect, segments=None)
+        os.makedirs(self.work_dir, exist_ok=True)
+        for name in os.listdir(self.work_dir):
+            if name.endswith(".partial.mkv"):
+                os.remove(os.path.join(self.work_dir, name))
+        return manifest
+
+    def _save_manifest(self, manifest):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, self._manifest_path())
+
+    def _split(self, manifest):
+        if manifest.get("segments"):
+            return manifest["segments"]
+        for name in os.listdir(self.work_dir):
+            if name.startswith("src_"):
+                os.remove(os.path.join(self.work_dir, name))
+        rc = self._run_quiet([
+            "ffmpeg", "-y", "-hide_banner", "-v", "warning",
+            "-i", self.src,
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(self.segment_secs),
+            "-reset_timestamps", "1",
+            os.path.join(self.work_dir, "src_%05d.mkv"),
+        ])
+        if rc != 0 or self.stopped:
+            return None
+        manifest["segments"] = sorted(n for n in os.listdir(self.work_dir) if n.startswith("src_"))
+        self._save_manifest(manifest)
+        return manifest["segments"]
+
+    def _encode_segment(self, name, on_progress):
+        seg_src = os.path.join(self.work_dir, name)
+        final = os.path.join(self.work_dir, "enc_" + name[4:])
+        if os.path.exists(final):
+            return 0
+        partial = final[:-4] + ".partial.mkv"
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-v", "warning",
+            "-i", seg_src,
+            "-map", "0:v:0",
+        ] + self.video_args + [
+            "-an", "-sn",
+            "-progress", "pipe:1",
+            "-nostats",
+            partial,
+        ]
+
+        def on_time(secs):
+            self._seg_done[name] = secs
+            self.done_secs = min(sum(self._seg_done.values()), self.duration)
+            self._check_abort()
+            on_progress(self)
+
+        def on_size(n):
+            self._seg_bytes[name] = n
+            self.out_bytes = sum(self._seg_bytes.values())
+
+        rc = self._pump(self._popen(cmd), on_time, on_size)
+        if rc == 0 and not self.stopped:
+            os.replace(partial, final)
+            return 0
+        if os.path.exists(partial):
+            os.remove(partial)  # 停止或失败：删掉未完成的分段
+        return rc or 1
+
+    def _concat_and_mux(self, segments):
+        list_file = os.path.join(self.work_dir, "concat.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            for name in segments:
+                path = os.path.join(self.work_dir, "enc_" + name[4:]).replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
+        video = os.path.join(self.work_dir, "video.mkv")
+        rc = self._run_quiet([
+            "ffmpeg", "-y", "-hide_banner", "-v", "warning",
+            "-f", "concat", "-safe", "0",
+            "-i", list_file,
+            "-c", "copy",
+            video,
+        ])
+        if rc != 0 or self.stopped:
+            return rc or 1
+        # 与整段编码相同的映射：音轨、字幕、章节、元数据都来自源文件
+        return self._run_quiet([
+            "ffmpeg", "-y", "-hide_banner", "-v", "warning",
+            "-i", video,
+            "-i", self.src,
+            "-map", "0:v:0",
+            "-map", "1:a?",
+            "-map", "1:s?",
+            "-c", "copy",
+        ] + self.audio_args + [
+            "-map_metadata", "1",
+            "-map_chapters", "1",
+            "-f", "matroska",
+            self.out,
+        ])
+
+    def execute(self, on_progress):
+        manifest = self._prepare_work_dir()
+        segments = self._split(manifest)
+        if segments is None:
+            return 1
+        for name in segments:
+            enc = os.path.join(self.work_dir, "enc_" + name[4:])
+            if os.path.exists(enc):
+                self._seg_done[name] = probe_media(os.path.join(self.work_dir, name)).duration
+                self._seg_bytes[name] = os.path.getsize(enc)
+        self.out_bytes = sum(self._seg_bytes.values())
+        reused = len(self._seg_done)
+        if reused and self.on_log:
+            self.on_log(f"复用已完成的分段 {reused}/{len(segments)}: {os.path.basename(self.src)}")
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            results = list(pool.map(lambda n: self._encode_segment(n, on_progress), segments))
+        if self.stopped:
+            return 255
+        if any(rc != 0 for rc in results):
+            return next(rc for rc in results if rc != 0)
+
+        rc = self._concat_and_mux(segments)
+        if rc == 0 and not self.stopped:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return rc
+
+    def discard(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class CompressThread(Worker):
+    """
+    压缩调度器：同时运行 jobs 个 ffmpeg，按并发数均分 CPU 线程，
+    adaptive=True 时根据 CPU 占用在 1..max_jobs 之间调整并发。
+    """
+    progress = Signal(int, int)
+    job_progress = Signal(str, int)
+    job_state = Signal(str, str)
+    log = Signal(str)
+    finished = Signal()
+    output_ready = Signal(str, str)
+    telemetry = Signal(str, dict)
+    batch_telemetry = Signal(dict)
+    
+    def __init__(self, files=(), delete_source=False, encoder="libx264", crf=21, crfs=None,
+                 jobs=1, adaptive=False, max_jobs=None, pin_cpus=False, job_queue=None,
+                 chunked=False, chunk_parallel=CHUNK_PARALLEL, abort_below_pct=ABORT_BELOW_PCT,
+                 remux=True, audio=None, audio_only=False,
+                 priorities=None, budget_secs=None, budget_bytes=None,
+                 verify_decode=False, governor=None,
+                 scratch_dir=SCRATCH_DIR, prefetch=False,
+                 telemetry_dir=TELEMETRY_DIR, prom_textfile=PROMETHEUS_TEXTFILE):
+        super().__init__()
+        self.telemetry_dir = telemetry_dir
+        self.prom_textfile = prom_textfile
+        self.delete_source = delete_source
+        self.encoder = encoder
+        self.crf = int(crf)
+        self.jobs = max(1, int(jobs))
+        self.adaptive = adaptive
+        self.max_jobs = max(self.jobs, int(max_jobs or self.jobs))
+        self.pin_cpus = pin_cpus
+        self.job_queue = job_queue or JobQueue()
+        # 预算：运行超过 budget_secs 秒就停止（未完成的放回队列），实际节省达到 budget_bytes 后不再启动新任务
+        self.budget_secs = budget_secs
+        self.budget_bytes = budget_bytes
+        self._saved_bytes = 0
+        self._budget_logged = False
+        self.governor_policy = governor  # 负载调速策略（见 governor.GOVERNOR_POLICY），None 不调速
+        self.governor = None
+        self.scratch_dir = scratch_dir  # 写入中的输出放在这里（SSD/tmpfs），完成后移到源文件旁边
+        self.prefetcher = Prefetcher() if prefetch else None
+        self._reserved = {}  # src -> [(设备号, 预留字节), ...]，同时开始的任务不会高估剩余空间
+        self._verifier = None  # 校验线程，和后续编码并行
+        self._verifying = 0
+        options = {
+            "delete_source": delete_source,
+            "chunked": chunked,
+            "chunk_parallel": chunk_parallel,
+            "abort_below_pct": abort_below_pct,
+            "remux": remux,
+            "audio": audio_policy(audio),  # None：音轨全部复制
+            "audio_only": audio_only,
+            "verify_decode": verify_decode,  # 校验时再抽样解码输出
+        }
+        cache = load_cache() if files else None  # 时长从分析结果里取，入队时不探测
+        for src in files:
+            # crfs: 目标质量模式下每个文件各自搜索出的 crf；priorities: 计划给出的优先级（节省字节/CPU 秒）
+            self.job_queue.add(src, encoder, (crfs or {}).get(src, self.crf), options=options,
+                               priority=(priorities or {}).get(src, 0),
+                               duration=(cache.get(src) or {}).get("duration", 0))
+        if cache is not None:
+            cache.close()
+        self._target = self.jobs
+        self._pause = False
+        self._stop = False
+        self._lock = threading.Lock()
+        self._running = {}  # src -> EncodeJob
+        self._cpu_samples = []
+        self._done_secs = 0.0
+        self._total_secs = 0.0
+    
+    def pause(self):
+        self._pause = True
+        for job in self._jobs():
+            job.pause()
+    
+    def resume(self):
+        self._pause = False
+        for job in self._jobs():
+            job.resume()
+    
+    def stop(self):
+        self._stop = True
+        for job in self._jobs():
+            job.stop()
+
+    def pause_job(self, src):
+        job = self._running.get(src)
+        if job:
+            job.pause()
+            self.job_state.emit(src, "paused")
+
+    def resume_job(self, src):
+        job = self._running.get(src)
+        if job:
+            job.resume()
+            self.job_state.emit(src, "running")
+
+    def stop_job(self, src):
+        job = self._running.get(src)
+        if job:
+            job.stop()
+
+    def _jobs(self):
+        with self._lock:
+            return list(self._running.values())
+
+    def _threads_per_job(self):
+        return max(1, (os.cpu_count() or 1) // self._target)
+
+    def _pick_cpus(self):
+        """
+        为新任务挑一组与其它运行中任务不重叠的 CPU
+        """
+        if not self.pin_cpus:
+            return None
+        n = os.cpu_count() or 1
+        per_job = max(1, n // self._target)
+        used = set()
+        for job in self._jobs():
+            used.update(job.cpus or [])
+        for start in range(0, n, per_job):
+            cpus = list(range(start, min(start + per_job, n)))
+            if not used.intersection(cpus):
+                return cpus
+        return None
+
+    def _adapt(self):
+        if not self.adaptive:
+            return
+        import psutil
+        self._cpu_samples.append(psutil.cpu_percent(interval=None))
+        if len(self._cpu_samples) * 0.5 < COMPRESS_ADAPT_INTERVAL:
+            return
+        cpu = sum(self._cpu_samples) / len(self._cpu_samples)
+        self._cpu_samples = []
+        old = self._target
+        pending = self.job_queue.counts().get("pending", 0)
+        if cpu < COMPRESS_CPU_LOW and pending and len(self._running) >= self._target:
+            self._target = min(self._target + 1, self.max_jobs)
+        elif cpu > COMPRESS_CPU_HIGH and self._target > 1:
+            self._target -= 1  # 只是不再启动新任务，运行中的任务不受影响
+        if self._target != old:
+            self.log.emit(f"自适应并发: {old} -> {self._target}（CPU {cpu:.0f}%）")
+
+    def _start_job(self, queued):
+        src = queued["src"]
+        probe = probe_media(src)
+        duration_src = probe.duration
+        if duration_src <= 0:
+            self.job_queue.finish(queued["id"], "skipped", "无法读取时长")
+            self.job_state.emit(src, "skipped")
+            return None
+        if queued["duration"] <= 0:
+            with self._lock:
+                self._total_secs += duration_src  # 入队时不知道时长的任务（旧版队列等）现在计入总进度
+
+        encoder, crf, dst = queued["encoder"], queued["crf"], queued["dst"]
+        width, height = probe.resolution
+        info = analyze_video(src, self.cache)
+        options = queued["options"]
+        policy = options.get("audio")
+        audio_args = build_audio_args(ensure_audio_streams(info, self.cache) if info and policy else [], policy)
+        if options.get("audio_only"):
+            save_cache(self.cache)
+            if not info or not transcoded_tracks(info, policy):
+                self.job_queue.finish(queued["id"], "skipped", "没有需要转码的音轨")
+                self.job_state.emit(src, "skipped")
+                return None
+            return self._start_stream_copy(queued, info, duration_src, "audio", audio_args)
+        if options.get("remux", True) and remux_candidate(info):
+            save_cache(self.cache)
+            return self._start_stream_copy(queued, info, duration_src, "remux", audio_args)
+        if dst in (output_path_for(src, action) for action in STREAM_COPY_ACTIONS):
+            # 此前按换封装排过、失败后改为重新编码：输出名换回编码器的
+            dst = queued["dst"] = output_path_for(src, encoder)
+            self.job_queue.set_dst(queued["id"], dst)
+        if is_aborted(info, encoder, crf):
+            save_cache(self.cache)
+            self.job_queue.finish(queued["id"], "skipped", f"{encoder}/crf {crf} 此前已提前放弃")
+            self.job_state.emit(src, "skipped")
+            return None
+        content, content_conf = ensure_content_class(info, self.cache) if info else ("film", 0.0)
+        save_cache(self.cache)  # 不提交的话缓存的写锁会挡住任务队列（同一个数据库）
+        chunked = options.get("chunked") and duration_src >= CHUNK_MIN_SECS
+        out = self._stage(queued, info, "encode", chunked)
+        if out is None:
+            return None
+        is_animation = content == "animation"
+        threads = self._threads_per_job() if self._target > 1 else 0
+
+        self.log.emit(
+            f"参数: {width}x{height} | "
+            f"{'动画' if is_animation else '实拍'}({content_conf:.0%}) | "
+            f"encoder={encoder} | crf={crf}"
+            + (f" | threads={threads}" if threads else "")
+            + (f" | 第 {queued['attempts']} 次尝试" if queued["attempts"] > 1 else "")
+        )
+        abort_below_pct = options.get("abort_below_pct")
+        if chunked:
+            parallel = options.get("chunk_parallel", CHUNK_PARALLEL)
+            seg_threads = max(1, (threads or os.cpu_count() or 1) // parallel)
+            job = ChunkedEncodeJob(
+                src, dst, duration_src,
+                build_video_args(encoder, crf, width, height, is_animation, seg_threads),
+                signature=f"{encoder}:{crf}:{int(is_animation)}",
+                parallel=parallel,
+                cpus=self._pick_cpus(),
+                abort_below_pct=abort_below_pct,
+                audio_args=audio_args,
+                out=out
+            )
+            self.log.emit(f"分段并行编码: 每段 {job.segment_secs} 秒，{parallel} 段同时编码")
+        else:
+            cmd = build_encode_cmd(src, out, encoder, crf, width, height, is_animation, threads, audio_args)
+            job = EncodeJob(src, dst, duration_src, cmd, cpus=self._pick_cpus(), abort_below_pct=abort_below_pct,
+                            out=out)
+        job.queued = queued
+        preset = video_preset(build_video_args(encoder, crf, width, height, is_animation))
+        job.telemetry = JobTelemetry(job, encoder, crf, preset, width, height, self.telemetry_dir)
+        return self._launch(job)
+
+    def _start_stream_copy(self, queued, info, duration_src, action, audio_args):
+        """
+        视频流直接复制的任务（换封装 / 只转音轨）：不分段、不做提前放弃判断，输出改名为 <源文件>_<方式>.mkv
+        """
+        src = queued["src"]
+        dst = output_path_for(src, action)
+        if dst != queued["dst"]:
+            self.job_queue.set_dst(queued["id"], dst)
+            queued["dst"] = dst
+        out = self._stage(queued, info, action)
+        if out is None:
+            return None
+        if action == "remux":
+            params = f"{info['codec']} 已是高效编码，只换封装 {os.path.splitext(src)[1].lower()} -> .mkv"
+        else:
+            params = f"视频直接复制，转码 {transcoded_tracks(info, queued['options']['audio'])} 条音轨"
+        self.log.emit(
+            f"参数: {params}"
+            + (f" | 第 {queued['attempts']} 次尝试" if queued["attempts"] > 1 else "")
+        )
+        job = EncodeJob(src, dst, duration_src, build_remux_cmd(src, out, audio_args), out=out)
+        job.action = action
+        job.queued = queued
+        job.telemetry = JobTelemetry(job, "copy", 0, action, info.get("width", 0), info.get("height", 0),
+                                     self.telemetry_dir)
+        return self._launch(job)
+
+    def _stage(self, queued, info, action, chunked=False):
+        """
+        选定写入位置并按预计输出大小检查剩余空间，返回写入路径；目标磁盘放不下时跳过该任务、返回 None。
+        临时目录放不下时退回写在目标旁边。
+        """
+        from .planner import estimate  # planner 依赖本模块，用到时再导入
+        src, dst = queued["src"], queued["dst"]
+        size = os.path.getsize(src)
+        options = queued["options"]
+        est = estimate(info, queued["encoder"], queued["crf"], {}, options.get("audio"),
+                       action == "remux", action == "audio") if info else None
+        need = int((size - (est[1] if est else 0)) * (1 + SPACE_MARGIN)) + SPACE_RESERVE
+        # 分段编码另有视频流切片、编码后的分段和拼接出的视频流
+        work_need = need * 3 + size if chunked else need
+        out = partial_path_for(dst)
+        if self.scratch_dir:
+            scratch_free = self._free_bytes(self.scratch_dir)
+            if scratch_free is None or scratch_free >= work_need:
+                out = partial_path_for(dst, self.scratch_dir)
+            else:
+                self.log.emit(f"临时目录剩余 {scratch_free / 1024 ** 3:.1f} GB，不够 {os.path.basename(src)} "
+                              f"（约需 {work_need / 1024 ** 3:.1f} GB），直接写到目标目录")
+        # 同一文件系统上最后只是改名；否则目标盘只需放下最终输出
+        same = device_of(out) == device_of(dst)
+        dst_need = work_need if same else need
+        dst_free = self._free_bytes(dst)
+        if dst_free is not None and dst_free < dst_need:
+            reason = f"磁盘空间不足：约需 {dst_need / 1024 ** 3:.1f} GB，剩余 {dst_free / 1024 ** 3:.1f} GB"
+            self.log.emit(f"跳过 {os.path.basename(src)}（{reason}）")
+            self.job_queue.finish(queued["id"], "skipped", reason)
+            self.job_state.emit(src, "skipped")
+            return None
+        with self._lock:
+            self._reserved[src] = [(device_of(out), work_need)] + ([] if same else [(device_of(dst), need)])
+        self.job_queue.set_work(queued["id"], out)
+        return out
+
+    def _free_bytes(self, path):
+        """
+        剩余空间减去同一文件系统上其它运行中任务还没写出的预留
+        """
+        free = free_bytes(path)
+        if free is None:
+            return None
+        dev = device_of(path)
+        with self._lock:
+            running = {job.src: job for job in self._running.values()}
+            reserved = sum(max(need - (running[src].out_bytes if src in running else 0), 0)
+                           for src, items in self._reserved.items() for d, need in items if d == dev)
+        return free - reserved
+
+    def _launch(self, job):
+        job.on_log = self.log.emit
+        with self._lock:
+            self._running[job.src] = job
+        t = threading.Thread(target=self._run_job, args=(job,), daemon=True)
+        t.start()
+        return t
+
+    def _remove_partial(self, dst):
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+                self.log.emit(f"已删除未完成文件: {os.path.basename(dst)}")
+        except Exception:
+            self.log.emit(f"无法删除残留文件: {os.path.basename(dst)}")
+
+    def _on_job_progress(self, job):
+        percent = min(int(job.done_secs / job.duration * 100), 100)
+        if percent != job.percent:
+            job.percent = percent
+            self.job_progress.emit(job.src, percent)
+
+    def _run_job(self, job):
+        src = job.src
+        self.log.emit(f"开始{ACTION_TEXT[job.action]}: {os.path.basename(src)}")
+        self.job_state.emit(src, "running")
+        if self._pause:
+            job.pause()
+        try:
+            returncode = job.execute(self._on_job_progress)
+            job.telemetry.end()
+
+            with self._lock:
+                del self._running[src]
+                self._done_secs += job.duration
+
+            state = self._settle_job(job, returncode)
+        except Exception as e:
+            state = self._job_crashed(job, e)
+        if state != "verifying":
+            try:
+                self._finish_telemetry(job, state)
+            except OSError:
+                pass
+
+    def _job_crashed(self, job, err):
+        """
+        任务线程里的异常（没有 ffmpeg、源文件在排队后被删、磁盘满或只读等）：清理后按失败处理（会重试）。
+        不这样的话任务一直留在 _running 里，调度循环等不到结束
+        """
+        self.log.emit(f"任务出错: {os.path.basename(job.src)}: {err}")
+        job.stop()  # 还在运行的 ffmpeg（比如分段编码的其它分段）
+        job.telemetry.end()
+        with self._lock:
+            if self._running.pop(job.src, None) is not None:
+                self._done_secs += job.duration
+            self._reserved.pop(job.src, None)
+        self._remove_partial(job.out)
+        return self._job_failed(job, f"出错: {err}")
+
+    def _finish_telemetry(self, job, state):
+        """
+        状态确定后（校验完）再写遥测汇总，校验失败的任务不会作为成功记入 history.jsonl
+        """
+        summary = job.telemetry.finish(state)
+        if state == "done":
+            self.log.emit(
+                f"完成: {os.path.basename(job.src)} | 用时 {format_secs(summary['wall_secs'])} | "
+                f"{summary['speed']:.2f}x | {summary['fps']:.0f} fps | CPU {summary['cpu_pct']:.0f}% | "
+                f"内存峰值 {summary['peak_rss_mb']:.0f} MB"
+            )
+
+    def _settle_job(self, job, returncode):
+        """
+        按编码结果更新队列和界面，返回最终状态；编码成功时交给校验线程，返回 "verifying"
+        """
+        src = job.src
+        job_id = job.queued["id"]
+        with self._lock:
+            self._reserved.pop(src, None)
+        if job.aborted is not None:
+            self._job_aborted(job)
+            return "aborted"
+        if job.stopped:
+            self._remove_partial(job.out)
+            if self._stop:
+                self.job_queue.release(job_id)  # 整批停止：下次继续（已完成的分段会被复用）
+            else:
+                self.job_queue.finish(job_id, "skipped", "用户停止")
+                if isinstance(job, ChunkedEncodeJob):
+                    job.discard()
+            self.job_state.emit(src, "stopped")
+            return "stopped"
+        if returncode != 0:
+            err = "\n".join(job.tail)
+            self.log.emit(f"ffmpeg 失败（返回码 {returncode}）：{err}")
+            self._remove_partial(job.out)
+            return self._job_failed(job, err or f"返回码 {returncode}")
+        if not os.path.exists(job.out) or os.path.getsize(job.out) == 0:
+            self.log.emit("输出文件为空，压缩失败")
+            self._remove_partial(job.out)
+            return self._job_failed(job, "输出文件为空")
+        # 校验在单独的线程里做，编码槽位马上让给下一个任务；任务在校验通过、放到 dst 之前仍是 running
+        with self._lock:
+            self._verifying += 1
+        self.job_state.emit(src, "verifying")
+        self._verifier.submit(self._verify_job, job)
+        return "verifying"
+
+    def _verify_job(self, job):
+        """
+        校验写入中的输出（job.out）：比较源文件和输出的时长/流/章节（可选抽样解码），
+        通过才放到 dst、记录输出、删除源文件；不通过就删掉输出按失败处理（还有重试次数时重新排队）。
+        最后按确定的状态写遥测汇总
+        """
+        state = "failed"
+        try:
+            result = verify_output(job.src, job.out, job.queued["options"].get("verify_decode", False))
+            if result["ok"]:
+                state = self._job_verified(job, result)
+            else:
+                reason = "；".join(result["problems"])
+                self.log.emit(f"校验失败: {os.path.basename(job.src)}（{reason}），删除输出、保留源文件")
+                self._remove_partial(job.out)
+                info = analyze_video(job.src, self.cache)
+                if info:
+                    info["verify_failed"] = result
+                    self.cache[job.src] = info
+                    save_cache(self.cache)
+                state = self._job_failed(job, f"校验失败: {reason}")
+        except Exception as e:
+            self.log.emit(f"校验出错: {os.path.basename(job.src)}: {e}，保留源文件")
+            self._remove_partial(job.out)
+            self.job_queue.finish(job.queued["id"], "failed", f"校验出错: {e}")
+            self.job_state.emit(job.src, "failed")
+        finally:
+            try:
+                self._finish_telemetry(job, state)
+            except OSError:
+                pass
+            with self._lock:
+                self._verifying -= 1
+
+    def _job_verified(self, job, result):
+        """
+        校验通过：放到 dst、记录输出，按需删除源文件，返回最终状态
+        """
+        src, dst = job.src, job.dst
+        if job.out != dst:
+            try:
+                if place_output(job.out, dst) == "copy":
+                    self.log.emit(f"已从临时目录复制到: {dst}")
+            except OSError as e:
+                self.log.emit(f"无法把输出放到 {dst}: {e}")
+                self._remove_partial(job.out)
+                return self._job_failed(job, f"无法放置输出: {e}")
+        self._record_output(job, result)
+        with self._lock:
+            self._saved_bytes += os.path.getsize(src) - os.path.getsize(dst)
+        self.job_queue.finish(job.queued["id"], "done")
+        self.job_state.emit(src, "done")
+        self.output_ready.emit(src, dst)
+        checked = f"，抽样解码 {result['decoded']} 段" if result["decoded"] else ""
+        if job.queued["options"].get("delete_source"):
+            try:
+                os.remove(src)
+                self.log.emit(f"校验通过{checked}，已删除源文件: {os.path.basename(src)}")
+            except OSError as e:
+                self.log.emit(f"校验通过{checked}，但无法删除源文件 {os.path.basename(src)}: {e}")
+        else:
+            self.log.emit(f"校验通过{checked}: {os.path.basename(dst)}")
+        return "done"
+
+    def _job_aborted(self, job):
+        """
+        预计节省不足：删掉半成品，在缓存里记下该编码器/crf，以后不再排队
+        """
+        src = job.src
+        encoder, crf = job.queued["encoder"], job.queued["crf"]
+        if job.abort_below_pct is not None and job.aborted >= 0:
+            reason = f"预计节省 {job.aborted}%，低于 {job.abort_below_pct}%"
+        else:
+            reason = f"预计输出比源文件大 {-job.aborted}%"
+        self.log.emit(f"提前放弃: {os.path.basename(src)}（{reason}，已编码 {job.done_secs / 60:.1f} 分钟）")
+        self._remove_partial(job.out)
+        if isinstance(job, ChunkedEncodeJob):
+            job.discard()
+        info = analyze_video(src, self.cache)
+        if info:
+            info.setdefault("aborted", {})[encode_key(encoder, crf)] = {
+                "save_pct": job.aborted,
+                "threshold": job.abort_below_pct,
+                "time": time.time(),
+            }
+            self.cache[src] = info
+            save_cache(self.cache)
+        self.job_queue.finish(job.queued["id"], "skipped", reason)
+        self.job_state.emit(src, "aborted")
+
+    def _record_output(self, job, verify=None):
+        """
+        在源文件的缓存记录里记下处理方式、输出和校验结果，界面据此显示"转封装"/"重新编码"
+        """
+        info = analyze_video(job.src, self.cache)
+        if not info:
+            return
+        info.pop("verify_failed", None)
+        info["output"] = {
+            "action": job.action,
+            "path": job.dst,
+            "size": os.path.getsize(job.dst),
+            "encoder": "copy" if job.action in STREAM_COPY_ACTIONS else job.queued["encoder"],
+            "crf": None if job.action in STREAM_COPY_ACTIONS else job.queued["crf"],
+            "audio": job.queued["options"].get("audio"),
+            "verify": verify,
+            "time": time.time(),
+        }
+        self.cache[job.src] = info
+        save_cache(self.cache)
+
+    def _job_failed(self, job, err):
+        if job.action == "remux":
+            # 换封装失败（多半是 MKV 装不下某路流）：记下来，重试时改为重新编码
+            info = analyze_video(job.src, self.cache)
+            if info:
+                info["remux_failed"] = time.time()
+                self.cache[job.src] = info
+                save_cache(self.cache)
+        state = self.job_queue.finish(job.queued["id"], "failed", err)
+        if state == "pending":
+            with self._lock:
+                self._total_secs += job.duration  # 重试的任务重新计入总进度
+            self.log.emit(f"稍后重试: {os.path.basename(job.src)}")
+        self.job_state.emit(job.src, state)
+        return state
+
+    def _sample_telemetry(self):
+        """
+        每 TELEMETRY_INTERVAL 秒采样一次运行中的任务，并估算整批剩余时间
+        """
+        jobs = self._jobs()
+        samples = {}
+        for job in jobs:
+            rec = job.telemetry.sample()
+            if rec:  # 第一次采样前就已结束的任务（比如很短的换封装）没有数据
+                samples[job.src] = rec
+        for src, rec in samples.items():
+            self.telemetry.emit(src, rec)
+        with self._lock:
+            done = self._done_secs + sum(job.done_secs for job in jobs)
+        speed = sum(rec["speed"] for rec in samples.values())
+        remaining = max(self._total_secs - done, 0)
+        batch = {
+            "running": len(jobs),
+            "done_secs": round(done, 1),
+            "total_secs": round(self._total_secs, 1),
+            "fps": round(sum(rec["fps"] for rec in samples.values()), 1),
+            "speed": round(speed, 3),
+            "cpu_pct": round(sum(rec["cpu_pct"] for rec in samples.values()), 1),
+            "eta_secs": round(remaining / speed) if speed > 0 else None,
+        }
+        self.batch_telemetry.emit(batch)
+        if self.prom_textfile:
+            try:
+                write_prometheus(self.prom_textfile, batch, samples, self.job_queue.counts())
+            except OSError as e:
+                self.log.emit(f"无法写入 Prometheus 文件: {e}")
+                self.prom_textfile = None
+
+    def _budget_reached(self):
+        if not self.budget_bytes or self._saved_bytes < self.budget_bytes:
+            return False
+        if not self._budget_logged:
+            self._budget_logged = True
+            self.log.emit(f"已节省 {self._saved_bytes / 1024 ** 3:.1f} GB，达到目标，不再启动新任务")
+        return True
+
+    def _prefetch_next(self):
+        """
+        当前任务编码时把队列里下一个源文件的开头读进页缓存
+        """
+        src = self.job_queue.peek()
+        if src and src not in self._running and self.prefetcher.prefetch(src):
+            self.log.emit(f"预读: {os.path.basename(src)}")
+
+    def _emit_progress(self):
+        jobs = self._jobs()
+        with self._lock:
+            done = self._done_secs + sum(job.done_secs for job in jobs)
+        total_percent = int(done / self._total_secs * 100) if self._total_secs else 0
+        file_percent = min(job.percent for job in jobs) if jobs else 100
+        self.progress.emit(file_percent, min(total_percent, 100))
+
+    def _schedule(self, threads, deadline):
+        """
+        调度循环：按并发数从队列取任务启动，直到队列取空且没有运行/校验中的任务，或被停止
+        """
+        next_sample = time.monotonic() + TELEMETRY_INTERVAL
+        while not self._stop:
+            exhausted = self._budget_reached()
+            if deadline is not None and time.monotonic() >= deadline:
+                self.log.emit(f"时间预算已用完（{format_secs(self.budget_secs)}），未完成的任务留在队列里")
+                self.stop()
+                break
+            self._adapt()
+            # 调速挂起期间不启动新任务
+            held = self.governor is not None and self.governor.tick(self._jobs(), self._pause) == "suspend"
+            while not exhausted and not held and not self._pause and not self._stop \
+                    and len(self._running) < self._target:
+                queued = self.job_queue.claim()
+                if queued is None:
+                    exhausted = True
+                    break
+                t = self._start_job(queued)
+                if t is None:
+                    self._total_secs -= queued["duration"]
+                else:
+                    threads.append(t)
+            threads[:] = [t for t in threads if t.is_alive()]
+            if self.prefetcher is not None and self._running and not held:
+                self._prefetch_next()
+            self._emit_progress()
+            if time.monotonic() >= next_sample:
+                self._sample_telemetry()
+                next_sample = time.monotonic() + TELEMETRY_INTERVAL
+            if exhausted and not self._running and not self._verifying:
+                # 校验失败的任务可能刚放回队列
+                if self._stop or self._budget_reached() or self.job_queue.peek() is None:
+                    break
+            time.sleep(0.5)
+
+    def run(self):
+        # 总进度按时长加权（时长是入队时记下的，不调用 ffprobe）
+        self._total_secs = self.job_queue.pending_seconds()
+        self.cache = load_cache()
+        threads = []
+        deadline = time.monotonic() + self.budget_secs if self.budget_secs else None
+        self._verifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="verify")
+        if self.governor_policy is not None:
+            self.governor = Governor(self.governor_policy, self.log.emit, self.telemetry_dir)
+        if self.scratch_dir:
+            try:
+                os.makedirs(self.scratch_dir, exist_ok=True)
+            except OSError as e:
+                self.log.emit(f"无法使用临时目录 {self.scratch_dir}: {e}，输出直接写到目标目录")
+                self.scratch_dir = None
+
+        try:
+            self._schedule(threads, deadline)
+        except Exception as e:
+            # 比如数据库一直被锁：停止运行中的任务（留在队列里下次继续），照常收尾、发出 finished
+            self.log.emit(f"调度出错，停止压缩: {e}")
+            self.stop()
+
+        if self.governor is not None:
+            self.governor.release(self._jobs())
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        for t in threads:
+            t.join()
+        self._verifier.shutdown(wait=True)
+        if self.governor is not None:
+            self.log.emit(self.governor.summary_text())
+        self.cache.close()
+        self._emit_progress()
+        self.finished.emit()
@@ -0,0 +1,78 @@
+# -*- coding:utf-8 -*-
+"""
+内容指纹：文件大小 + 头/中/尾三块的 blake2b。
+只读 3 块，和路径无关；缓存按路径找不到时用它找回移动/改名前的分析结果，
+也用来找出库里内容相同的文件。
+"""
+import os
+import hashlib
+
+FINGERPRINT_BLOCK = 64 * 1024  # 每块读取的字节数
+DIGEST_CHUNK = 1024 * 1024  # 完整校验时每次读取的字节数
+
+
+def content_fingerprint(path, size=None):
+    """
+    返回 "大小:摘要"，读不了时返回 None
+    """
+    try:
+        if size is None:
+            size = os.path.getsize(path)
+        h = hashlib.blake2b(digest_size=16)
+        offsets = sorted({0, max(0, size // 2 - FINGERPRINT_BLOCK // 2), max(0, size - FINGERPRINT_BLOCK)})
+        with open(path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                h.update(f.read(FINGERPRINT_BLOCK))
+    except OSError:
+        return None
+    return f"{size}:{h.hexdigest()}"
+
+
+def ensure_fingerprint(info, cache=None):
+    """
+    给缓存里还没有指纹的旧记录补上（结果写回缓存）
+    """
+    if not info.get("fingerprint"):
+        fingerprint = content_fingerprint(info["path"], info.get("size"))
+        if fingerprint is None:
+            return None
+        info["fingerprint"] = fingerprint
+        if cache is not None:
+            cache[info["path"]] = info
+    return info["fingerprint"]
+
+
+def file_digest(path):
+    """
+    整个文件的 blake2b（确认重复时用，比指纹慢得多）
+    """
+    h = hashlib.blake2b()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def find_duplicates(cache, verify=False):
+    """
+    缓存里指纹相同、且文件都还在的记录分组，返回 [[路径, ...], ...]（按占用空间从大到小）。
+    verify=True 时再按完整内容摘要确认，只有整文件相同的才算重复。
+    """
+    groups = []
+    for fingerprint in cache.duplicate_fingerprints():
+        paths = sorted(info["path"] for info in cache.find_fingerprint(fingerprint)
+                       if os.path.exists(info["path"]))
+        if verify:
+            by_digest = {}
+            for path in paths:
+                by_digest.setdefault(file_digest(path), []).append(path)
+            candidates = [g for digest, g in by_digest.items() if digest is not None]
+        else:
+            candidates = [paths]
+        groups.extend(g for g in candidates if len(g) > 1)
+    groups.sort(key=lambda g: -int(cache.get(g[0], {}).get("size", 0)) * (len(g) - 1))
+    return groups
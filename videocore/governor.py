@@ -0,0 +1,252 @@
+# -*- coding:utf-8 -*-
+"""
+负载调速：后台压缩给其它服务（比如 Emby 转码/播放）让路。
+按系统 CPU（扣除自己的编码进程）、iowait 和指定进程的 CPU 占用，
+把运行中的编码降低优先级（renice）或挂起，负载回落一段时间后再恢复；
+允许时段（比如 01:00-08:00）之外一律挂起、不启动新任务。
+每次调整都写入 telemetry/governor.jsonl，并累计挂起/降优先级的时长，用来评估吞吐代价。
+"""
+import os
+import json
+import time
+
+from .defaults import GOVERNOR_POLICY
+from .telemetry import TELEMETRY_DIR, format_secs
+
+GOVERNOR_INTERVAL = 5.0  # 秒，采样间隔
+GOVERNOR_LEVELS = ("run", "nice", "suspend")  # 由宽到严
+GOVERNOR_TEXT = {"run": "正常运行", "nice": "降低优先级", "suspend": "挂起"}
+
+
+def governor_policy(policy=None):
+    """
+    补全缺省项；policy 为 None 表示不调速
+    """
+    return None if policy is None else {**GOVERNOR_POLICY, **policy}
+
+
+def parse_windows(text):
+    """
+    "01:00-08:00,22:30-23:30" -> [(60, 480), (1350, 1410)]（当天分钟数，结束早于开始表示跨午夜）
+    """
+    windows = []
+    for part in (text or "").replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            (sh, sm), (eh, em) = ((int(h), int(m)) for h, m in (t.strip().split(":") for t in part.split("-")))
+            if not all(0 <= h <= 24 and 0 <= m < 60 for h, m in ((sh, sm), (eh, em))):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"无法识别的时段: {part}（格式为 HH:MM-HH:MM）")
+        start, end = sh * 60 + sm, eh * 60 + em
+        windows.append((start, end))
+    return windows
+
+
+def in_windows(windows, now=None):
+    if not windows:
+        return True
+    t = time.localtime(now)
+    minute = t.tm_hour * 60 + t.tm_min
+    for start, end in windows:
+        if start <= end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):
+            return True
+    return False
+
+
+class Governor:
+    """
+    由 CompressThread 的调度循环定期调用 tick(jobs)：采样负载，决定 运行/降优先级/挂起 并作用到各任务的 ffmpeg 进程。
+    收紧立即生效，放宽要等负载连续 resume_secs 秒低于阈值。
+    """
+
+    def __init__(self, policy, log=None, out_dir=TELEMETRY_DIR):
+        import psutil  # 延迟导入：只有开启调速时才需要
+        self.psutil = psutil
+        self.policy = governor_policy(policy)
+        self.windows = parse_windows(self.policy["windows"])
+        self.names = {n.lower() for n in self.policy["processes"]}
+        self.log = log or (lambda msg: None)
+        self.out_dir = out_dir
+        self.state = "run"
+        self.reason = ""
+        self.durations = dict.fromkeys(GOVERNOR_LEVELS, 0.0)
+        self.decisions = 0
+        self._since = time.monotonic()  # 进入当前状态的时间
+        self._calm_since = None  # 负载开始低于当前状态阈值的时间
+        self._next = time.monotonic() + GOVERNOR_INTERVAL  # 第一次采样要隔一个间隔才有意义
+        self._last_times = psutil.cpu_times()
+        self._last_sample = time.monotonic()
+        self._procs = {}  # pid -> psutil.Process（沿用同一个对象，避免 pid 被复用时认错进程）
+        self._cpu = {}  # pid -> 上次采样时的 CPU 秒数
+        self._seen = {}
+        self._niced = {}  # pid -> 原来的优先级
+        self._suspended = set()  # 由调速挂起的任务
+
+    def _cpu_secs(self, pids, count_new):
+        """
+        这些进程自上次采样以来用掉的 CPU 秒数；第一次见到的进程 count_new 时按启动以来的全部计入
+        （自己的编码进程都是刚启动的），否则只建立基准（被监视的服务可能已经运行了很久）
+        """
+        total = 0.0
+        for pid in pids:
+            try:
+                proc = self._procs.get(pid) or self.psutil.Process(pid)
+                t = proc.cpu_times()
+            except self.psutil.Error:
+                continue
+            secs = t.user + t.system
+            last = self._cpu.get(pid)
+            if last is not None or count_new:
+                total += secs - (last or 0)
+            self._seen[pid] = proc, secs
+        return total
+
+    def _watched_pids(self):
+        if not self.names:
+            return []
+        pids = []
+        for proc in self.psutil.process_iter(["name"]):
+            name = (proc.info["name"] or "").lower()
+            if name in self.names or os.path.splitext(name)[0] in self.names:
+                pids.append(proc.pid)
+        return pids
+
+    def sample(self, jobs):
+        """
+        返回 {"cpu": 其它进程占用的系统 CPU%, "iowait": %, "watched_cpu": 指定进程合计 CPU%（单核为 100）}
+        """
+        now = time.monotonic()
+        wall = max(now - self._last_sample, 1e-3)
+        times = self.psutil.cpu_times()
+        delta = {k: getattr(times, k) - getattr(self._last_times, k) for k in times._fields}
+        self._last_times, self._last_sample = times, now
+        total = sum(v for k, v in delta.items() if k not in ("guest", "guest_nice")) or 1e-9
+        busy = total - delta.get("idle", 0) - delta.get("iowait", 0)
+        own_pids = {pid for job in jobs for pid in job.pids()}
+        self._seen = {}
+        own = self._cpu_secs(own_pids, count_new=True)
+        watched = self._cpu_secs(set(self._watched_pids()) - own_pids, count_new=False)
+        self._procs = {pid: proc for pid, (proc, _) in self._seen.items()}
+        self._cpu = {pid: secs for pid, (_, secs) in self._seen.items()}
+        return {
+            "cpu": round(min(max(busy - own, 0) / total * 100, 100), 1),
+            "iowait": round(delta.get("iowait", 0) / total * 100, 1),  # 只有 Linux 有
+            "watched_cpu": round(watched / wall * 100, 1),
+        }
+
+    def decide(self, load):
+        """
+        按负载给出 (状态, 原因)
+        """
+        p = self.policy
+        if self.names and load["watched_cpu"] >= p["process_cpu"]:
+            return "suspend", f"{'/'.join(p['processes'])} 正忙（CPU {load['watched_cpu']:.0f}%）"
+        if load["cpu"] >= p["cpu_suspend"]:
+            return "suspend", f"其它进程 CPU {load['cpu']:.0f}%"
+        if load["iowait"] >= p["iowait_suspend"]:
+            return "suspend", f"iowait {load['iowait']:.0f}%"
+        if load["cpu"] >= p["cpu_nice"]:
+            return "nice", f"其它进程 CPU {load['cpu']:.0f}%"
+        if load["iowait"] >= p["iowait_nice"]:
+            return "nice", f"iowait {load['iowait']:.0f}%"
+        return "run", "负载已回落"
+
+    def tick(self, jobs, paused=False):
+        """
+        调度循环每轮调用；paused 为用户手动暂停（此时不替用户恢复任务）。返回当前状态
+        """
+        now = time.monotonic()
+        if not in_windows(self.windows):
+            # 时段外立即挂起，不必等采样
+            if self.state != "suspend":
+                self._switch("suspend", f"不在允许时段 {self.policy['windows']}", {}, now)
+        elif now >= self._next:
+            self._next = now + GOVERNOR_INTERVAL
+            load = self.sample(jobs)
+            state, reason = self.decide(load)
+            level, current = GOVERNOR_LEVELS.index(state), GOVERNOR_LEVELS.index(self.state)
+            if level > current:
+                self._switch(state, reason, load, now)
+            elif level < current:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.policy["resume_secs"]:
+                    self._switch(state, reason, load, now)
+            else:
+                self._calm_since = None
+        self._enforce(jobs, paused)
+        return self.state
+
+    def _switch(self, state, reason, load, now):
+        self.durations[self.state] += now - self._since
+        rec = {"time": round(time.time(), 3), "from": self.state, "to": state, "reason": reason,
+               "held_secs": round(now - self._since, 1), **load}
+        self.state, self.reason = state, reason
+        self._since = now
+        self._calm_since = None
+        self.decisions += 1
+        self.log(f"调速: {GOVERNOR_TEXT[state]}（{reason}）")
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(os.path.join(self.out_dir, "governor.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def _enforce(self, jobs, paused):
+        """
+        把当前状态作用到所有任务（分段编码会不断启动新进程，所以每轮都检查）
+        """
+        for job in jobs:
+            if self.state == "suspend":
+                if not job.paused:
+                    job.pause()
+                    self._suspended.add(job)
+            elif job in self._suspended:
+                self._suspended.discard(job)
+                if not paused:
+                    job.resume()
+        self._suspended.intersection_update(jobs)
+        pids = {pid for job in jobs for pid in job.pids()}
+        low = self.psutil.IDLE_PRIORITY_CLASS if os.name == "nt" else 19
+        for pid in pids if self.state == "nice" else ():
+            if pid not in self._niced:
+                try:
+                    proc = self.psutil.Process(pid)
+                    self._niced[pid] = proc.nice()
+                    proc.nice(low)
+                except self.psutil.Error:
+                    pass
+        for pid in list(self._niced):
+            if self.state != "nice" or pid not in pids:
+                original = self._niced.pop(pid)
+                if pid in pids:
+                    try:
+                        self.psutil.Process(pid).nice(original)
+                    except self.psutil.Error:
+                        pass  # 非 root 不能调回更高的优先级，进程结束后自然失效
+
+    def release(self, jobs):
+        """
+        调度结束/停止前恢复被调速挂起和降优先级的任务
+        """
+        now = time.monotonic()
+        self.durations[self.state] += now - self._since
+        self._since = now
+        self.state = "run"
+        self._enforce(jobs, paused=False)
+
+    def summary(self):
+        durations = dict(self.durations)
+        durations[self.state] += time.monotonic() - self._since
+        return {"decisions": self.decisions, **{f"{k}_secs": round(v, 1) for k, v in durations.items()}}
+
+    def summary_text(self):
+        s = self.summary()
+        return (f"调速: 共调整 {s['decisions']} 次，挂起 {format_secs(s['suspend_secs'])}，"
+                f"降低优先级 {format_secs(s['nice_secs'])}")
@@ -0,0 +1,282 @@
+# -*- coding:utf-8 -*-
+"""
+持久化压缩任务队列（与分析缓存共用 SQLite 数据库）
+"""
+import os
+import json
+import sqlite3
+import functools
+import threading
+import time
+
+from .cache import CACHE_DB
+from .staging import partial_path_for
+
+JOB_STATES = ("pending", "running", "done", "failed", "skipped")
+JOB_MAX_ATTEMPTS = 3  # 含首次在内的最多尝试次数
+JOB_STDERR_TAIL = 30  # 失败时保留的 ffmpeg 输出行数
+JOB_LOCK_RETRIES = 5  # 数据库被其它连接锁住（已等满 busy timeout）时的尝试次数
+ENCODER_TAGS = {
+    "libx264": "x264",
+    "libx265": "x265",
+    "libvpx-vp9": "vp9",
+    "libaom-av1": "av1",
+}
+JOB_STATE_TEXT = {
+    "pending": "排队中",
+    "running": "压缩中",
+    "verifying": "校验中",
+    "paused": "已暂停",
+    "done": "完成",
+    "failed": "失败",
+    "stopped": "已停止",
+    "skipped": "跳过",
+    "aborted": "提前放弃",
+}
+
+
+def output_path_for(src, encoder):
+    base, _ = os.path.splitext(src)
+    return f"{base}_{ENCODER_TAGS.get(encoder, encoder)}.mkv"
+
+
+def _retry_locked(method):
+    """
+    数据库被锁（缓存、界面、监控等其它连接正在写）时稍后重试，调度线程不会因为一次锁超时退出。
+    出错时 with self._conn 已回滚，重试是安全的
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        for attempt in range(1, JOB_LOCK_RETRIES + 1):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == JOB_LOCK_RETRIES or "locked" not in str(e):
+                    raise
+                time.sleep(attempt)
+    return wrapper
+
+
+class JobQueue:
+    """
+    持久化压缩队列（SQLite）。状态: pending / running / done / failed / skipped。
+    不依赖 Qt，界面和无界面运行共用；进程崩溃后由 recover() 把 running 的任务放回队列。
+    """
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            src TEXT NOT NULL,
+            dst TEXT NOT NULL,
+            encoder TEXT NOT NULL,
+            crf INTEGER NOT NULL,
+            options TEXT NOT NULL DEFAULT '{}',
+            priority REAL NOT NULL DEFAULT 0,
+            duration REAL NOT NULL DEFAULT 0,
+            work TEXT NOT NULL DEFAULT '',
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            error TEXT NOT NULL DEFAULT '',
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, attempts, id)",
+    ]
+    # 旧版数据库里已有 jobs 表时补上的列
+    COLUMNS = {
+        "priority": "ALTER TABLE jobs ADD COLUMN priority REAL NOT NULL DEFAULT 0",
+        "work": "ALTER TABLE jobs ADD COLUMN work TEXT NOT NULL DEFAULT ''",
+        "duration": "ALTER TABLE jobs ADD COLUMN duration REAL NOT NULL DEFAULT 0",
+    }
+
+    def __init__(self, path=CACHE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            for stmt in self.SCHEMA:
+                self._conn.execute(stmt)
+            have = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, stmt in self.COLUMNS.items():
+                if column not in have:
+                    self._conn.execute(stmt)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(state, attempts, priority DESC, id)")
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    @_retry_locked
+    def add(self, src, encoder, crf, dst=None, options=None, max_attempts=JOB_MAX_ATTEMPTS, priority=0,
+            duration=0):
+        """
+        入队；同一源文件+编码器已有未完成任务时不重复添加（只更新优先级），返回任务 id。
+        duration 为源文件时长（分析结果里有），用于总进度；未知时为 0
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE src = ? AND encoder = ? AND state IN ('pending', 'running')",
+                (src, encoder)
+            ).fetchone()
+            if row:
+                if priority:
+                    self._conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, row["id"]))
+                return row["id"]
+            cur = self._conn.execute(
+                "INSERT INTO jobs (src, dst, encoder, crf, options, priority, duration, max_attempts, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (src, dst or output_path_for(src, encoder), encoder, int(crf),
+                 json.dumps(options or {}, ensure_ascii=False), priority, max(duration or 0, 0),
+                 max_attempts, now, now)
+            )
+            return cur.lastrowid
+
+    @_retry_locked
+    def claim(self):
+        """
+        取出下一个待处理任务并标记为 running（重试的任务排在新任务之后，同一轮内优先级高的先做）
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE state = 'pending' ORDER BY attempts, priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                (time.time(), row["id"])
+            )
+            return self._job(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    @_retry_locked
+    def finish(self, job_id, state, error=""):
+        """
+        state 为 failed 且还有重试次数时放回 pending
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if state == "failed" and row["attempts"] < row["max_attempts"]:
+                state = "pending"
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?",
+                (state, error, time.time(), job_id)
+            )
+            return state
+
+    @_retry_locked
+    def set_dst(self, job_id, dst):
+        """
+        开始处理时才确定输出文件的任务（比如改为换封装）：更新 dst，recover() 才能清理对的文件
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET dst = ?, updated = ? WHERE id = ?", (dst, time.time(), job_id))
+
+    @_retry_locked
+    def set_work(self, job_id, work):
+        """
+        记下写入中的输出路径（可能在临时目录里），recover() 据此清理
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET work = ?, updated = ? WHERE id = ?", (work, time.time(), job_id))
+
+    @_retry_locked
+    def peek(self):
+        """
+        下一个会被 claim() 取出的任务的源文件（用于预读），没有时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT src FROM jobs WHERE state = 'pending' ORDER BY attempts, priority DESC, id LIMIT 1"
+            ).fetchone()
+        return row["src"] if row else None
+
+    @_retry_locked
+    def release(self, job_id):
+        """
+        整批停止时未完成的任务：放回队列，不计入尝试次数
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), updated = ? "
+                "WHERE id = ? AND state = 'running'",
+                (time.time(), job_id)
+            )
+
+    @_retry_locked
+    def recover(self):
+        """
+        启动时调用：上次异常退出时仍为 running 的任务放回队列，并删除其写了一半的输出文件。
+        输出先写到 work、完成后才原子地放到 dst，所以只清理 work 和跨文件系统复制时的 <dst>.partial；
+        没有 work 记录的旧任务是直接写 dst 的，清理 dst
+        """
+        cleaned = []
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT id, dst, work FROM jobs WHERE state = 'running'").fetchall()
+            for row in rows:
+                paths = (row["work"], partial_path_for(row["dst"])) if row["work"] else (row["dst"],)
+                for path in paths:
+                    if os.path.isfile(path):
+                        try:
+                            os.remove(path)
+                            cleaned.append(path)
+                        except OSError:
+                            pass
+            self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), updated = ? "
+                "WHERE state = 'running'",
+                (time.time(),)
+            )
+        return cleaned
+
+    @_retry_locked
+    def retry_failed(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, error = '', updated = ? WHERE state = 'failed'",
+                (time.time(),)
+            )
+
+    @_retry_locked
+    def clear(self, states=("done", "skipped")):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({','.join('?' * len(states))})", tuple(states)
+            )
+
+    @_retry_locked
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: n for state, n in rows}
+
+    @_retry_locked
+    def jobs(self, states=JOB_STATES):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({','.join('?' * len(states))}) ORDER BY id",
+                tuple(states)
+            ).fetchall()
+        return [self._job(r) for r in rows]
+
+    @_retry_locked
+    def pending_seconds(self):
+        """
+        待处理任务的源文件总时长（用于总进度）。用入队时记下的时长，不调用 ffprobe；
+        时长未知（0）的任务在开始处理时再计入
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT TOTAL(duration) FROM jobs WHERE state = 'pending'").fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,151 @@
+# -*- coding:utf-8 -*-
+"""
+压缩计划：估算每个候选的节省字节和 CPU 耗时，按"节省字节 / CPU 秒"从高到低排序，
+可按时长预算（比如一个通宵 8 小时）或节省目标（比如腾出 2 TB）截取。
+节省来自缓存里的采样预测（没有则用静态估算）加上音轨策略省下的部分；
+耗时来自本机历史吞吐（telemetry/history.jsonl），没有历史时按内置参考速度换算。
+"""
+import os
+import json
+from operator import itemgetter
+
+from .audio import audio_save_bytes
+from .defaults import encode_key, remux_candidate
+from .telemetry import TELEMETRY_DIR, resolution_class
+
+# 各分辨率档位的代表像素数，用来在档位之间按像素换算速度
+RES_PIXELS = {"sd": 854 * 480, "720p": 1280 * 720, "1080p": 1920 * 1080, "1440p": 2560 * 1440, "2160p": 3840 * 2160}
+REF_PIXELS = RES_PIXELS["1080p"]
+# 没有历史记录时的参考速度：1080p 下每 CPU 秒编码的媒体秒数（默认参数的量级，偏保守）
+DEFAULT_CPU_SPEED = {"libx264": 0.15, "libx265": 0.03, "libvpx-vp9": 0.04, "libaom-av1": 0.03}
+FALLBACK_CPU_SPEED = 0.03
+STREAM_COPY_BYTES_PER_CPU_SEC = 200 * 1024 * 1024  # 换封装/只转音轨基本只受磁盘限制
+
+
+def speed_profile(out_dir=TELEMETRY_DIR):
+    """
+    本机速度档案：从历史遥测汇总 {(编码器, 分辨率档位): 每 CPU 秒编码的媒体秒数}，
+    另有 {(编码器, None): 折算到 1080p 的速度} 供没有该档位记录时换算
+    """
+    totals = {}
+    try:
+        with open(os.path.join(out_dir, "history.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                cpu_secs = rec.get("wall_secs", 0) * rec.get("cpu_pct", 0) / 100
+                if rec.get("state") != "done" or cpu_secs <= 0 or rec.get("media_secs", 0) <= 0:
+                    continue
+                t = totals.setdefault((rec["encoder"], rec["resolution"]), [0.0, 0.0])
+                t[0] += rec["media_secs"]
+                t[1] += cpu_secs
+    except FileNotFoundError:
+        pass
+    profile = {}
+    ref = {}
+    for (encoder, resolution), (media, cpu) in totals.items():
+        profile[(encoder, resolution)] = media / cpu
+        r = ref.setdefault(encoder, [0.0, 0.0])
+        r[0] += media * RES_PIXELS.get(resolution, REF_PIXELS) / REF_PIXELS
+        r[1] += cpu
+    for encoder, (media, cpu) in ref.items():
+        profile[(encoder, None)] = media / cpu
+    return profile
+
+
+def cpu_speed(profile, encoder, resolution):
+    """
+    每 CPU 秒编码的媒体秒数：优先本机同档位记录，其次按像素从其它档位/参考速度换算
+    """
+    speed = profile.get((encoder, resolution))
+    if speed:
+        return speed
+    ref = profile.get((encoder, None)) or DEFAULT_CPU_SPEED.get(encoder, FALLBACK_CPU_SPEED)
+    return ref * REF_PIXELS / RES_PIXELS.get(resolution, REF_PIXELS)
+
+
+def _estimates(infos, encoder, crf, crfs, profile, audio, remux, audio_only):
+    """
+    逐个候选产出 (路径, 处理方式, 预计节省字节, 预计 CPU 秒)；速度按分辨率记忆，循环里只剩查表和算术
+    """
+    speeds = {}
+    keys = {}
+    for info in infos:
+        if not info or info.get("duration", 0) <= 0:
+            continue
+        path = info["path"]
+        size = info["size"]
+        duration = info["duration"]
+        saved = audio_save_bytes(info["audio"], duration, audio) if audio and info.get("audio") else 0
+        if audio_only or (remux and remux_candidate(info)):
+            yield path, ("audio" if audio_only else "remux"), min(saved, size), size / STREAM_COPY_BYTES_PER_CPU_SEC
+            continue
+        file_crf = crfs.get(path, crf) if crfs else crf
+        key = keys.get(file_crf)
+        if key is None:
+            key = keys[file_crf] = encode_key(encoder, file_crf)
+        pred = info.get("predictions")
+        pred = pred.get(key) if pred else None
+        saved += size * max(pred["save_pct"] if pred else info.get("save_pct", 0), 0) / 100
+        dims = (info.get("width") or 1920, info.get("height") or 1080)
+        speed = speeds.get(dims)
+        if speed is None:
+            speed = speeds[dims] = cpu_speed(profile, encoder, resolution_class(*dims))
+        yield path, "encode", min(saved, size), duration / speed
+
+
+def estimate(info, encoder, crf, profile, audio=None, remux=True, audio_only=False):
+    """
+    单个候选的 (处理方式, 预计节省字节, 预计 CPU 秒)，无法估算时返回 None
+    """
+    for _, action, saved, cpu_secs in _estimates((info,), encoder, crf, None, profile, audio, remux, audio_only):
+        return action, saved, cpu_secs
+    return None
+
+
+def plan_compress(infos, encoder, crf, crfs=None, profile=None, audio=None, remux=True, audio_only=False,
+                  budget_secs=None, budget_bytes=None, cores=None):
+    """
+    按节省字节/CPU 秒排序并按预算截取，返回 (入选, 超出预算, 合计)。
+    入选/超出预算都是 [{"path", "action", "save_bytes", "cpu_secs", "priority"}, ...]（按优先级排序）；
+    时长预算按 cores 个核心满载折算墙钟时间，放不下的大文件跳过、继续看后面更小的；
+    节省目标达到后不再入选。合计为 {"files", "save_bytes", "cpu_secs", "wall_secs"}。
+    """
+    profile = speed_profile() if profile is None else profile
+    cores = cores or os.cpu_count() or 1
+    ranked = [(saved / max(cpu_secs, 1e-3), path, action, saved, cpu_secs)
+              for path, action, saved, cpu_secs
+              in _estimates(infos, encoder, crf, crfs, profile, audio, remux, audio_only)]
+    ranked.sort(key=itemgetter(0), reverse=True)
+
+    budget_cpu = budget_secs * cores if budget_secs else None
+    cut = len(ranked)  # 没有预算时全部入选
+    skipped = set()  # 时长预算下放不下、被跳过的位置
+    total_saved = total_cpu = 0
+    if budget_bytes or budget_cpu is not None:
+        for i, (_, _, _, saved, cpu_secs) in enumerate(ranked):
+            if budget_bytes and total_saved >= budget_bytes:
+                cut = i
+                break
+            if budget_cpu is not None and total_cpu + cpu_secs > budget_cpu:
+                skipped.add(i)
+                continue
+            total_saved += saved
+            total_cpu += cpu_secs
+    else:
+        total_saved = sum(r[3] for r in ranked)
+        total_cpu = sum(r[4] for r in ranked)
+
+    selected, deferred = [], []
+    for i, (priority, path, action, saved, cpu_secs) in enumerate(ranked):
+        item = {"path": path, "action": action, "save_bytes": int(saved), "cpu_secs": cpu_secs, "priority": priority}
+        (deferred if i >= cut or i in skipped else selected).append(item)
+    totals = {
+        "files": len(selected),
+        "save_bytes": int(total_saved),
+        "cpu_secs": round(total_cpu, 1),
+        "wall_secs": round(total_cpu / cores, 1),
+    }
+    return selected, deferred, totals
@@ -0,0 +1,362 @@
+# -*- coding:utf-8 -*-
+"""
+采样预测压缩效果，以及按目标质量（VMAF/SSIM/PSNR）搜索 crf
+"""
+import os
+import subprocess
+import tempfile
+import time
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import load_cache
+from .defaults import encode_key
+from .encode import build_video_args
+from .probe import _NO_WINDOW, _run_ffprobe, probe_media, analyze_video, ensure_content_class
+from .signals import Signal, Worker
+
+PREDICT_SAMPLES = 4  # 抽样片段数
+PREDICT_CLIP_SECS = 6  # 每个片段的时长（秒）
+PREDICT_WORKERS = 2  # 同时预测的文件数
+
+
+def _clip_bytes(cmd, out):
+    """
+    运行 ffmpeg 输出一个片段，返回 (字节数, 耗时秒)；失败返回 (0, 0)
+    """
+    started = time.monotonic()
+    try:
+        r = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           creationflags=_NO_WINDOW)
+        if r.returncode != 0 or not os.path.exists(out):
+            return 0, 0.0
+        return os.path.getsize(out), time.monotonic() - started
+    except Exception:
+        return 0, 0.0
+    finally:
+        if os.path.exists(out):
+            os.remove(out)
+
+
+def predict_encode(info, encoder, crf, samples=PREDICT_SAMPLES, clip_secs=PREDICT_CLIP_SECS, threads=0):
+    """
+    在全片均匀分布的几个位置各流复制出约 clip_secs 秒的参考片段，再从同一片段实际编码，
+    用编码后/原始视频流的字节比外推整片输出体积，用编码耗时外推整片编码时间。
+    返回 dict：save_pct / predicted_size / encode_secs / speed / confidence / samples
+    """
+    path = info["path"]
+    duration = info["duration"]
+    size = info["size"]
+    if duration <= 0 or size <= 0:
+        return None
+    samples = max(1, min(samples, int(duration // (clip_secs * 2)) or 1))
+    clip_secs = min(clip_secs, duration)
+    probe = probe_media(path)
+    width, height = probe.resolution
+    content, _ = ensure_content_class(info)
+    video_args = build_video_args(encoder, crf, width, height, content == "animation", threads)
+
+    src_total = 0
+    out_total = 0
+    sampled_secs = 0.0
+    wall_total = 0.0
+    ratios = []
+    with tempfile.TemporaryDirectory(prefix="vm_predict_") as tmp:
+        for i in range(samples):
+            pos = max(0.0, duration * (i + 1) / (samples + 1) - clip_secs / 2)
+            src_out = os.path.join(tmp, f"src_{i}.mkv")
+            enc_out = os.path.join(tmp, f"enc_{i}.mkv")
+            # 流复制会从 pos 之前的关键帧开始，所以先截出参考片段、再从这个片段编码，两边是同一批帧
+            r = subprocess.run(["ffmpeg", "-y", "-hide_banner", "-v", "error", "-ss", f"{pos:.2f}", "-i", path,
+                                "-t", f"{clip_secs:.2f}", "-map", "0:v:0", "-c", "copy", src_out],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=_NO_WINDOW)
+            if r.returncode != 0 or not os.path.exists(src_out) or not os.path.getsize(src_out):
+                continue
+            src_bytes = os.path.getsize(src_out)
+            src_secs = _run_ffprobe(src_out).duration  # 片段实际时长（含关键帧之前多出的部分）
+            enc_bytes, wall = _clip_bytes(["ffmpeg", "-y", "-hide_banner", "-v", "error", "-i", src_out,
+                                           "-map", "0:v:0"] + video_args + [enc_out], enc_out)
+            os.remove(src_out)
+            if not enc_bytes:
+                continue
+            src_total += src_bytes
+            out_total += enc_bytes
+            sampled_secs += src_secs if src_secs > 0 else clip_secs
+            wall_total += wall
+            ratios.append(enc_bytes / src_bytes)
+
+    if not ratios:
+        return None
+    ratio = out_total / src_total
+    video_bytes = min(size, src_total / sampled_secs * duration)
+    predicted_size = int(size - video_bytes + video_bytes * ratio)
+    speed = sampled_secs / wall_total if wall_total else 0.0
+
+    mean = sum(ratios) / len(ratios)
+    cv = (sum((r - mean) ** 2 for r in ratios) / len(ratios)) ** 0.5 / mean if mean else 1.0
+    confidence = round(max(0.0, 1.0 - cv) * min(1.0, len(ratios) / 3), 2)
+    return {
+        "save_pct": round((1 - predicted_size / size) * 100, 1),
+        "predicted_size": predicted_size,
+        "encode_secs": round(duration / speed, 1) if speed else None,
+        "speed": round(speed, 3),
+        "confidence": confidence,
+        "samples": len(ratios),
+        "time": time.time(),
+    }
+
+
+def cached_prediction(info, encoder, crf):
+    return (info.get("predictions") or {}).get(encode_key(encoder, crf))
+
+
+def ensure_prediction(info, encoder, crf, cache=None, threads=0):
+    """
+    每个 (文件, 编码器, crf) 只预测一次，结果存入分析缓存
+    """
+    pred = cached_prediction(info, encoder, crf)
+    if pred is None:
+        pred = predict_encode(info, encoder, crf, threads=threads)
+        if pred is None:
+            return None
+        info.setdefault("predictions", {})[encode_key(encoder, crf)] = pred
+        if cache is not None:
+            cache[info["path"]] = info
+    return pred
+
+
+class PredictThread(Worker):
+    predicted = Signal(str, dict)
+    log = Signal(str)
+    all_done = Signal()
+
+    def __init__(self, paths, encoder, crf, workers=PREDICT_WORKERS):
+        super().__init__()
+        self.paths = list(paths)
+        self.encoder = encoder
+        self.crf = int(crf)
+        self.workers = max(1, workers)
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def _predict_one(self, cache, path):
+        if self._stop:
+            return
+        info = analyze_video(path, cache)
+        if not info:
+            return
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        pred = ensure_prediction(info, self.encoder, self.crf, cache, threads=threads)
+        if pred is None:
+            self.log.emit(f"采样预测失败: {os.path.basename(path)}")
+            return
+        self.predicted.emit(path, pred)
+
+    def run(self):
+        cache = load_cache()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(lambda p: self._predict_one(cache, p), self.paths))
+        finally:
+            cache.close()
+        self.all_done.emit()
+
+
+# =======================
+# 目标质量（自动 CRF）
+# =======================
+QUALITY_METRICS = ("vmaf", "ssim", "psnr")
+QUALITY_DEFAULT_TARGET = {"vmaf": 93.0, "ssim": 0.985, "psnr": 42.0}
+QUALITY_CRF_RANGE = {  # 搜索范围（crf 越大体积越小、质量越低）
+    "libx264": (16, 32),
+    "libx265": (18, 34),
+    "libvpx-vp9": (20, 48),
+    "libaom-av1": (20, 48),
+}
+QUALITY_SAMPLES = 3  # 抽样片段数
+QUALITY_CLIP_SECS = 4  # 每个片段的时长（秒）
+QUALITY_MAX_PROBES = 6  # 每个文件最多试编几个 crf
+QUALITY_SCORE_RE = {
+    "vmaf": re.compile(r"VMAF score[:=]\s*([\d.]+)"),
+    "ssim": re.compile(r"SSIM .*All:([\d.]+)"),
+    "psnr": re.compile(r"PSNR .*average:([\d.]+|inf)"),
+}
+_FILTERS = None
+
+
+def ffmpeg_has_filter(name):
+    global _FILTERS
+    if _FILTERS is None:
+        try:
+            out = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True,
+                                 encoding="utf-8", errors="ignore", creationflags=_NO_WINDOW).stdout
+            _FILTERS = {line.split()[1] for line in out.splitlines() if len(line.split()) > 2}
+        except Exception:
+            _FILTERS = set()
+    return name in _FILTERS
+
+
+def resolve_metric(metric):
+    """
+    本机 ffmpeg 没编译 libvmaf 时退回 SSIM
+    """
+    if metric == "vmaf" and not ffmpeg_has_filter("libvmaf"):
+        return "ssim"
+    return metric
+
+
+def quality_key(encoder, metric, target):
+    return f"{encoder}:{metric}:{target:g}"
+
+
+def measure_quality(distorted, reference, metric, threads=0):
+    """
+    用 ffmpeg 的 libvmaf/ssim/psnr 滤镜比较两个同分辨率片段，返回分数；失败返回 None
+    """
+    flt = "libvmaf" + (f"=n_threads={threads}" if threads else "") if metric == "vmaf" else metric
+    cmd = ["ffmpeg", "-hide_banner", "-i", distorted, "-i", reference,
+           "-lavfi", f"[0:v][1:v]{flt}", "-f", "null", "-"]
+    try:
+        r = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+                           creationflags=_NO_WINDOW)
+    except Exception:
+        return None
+    found = QUALITY_SCORE_RE[metric].findall(r.stderr)
+    if r.returncode != 0 or not found:
+        return None
+    return 100.0 if found[-1] == "inf" else float(found[-1])
+
+
+def search_crf(info, encoder, metric, target, samples=QUALITY_SAMPLES, clip_secs=QUALITY_CLIP_SECS, threads=0):
+    """
+    在几个抽样片段上二分搜索满足 target 的最大 crf（码率最低）。
+    连最小 crf 都达不到目标时返回范围下限。
+    返回 dict：crf / score / metric / target / probes，失败返回 None
+    """
+    path = info["path"]
+    duration = info["duration"]
+    if duration <= 0:
+        return None
+    lo, hi = QUALITY_CRF_RANGE.get(encoder, (18, 34))
+    floor = lo
+    samples = max(1, min(samples, int(duration // (clip_secs * 2)) or 1))
+    clip_secs = min(clip_secs, duration)
+    width, height = probe_media(path).resolution
+    content, _ = ensure_content_class(info)
+
+    with tempfile.TemporaryDirectory(prefix="vm_crf_") as tmp:
+        # 参考片段只截一次，之后每个 crf 都从同一片段编码，保证逐帧对齐
+        refs = []
+        for i in range(samples):
+            pos = max(0.0, duration * (i + 1) / (samples + 1) - clip_secs / 2)
+            ref = os.path.join(tmp, f"ref_{i}.mkv")
+            r = subprocess.run(["ffmpeg", "-y", "-hide_banner", "-v", "error", "-ss", f"{pos:.2f}", "-i", path,
+                                "-t", f"{clip_secs:.2f}", "-map", "0:v:0", "-c", "copy", ref],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=_NO_WINDOW)
+            if r.returncode == 0 and os.path.exists(ref) and os.path.getsize(ref):
+                refs.append(ref)
+        if not refs:
+            return None
+
+        def score_at(crf):
+            video_args = build_video_args(encoder, crf, width, height, content == "animation", threads)
+            scores = []
+            for i, ref in enumerate(refs):
+                enc = os.path.join(tmp, f"enc_{i}.mkv")
+                r = subprocess.run(["ffmpeg", "-y", "-hide_banner", "-v", "error", "-i", ref] + video_args + [enc],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=_NO_WINDOW)
+                score = measure_quality(enc, ref, metric, threads) if r.returncode == 0 else None
+                if score is None:
+                    return None
+                scores.append(score)
+            return sum(scores) / len(scores)
+
+        probes = {}
+        best = None
+        while lo <= hi and len(probes) < QUALITY_MAX_PROBES:
+            mid = (lo + hi) // 2
+            score = score_at(mid)
+            if score is None:
+                return None
+            probes[mid] = round(score, 4)
+            if score >= target:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+
+    crf = floor if best is None else best
+    return {
+        "crf": crf,
+        "score": probes.get(crf),
+        "metric": metric,
+        "target": target,
+        "probes": probes,
+        "time": time.time(),
+    }
+
+
+def ensure_target_crf(info, encoder, metric, target, cache=None, threads=0):
+    """
+    每个 (文件, 编码器, 指标, 目标) 只搜索一次，结果存入分析缓存
+    """
+    key = quality_key(encoder, metric, target)
+    found = (info.get("target_crf") or {}).get(key)
+    if found is None:
+        found = search_crf(info, encoder, metric, target, threads=threads)
+        if found is None:
+            return None
+        # JSON 的键只能是字符串
+        found["probes"] = {str(k): v for k, v in found["probes"].items()}
+        info.setdefault("target_crf", {})[key] = found
+        if cache is not None:
+            cache[info["path"]] = info
+    return found
+
+
+class CrfSearchThread(Worker):
+    """
+    并行地为每个文件搜索满足目标质量的 crf，完成后 crf_ready 给出 {path: crf}
+    """
+    searched = Signal(str, dict)
+    log = Signal(str)
+    crf_ready = Signal(dict)
+
+    def __init__(self, paths, encoder, metric, target, workers=PREDICT_WORKERS):
+        super().__init__()
+        self.paths = list(paths)
+        self.encoder = encoder
+        self.metric = metric
+        self.target = float(target)
+        self.workers = max(1, workers)
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def _search_one(self, cache, path):
+        if self._stop:
+            return path, None
+        info = analyze_video(path, cache)
+        if not info:
+            return path, None
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        found = ensure_target_crf(info, self.encoder, self.metric, self.target, cache, threads=threads)
+        if found is None:
+            self.log.emit(f"CRF 搜索失败，使用默认 crf: {os.path.basename(path)}")
+            return path, None
+        self.searched.emit(path, found)
+        return path, found["crf"]
+
+    def run(self):
+        cache = load_cache()
+        crfs = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for path, crf in pool.map(lambda p: self._search_one(cache, p), self.paths):
+                    if crf is not None:
+                        crfs[path] = crf
+        finally:
+            cache.close()
+        self.crf_ready.emit(crfs)
@@ -0,0 +1,455 @@
+# -*- coding:utf-8 -*-
+"""
+ffprobe 探测、动画/实拍分类和压缩价值评估
+"""
+import os
+import json
+import subprocess
+import threading
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .fingerprint import content_fingerprint
+
+VIDEO_EXTS = (
+    ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", ".webm", ".m4v", ".ts", ".mts", ".m2ts", ".rm", ".rmvb", ".mpg",
+    ".mpeg", ".vob", ".3gp", ".f4v", ".asf", ".ogv", ".dv"
+)
+TEXT_SUB_CODECS = {"subrip", "ass", "ssa", "webvtt"}
+LOSSLESS_AUDIO_CODECS = {"truehd", "mlp", "flac", "alac", "wavpack", "ape", "tta"}  # 另外 pcm_* 和 DTS-HD MA
+LOSSLESS_KBPS_PER_CHANNEL = 600  # 无损音轨没有码率信息时按每声道这么多估算
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)  # 非 Windows 平台没有该常量
+PROBE_MEMO_SIZE = 4096
+CLASSIFY_SAMPLES = 5  # 动画/实拍判断的抽样位置数
+CLASSIFY_FRAMES = 3  # 每个位置解码的关键帧数
+CLASSIFY_ENTROPY_THRESHOLD = 0.75  # 归一化亮度熵不高于该值判为动画
+ENTROPY_RE = re.compile(r"lavfi\.entropy\.normalized_entropy\.normal\.Y=([0-9.]+)")
+
+
+@dataclass
+class StreamInfo:
+    index: int
+    codec_type: str
+    codec_name: str = "unknown"
+    bitrate_kbps: int = 0
+    width: int = 0
+    height: int = 0
+    channels: int = 0
+    language: str = ""
+    raw: dict = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class ProbeResult:
+    """
+    一次 ffprobe（-show_format -show_streams -show_chapters）的解析结果
+    """
+    path: str
+    ok: bool = False
+    duration: float = 0.0
+    format_name: str = ""
+    bitrate_kbps: int = 0
+    streams: list = field(default_factory=list)
+    chapters: int = 0
+
+    @property
+    def video(self):
+        for s in self.streams:
+            if s.codec_type == "video" and not s.raw.get("disposition", {}).get("attached_pic"):
+                return s
+        return None
+
+    @property
+    def audio(self):
+        return [s for s in self.streams if s.codec_type == "audio"]
+
+    @property
+    def subtitles(self):
+        return [s for s in self.streams if s.codec_type == "subtitle"]
+
+    @property
+    def codec(self):
+        v = self.video
+        return v.codec_name if v else "unknown"
+
+    @property
+    def video_bitrate_kbps(self):
+        v = self.video
+        return v.bitrate_kbps if v else 0
+
+    @property
+    def resolution(self):
+        v = self.video
+        if v and v.width and v.height:
+            return v.width, v.height
+        return 1920, 1080  # fallback
+
+
+_probe_memo = OrderedDict()
+_probe_lock = threading.Lock()
+
+
+def _to_kbps(value):
+    try:
+        return int(value) // 1000
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_stream(s):
+    tags = s.get("tags") or {}
+    # mkv 常常不写 bit_rate，而是由 mkvmerge 写在 BPS 标签里
+    br = s.get("bit_rate") or tags.get("BPS") or tags.get("BPS-eng")
+    return StreamInfo(
+        index=int(s.get("index", 0)),
+        codec_type=s.get("codec_type", ""),
+        codec_name=s.get("codec_name", "unknown"),
+        bitrate_kbps=_to_kbps(br),
+        width=int(s.get("width") or 0),
+        height=int(s.get("height") or 0),
+        channels=int(s.get("channels") or 0),
+        language=tags.get("language", ""),
+        raw=s,
+    )
+
+
+def _run_ffprobe(path):
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_format",
+        "-show_streams",
+        "-show_chapters",
+        "-of", "json",
+        path
+    ]
+    result = ProbeResult(path=path)
+    try:
+        r = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="ignore",
+            creationflags=_NO_WINDOW
+        )
+        data = json.loads(r.stdout)
+    except Exception:
+        return result
+
+    fmt = data.get("format") or {}
+    result.streams = [_parse_stream(s) for s in data.get("streams", [])]
+    result.format_name = fmt.get("format_name", "")
+    result.bitrate_kbps = _to_kbps(fmt.get("bit_rate"))
+    result.chapters = len(data.get("chapters") or [])
+    try:
+        result.duration = float(fmt.get("duration"))
+    except (TypeError, ValueError):
+        durations = []
+        for s in data.get("streams", []):
+            try:
+                durations.append(float(s.get("duration")))
+            except (TypeError, ValueError):
+                pass
+        result.duration = max(durations, default=0.0)
+    result.ok = True
+    return result
+
+
+def probe_media(path, refresh=False):
+    """
+    单次 ffprobe 获取时长、各流编码/码率、分辨率、音轨与字幕列表、章节数。
+    结果按 (path, size, mtime) 记忆，扫描与压缩共用，文件变化后自动失效。
+    """
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+    except OSError:
+        return ProbeResult(path=path)
+
+    if not refresh:
+        with _probe_lock:
+            cached = _probe_memo.get(key)
+            if cached is not None:
+                _probe_memo.move_to_end(key)
+                return cached
+
+    result = _run_ffprobe(path)
+    if result.ok:
+        with _probe_lock:
+            _probe_memo[key] = result
+            while len(_probe_memo) > PROBE_MEMO_SIZE:
+                _probe_memo.popitem(last=False)
+    return result
+
+
+def clear_probe_memo():
+    """
+    清空 probe_media 的记忆（基准测试测冷启动探测用）
+    """
+    with _probe_lock:
+        _probe_memo.clear()
+
+
+def probe_streams_detail(path):
+    p = probe_media(path)
+    if not p.ok:
+        return 1, []
+    return len(p.audio), [s.raw for s in p.subtitles]
+
+def is_lossless_audio(codec, profile=""):
+    return codec in LOSSLESS_AUDIO_CODECS or codec.startswith("pcm_") or (codec == "dts" and profile == "DTS-HD MA")
+
+
+def audio_streams(probe):
+    """
+    各音轨的编码/声道/码率（按音轨顺序，index 即 -map 0:a:N 的 N），存进分析结果
+    """
+    streams = []
+    for i, s in enumerate(probe.audio):
+        profile = s.raw.get("profile", "")
+        lossless = is_lossless_audio(s.codec_name, profile)
+        kbps = s.bitrate_kbps
+        if not kbps and lossless:
+            kbps = max(s.channels, 2) * LOSSLESS_KBPS_PER_CHANNEL
+        streams.append({
+            "index": i,
+            "codec": s.codec_name,
+            "profile": profile,
+            "channels": s.channels,
+            "bitrate_kbps": kbps,
+            "language": s.language,
+            "lossless": lossless,
+        })
+    return streams
+
+
+def ensure_audio_streams(info, cache=None):
+    """
+    旧版缓存记录没有逐音轨信息时补上并写回缓存
+    """
+    if "audio" not in info:
+        probe = probe_media(info["path"])
+        if not probe.ok:
+            return []
+        info["audio"] = audio_streams(probe)
+        if cache is not None:
+            cache[info["path"]] = info
+    return info["audio"]
+
+
+def probe_resolution(path):
+    """
+    返回 width, height
+    """
+    return probe_media(path).resolution
+    
+def classify_content(path, duration=None, samples=CLASSIFY_SAMPLES):
+    """
+    抽样判断动画/实拍：在全片均匀分布的几个位置各解码少量关键帧（-skip_frame nokey），
+    缩小到 320 宽后计算亮度熵。动画大面积平涂，归一化熵明显低于实拍。
+    返回 (label, confidence)，label 为 "animation" / "film"
+    """
+    if duration is None:
+        duration = probe_media(path).duration
+    if duration <= 0:
+        return "film", 0.0
+
+    values = []
+    for i in range(samples):
+        pos = duration * (i + 1) / (samples + 1)
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-v", "info",
+            "-skip_frame", "nokey",
+            "-ss", f"{pos:.2f}",
+            "-i", path,
+            "-map", "0:v:0",
+            "-frames:v", str(CLASSIFY_FRAMES),
+            "-vf", "scale=320:-2,entropy,metadata=mode=print",
+            "-f", "null", "-"
+        ]
+        try:
+            p = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                encoding="utf-8",
+                errors="ignore",
+                creationflags=_NO_WINDOW
+            )
+        except Exception:
+            continue
+        frame_vals = [float(v) for v in ENTROPY_RE.findall(p.stderr)]
+        if frame_vals:
+            values.append(sum(frame_vals) / len(frame_vals))
+
+    if not values:
+        return "film", 0.0  # 默认实拍
+
+    mean = sum(values) / len(values)
+    label = "animation" if mean <= CLASSIFY_ENTROPY_THRESHOLD else "film"
+    votes = sum(1 for v in values if (v <= CLASSIFY_ENTROPY_THRESHOLD) == (label == "animation"))
+    margin = min(1.0, abs(mean - CLASSIFY_ENTROPY_THRESHOLD) / 0.15)
+    confidence = round(0.5 * votes / len(values) + 0.5 * margin, 2)
+    return label, confidence
+
+
+def ensure_content_class(info, cache=None):
+    """
+    分析结果里没有动画/实拍分类时补算并写回缓存，每个文件只算一次
+    """
+    if "content" not in info:
+        label, confidence = classify_content(info["path"], info.get("duration"))
+        info["content"] = label
+        info["content_conf"] = confidence
+        if cache is not None:
+            cache[info["path"]] = info
+    return info["content"], info["content_conf"]
+
+
+def detect_animation(path, seconds=None):
+    """
+    True = 动画
+    False = 实拍
+    """
+    return classify_content(path)[0] == "animation"
+    
+def pick_ref_bframes(width, height):
+    pixels = width * height
+    if pixels <= 1280 * 720:
+        return 6, 8
+    elif pixels <= 1920 * 1080:
+        return 5, 8
+    elif pixels <= 2560 * 1440:
+        return 4, 6
+    else:
+        return 3, 4
+
+def probe_audio_sub_count(path):
+    """
+    返回：audio_count, subtitle_count
+    """
+    audio_cnt, sub_streams = probe_streams_detail(path)
+    return audio_cnt, len(sub_streams)
+
+def probe_video_quality(path):
+    """
+    返回：
+    codec, bitrate_kbps
+    """
+    p = probe_media(path)
+    return p.codec, p.video_bitrate_kbps
+
+def evaluate_compress_value(codec, bitrate_kbps, mb_per_min):
+    """
+    返回：
+    score (0-100), 预估节省百分比
+    """
+    score = 0
+
+    # 编码器权重
+    if codec in ("mpeg4", "xvid", "divx"):
+        score += 40
+    elif codec in ("h264", "avc"):
+        score += 25
+    elif codec in ("hevc", "h265", "av1", "vp9"):
+        score -= 30
+
+    # 码率权重
+    if bitrate_kbps > 6000:
+        score += 30
+    elif bitrate_kbps > 3500:
+        score += 15
+    elif bitrate_kbps < 2500:
+        score -= 20
+
+    # 体积权重
+    if mb_per_min > 80:
+        score += 30
+    elif mb_per_min > 50:
+        score += 15
+    elif mb_per_min < 40:
+        score -= 20
+
+    score = max(0, min(score, 100))
+
+    # 预估节省率
+    if score >= 70:
+        save_pct = 60
+    elif score >= 50:
+        save_pct = 40
+    elif score >= 30:
+        save_pct = 25
+    else:
+        save_pct = 10
+
+    return score, save_pct
+
+def get_video_duration(file_path):
+    return probe_media(file_path).duration
+
+
+def analyze_video(path, cache=None, stat=None):
+    if stat is None:
+        try:
+            stat = os.stat(path)
+        except:
+            return None
+
+    size = stat.st_size
+    mtime = stat.st_mtime
+
+    if cache is not None:
+        cached = cache.get(path)
+        if cached and cached["size"] == size and cached["mtime"] == mtime:
+            return cached
+
+    # 路径对不上时按内容指纹找：移动/改名过的文件直接沿用原来的分析结果（含预测、分类等）。
+    # 旧版的普通 dict 缓存没有指纹索引，不查找
+    fingerprint = content_fingerprint(path, size)
+    if fingerprint and hasattr(cache, "find_fingerprint"):
+        for known in cache.find_fingerprint(fingerprint):
+            info = dict(known, name=os.path.basename(path), path=path, mtime=mtime)
+            # 输出和校验记录属于原来那个文件：内容相同的副本/拷贝本身并没有处理过
+            for key in ("output", "verify_failed"):
+                info.pop(key, None)
+            cache[path] = info
+            return info
+
+    probe = probe_media(path)
+    duration = probe.duration
+    if duration <= 0:
+        return None
+
+    size_mb = size / 1024 / 1024
+    mb_per_min = size_mb / (duration / 60)
+    audio_cnt = len(probe.audio)
+    sub_cnt = len(probe.subtitles)
+    codec, bitrate_kbps = probe.codec, probe.video_bitrate_kbps
+    width, height = probe.resolution
+    score, save_pct = evaluate_compress_value(codec, bitrate_kbps, mb_per_min)
+
+    info = {
+        "name": os.path.basename(path),
+        "path": path,
+        "size": size,
+        "mtime": mtime,
+        "duration": duration,
+        "size_mb": size_mb,
+        "mb_per_min": mb_per_min,
+        "audio_cnt": audio_cnt,
+        "sub_cnt": sub_cnt,
+        "codec": codec,
+        "bitrate_kbps": bitrate_kbps,
+        "width": width,
+        "height": height,
+        "compress_score": score,
+        "save_pct": save_pct,
+        "audio": audio_streams(probe),
+        "fingerprint": fingerprint,
+    }
+
+    if cache is not None:
+        cache[path] = info
+
+    return info
@@ -0,0 +1,333 @@
+# -*- coding:utf-8 -*-
+"""
+扫描线程：并发分析目录下的视频，支持目录索引和断点续扫
+"""
+import os
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import load_cache, save_cache
+from .fingerprint import ensure_fingerprint
+from .probe import VIDEO_EXTS, analyze_video, ensure_audio_streams, ensure_content_class
+from .signals import Signal, Worker
+
+SCAN_WORKERS = min(8, os.cpu_count() or 2)  # 扫描并发数，网络盘可适当调高
+SCAN_BATCH_SIZE = 200  # 每批推送给界面的结果数
+SCAN_BATCH_INTERVAL = 0.5  # 秒，未攒满一批时的最长推送间隔
+SCAN_CHECKPOINT_FILES = 500  # 每处理这么多文件保存一次进度
+SCAN_CHECKPOINT_SECS = 30  # 或者每隔这么多秒保存一次进度
+SCAN_CURSOR_KEY = "scan_cursor"
+LIBRARY_ROOTS_KEY = "library_roots"
+DIR_INDEX_SETTLE = 2.0  # 秒，目录 mtime 比现在早这么久以上才写入目录索引
+HISTORY_FIRST_CHUNK = 1000  # 启动时第一批推送给界面的缓存记录数，尽快出现首屏
+HISTORY_MAX_CHUNK = 32768  # 之后每批翻倍直到该值：界面每插入一批都有固定开销
+
+
+def library_roots(existing_only=True):
+    """
+    扫描过的文件夹（监视模式和守护进程监视这些目录）
+    """
+    with load_cache() as cache:
+        roots = cache.get_meta(LIBRARY_ROOTS_KEY, [])
+    return [r for r in roots if os.path.isdir(r)] if existing_only else roots
+
+
+def add_library_root(folder):
+    folder = os.path.abspath(folder)
+    with load_cache() as cache:
+        roots = cache.get_meta(LIBRARY_ROOTS_KEY, [])
+        if folder not in roots:
+            cache.set_meta(LIBRARY_ROOTS_KEY, roots + [folder])
+    return folder
+
+
+def collect_orphans(cache, root, seen=()):
+    """
+    删除 root 下文件已不存在的缓存记录（移动、改名、删除后留下的旧路径），返回删除的路径。
+    root 本身不存在（比如移动硬盘没插）时什么也不做。
+    """
+    if not os.path.isdir(root):
+        return []
+    removed = [p for p in cache.keys_under(root) if p not in seen and not os.path.exists(p)]
+    for path in removed:
+        del cache[path]
+    return removed
+
+
+class HistoryLoader(Worker):
+    """
+    后台分批读出全部缓存记录（启动时填充表格），界面不用等整库读完才显示
+    """
+    videos_loaded = Signal(list)
+    loaded = Signal(dict)
+
+    def __init__(self, first_chunk=HISTORY_FIRST_CHUNK, max_chunk=HISTORY_MAX_CHUNK):
+        super().__init__()
+        self.first_chunk = first_chunk
+        self.max_chunk = max_chunk
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def run(self):
+        started = time.monotonic()
+        count = 0
+        chunk = self.first_chunk
+        batch = []
+        with load_cache() as cache:
+            for info in cache.values():
+                if self._stop:
+                    break
+                batch.append(info)
+                if len(batch) >= chunk:
+                    self.videos_loaded.emit(batch)
+                    count += len(batch)
+                    batch = []
+                    chunk = min(chunk * 2, self.max_chunk)
+            if batch and not self._stop:
+                self.videos_loaded.emit(batch)
+                count += len(batch)
+            cursor = cache.get_meta(SCAN_CURSOR_KEY)
+        self.loaded.emit({
+            "videos": count,
+            "seconds": time.monotonic() - started,
+            "scan_cursor": cursor,
+            "stopped": self._stop,
+        })
+
+
+class ScanThread(Worker):
+    videos_found = Signal(list)
+    videos_removed = Signal(list)
+    scan_finished = Signal(dict)
+
+    def __init__(self, folder, workers=SCAN_WORKERS, full_verify=False, resume=False, classify=False):
+        super().__init__()
+        self.folder = os.path.abspath(folder)
+        self.workers = max(1, int(workers))
+        self.full_verify = full_verify
+        self.classify = classify
+        self.cache = load_cache()
+        self._stop = False   # ✅ 新增
+
+        # 断点续扫：目录按排序后的深度优先顺序编号，
+        # 游标 = 此前所有目录都已处理完的最后一个目录
+        self._cursor_key = None
+        if resume:
+            saved = self.cache.get_meta(SCAN_CURSOR_KEY)
+            if saved and saved.get("root") == self.folder:
+                self._cursor_key = self._dir_key(saved["cursor"])
+        self._dir_paths = []
+        self._dir_pending = {}
+        self._done_upto = 0
+
+    def stop(self):
+        self._stop = True   # ✅ 新增
+
+    def _dir_key(self, path):
+        rel = os.path.relpath(path, self.folder)
+        return () if rel == os.curdir else tuple(rel.split(os.sep))
+
+    def _register_dir(self, path, file_count):
+        seq = len(self._dir_paths)
+        self._dir_paths.append(path)
+        self._dir_pending[seq] = file_count
+        return seq
+
+    def _file_done(self, seq):
+        self._dir_pending[seq] -= 1
+
+    def _cursor(self):
+        while self._done_upto < len(self._dir_paths) and self._dir_pending.get(self._done_upto) == 0:
+            del self._dir_pending[self._done_upto]
+            self._done_upto += 1
+        return self._dir_paths[self._done_upto - 1] if self._done_upto else None
+
+    def _checkpoint(self):
+        cursor = self._cursor()
+        if cursor:
+            self.cache.set_meta(SCAN_CURSOR_KEY, {"root": self.folder, "cursor": cursor, "time": time.time()})
+        save_cache(self.cache)
+
+    def _iter_entries(self):
+        """
+        os.scandir 遍历，产出 (path, stat, cached_info, dir_seq)。
+        目录 mtime 与索引一致时直接用索引里的文件列表和缓存结果，不再 stat 其中的文件；
+        full_verify=True 时忽略索引逐个校验（目录内文件被原地覆盖时需要）。
+        """
+        stack = [self.folder]
+        while stack and not self._stop:
+            d = stack.pop()
+
+            skip_files = False
+            if self._cursor_key is not None:
+                key = self._dir_key(d)
+                if self._cursor_key[:len(key)] == key:
+                    skip_files = True  # 游标所在目录或其祖先：文件已处理，子目录可能还没有
+                elif key < self._cursor_key:
+                    continue  # 整棵子树都在游标之前
+
+            try:
+                st = os.stat(d)
+            except OSError:
+                continue
+
+            rec = None if self.full_verify else self.cache.get_dir(d)
+            if rec and rec["mtime_ns"] == st.st_mtime_ns:
+                videos = [(path, None) for path in rec["videos"]]
+                subdirs = rec["subdirs"]
+                from_index = True
+            else:
+                from_index = False
+                videos = []
+                subdirs = []
+                entries = 0
+                try:
+                    with os.scandir(d) as it:
+                        for entry in it:
+                            entries += 1
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.path)
+                                elif entry.name.lower().endswith(VIDEO_EXTS) and entry.is_file():
+                                    videos.append((os.path.abspath(entry.path), entry.stat()))
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                subdirs.sort()
+                videos.sort(key=lambda v: v[0])
+
+                old_subdirs = set(rec["subdirs"]) if rec else set()
+                for gone in old_subdirs.difference(subdirs):
+                    self.cache.delete_dir_tree(gone)
+                # 刚被修改过的目录先不入索引：粗粒度 mtime（FAT/SMB）下同一时刻的后续变化无法分辨
+                if time.time() - st.st_mtime > DIR_INDEX_SETTLE:
+                    self.cache.put_dir(d, {
+                        "mtime_ns": st.st_mtime_ns,
+                        "entries": entries,
+                        "subdirs": subdirs,
+                        "videos": [path for path, _ in videos],
+                    })
+
+            if skip_files:
+                videos = []
+            seq = self._register_dir(d, len(videos))
+            for path, stat in videos:
+                if self._stop:
+                    return
+                cached = self.cache.get(path) if from_index else None
+                yield path, stat, cached, seq
+            stack.extend(reversed(subdirs))
+
+    def _analyze_one(self, item):
+        """
+        返回 (item, info, processed)；停止后未处理的文件 processed=False，不计入续扫游标
+        """
+        path, stat, cached, _ = item
+        if cached is not None and not self._needs_work(cached):
+            return item, cached, True
+        if self._stop:
+            return item, None, False
+        try:
+            info = cached or analyze_video(path, self.cache, stat=stat)
+            if info and not info.get("fingerprint"):
+                ensure_fingerprint(info, self.cache)  # 旧版缓存记录补上内容指纹
+            if info and "audio" not in info:
+                ensure_audio_streams(info, self.cache)  # 以及逐音轨信息
+            if info and self._needs_classify(info):
+                ensure_content_class(info, self.cache)
+            return item, info, True
+        except Exception:
+            return item, None, True
+
+    def _needs_classify(self, info):
+        return self.classify and "content" not in info
+
+    def _needs_work(self, info):
+        return self._needs_classify(info) or not info.get("fingerprint") or "audio" not in info
+
+    def _analyze_parallel(self):
+        """
+        遍历目录的同时由线程池并发 stat + ffprobe。
+        在途文件数有上限（背压），目录再大内存也不会增长。
+        """
+        done = queue.Queue()
+        in_flight = 0
+        limit = self.workers * 4
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for item in self._iter_entries():
+                if item[2] is not None and not self._needs_work(item[2]):
+                    yield item, item[2], True  # 缓存命中不必进线程池
+                    continue
+                while in_flight >= limit:
+                    in_flight -= 1
+                    yield done.get().result()
+                pool.submit(self._analyze_one, item).add_done_callback(done.put)
+                in_flight += 1
+                while in_flight and not done.empty():
+                    in_flight -= 1
+                    yield done.get().result()
+            while in_flight:
+                in_flight -= 1
+                yield done.get().result()
+
+    def run(self):
+        started = time.monotonic()
+        last_emit = started
+        last_checkpoint = started
+        checkpoint_files = 0
+        batch = []
+        files = 0
+        videos = 0
+        seen = set()
+
+        if self.workers == 1:
+            results = (self._analyze_one(item) for item in self._iter_entries())
+        else:
+            results = self._analyze_parallel()
+
+        for item, info, processed in results:
+            if not processed:
+                continue
+            files += 1
+            seen.add(item[0])
+            self._file_done(item[3])
+            if info:
+                videos += 1
+                batch.append(info)
+            now = time.monotonic()
+            if len(batch) >= SCAN_BATCH_SIZE or (batch and now - last_emit >= SCAN_BATCH_INTERVAL):
+                self.videos_found.emit(batch)
+                batch = []
+                last_emit = now
+            if files - checkpoint_files >= SCAN_CHECKPOINT_FILES or now - last_checkpoint >= SCAN_CHECKPOINT_SECS:
+                self._checkpoint()
+                checkpoint_files = files
+                last_checkpoint = now
+        if batch:
+            self.videos_found.emit(batch)
+
+        orphans = []
+        if self._stop:
+            self._checkpoint()
+        else:
+            orphans = collect_orphans(self.cache, self.folder, seen)  # 本次扫到的文件不用再 stat
+            self.cache.set_meta(SCAN_CURSOR_KEY, None)
+            save_cache(self.cache)
+        self.cache.close()
+        if orphans:
+            self.videos_removed.emit(orphans)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.scan_finished.emit({
+            "folder": self.folder,
+            "files": files,
+            "videos": videos,
+            "orphans": len(orphans),
+            "seconds": elapsed,
+            "files_per_sec": files / elapsed,
+            "workers": self.workers,
+            "stopped": self._stop,
+        })
@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+"""
+不依赖 Qt 的信号和后台线程，接口是 pyqtSignal / QThread 的一个子集。
+命令行直接使用；GUI 通过 MainThreadRelay 把回调转到界面线程执行。
+"""
+import threading
+
+
+class BoundSignal:
+    def __init__(self):
+        self._slots = []
+        self._lock = threading.Lock()
+
+    def connect(self, slot):
+        with self._lock:
+            self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        with self._lock:
+            if slot is None:
+                self._slots.clear()
+            else:
+                self._slots.remove(slot)
+
+    def emit(self, *args):
+        # 在发出信号的线程里同步调用
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            slot(*args)
+
+
+class Signal:
+    """
+    用法同 pyqtSignal：在类里声明，每个实例各有一份连接
+    """
+
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        bound = obj.__dict__.get(self.name)
+        if bound is None:
+            bound = obj.__dict__.setdefault(self.name, BoundSignal())
+        return bound
+
+
+class Worker:
+    """
+    QThread 的最小替代：start() 在后台线程里执行 run()
+    """
+
+    def __init__(self):
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        pass
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.isRunning()
@@ -0,0 +1,151 @@
+# -*- coding:utf-8 -*-
+"""
+输出暂存：ffmpeg 先写到临时位置（默认 <输出>.partial，可指定 SSD/tmpfs 上的临时目录），
+完成后原子地放到目标位置；跨文件系统时先复制到目标旁边、fsync 后再改名，
+视频库里不会出现写了一半的 _x265.mkv。另有开始前的剩余空间检查和下一个源文件的预读。
+"""
+import os
+import errno
+import shutil
+import hashlib
+import threading
+
+SCRATCH_DIR = None  # 临时目录，None 表示写在目标旁边
+PARTIAL_SUFFIX = ".partial"
+SPACE_MARGIN = 0.2  # 预计输出大小之外多留的比例（预测有误差）
+SPACE_RESERVE = 256 * 1024 * 1024  # 再额外留出的字节数
+COPY_CHUNK = 8 * 1024 * 1024
+PREFETCH_BYTES = 2 * 1024 ** 3  # 预读下一个源文件的上限（另不超过可用内存的 1/4）
+PREFETCH_CHUNK = 8 * 1024 * 1024
+
+
+def partial_path_for(dst, scratch_dir=None):
+    """
+    写入中的输出路径：默认 <dst>.partial；放在临时目录时文件名前加目标路径的短哈希，不同目录的同名文件不冲突
+    """
+    if not scratch_dir:
+        return dst + PARTIAL_SUFFIX
+    tag = hashlib.blake2b(os.path.abspath(dst).encode("utf-8"), digest_size=4).hexdigest()
+    return os.path.join(scratch_dir, f"{tag}_{os.path.basename(dst)}{PARTIAL_SUFFIX}")
+
+
+def free_bytes(path):
+    """
+    path 所在文件系统的剩余空间（path 还不存在时看它最近的上级目录）
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+def device_of(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def _fsync_dir(path):
+    if os.name == "nt":
+        return  # Windows 不能打开目录做 fsync，改名本身已落盘
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # 有的文件系统（网络盘等）不支持，改名已经完成
+
+
+def place_output(work, dst):
+    """
+    把写好的输出放到 dst：同一文件系统直接改名；否则复制到 <dst>.partial、fsync 后再改名。
+    返回 "rename" / "copy"，失败时抛 OSError（dst 保持原样）
+    """
+    try:
+        os.replace(work, dst)
+        _fsync_dir(os.path.dirname(os.path.abspath(dst)))
+        return "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    tmp = partial_path_for(dst)
+    try:
+        with open(work, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, COPY_CHUNK)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp, dst)
+        _fsync_dir(os.path.dirname(os.path.abspath(dst)))
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(work)
+    return "copy"
+
+
+class Prefetcher:
+    """
+    在后台把下一个要处理的源文件开头读进页缓存，当前任务编码时磁盘空闲，下一个任务开始时不用等机械盘寻道。
+    同一时间只预读一个文件，换文件时取消上一个。
+    """
+
+    def __init__(self, limit=PREFETCH_BYTES):
+        self.limit = limit
+        self.path = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def _budget(self):
+        try:
+            import psutil
+            return min(self.limit, psutil.virtual_memory().available // 4)
+        except (ImportError, AttributeError):
+            return self.limit
+
+    def prefetch(self, path):
+        """
+        开始预读 path（与正在预读的是同一个文件时什么也不做），返回是否启动了新的预读
+        """
+        if path == self.path:
+            return False
+        self.cancel()
+        self.path = path
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._read, args=(path, self._budget(), self._cancel), daemon=True)
+        self._thread.start()
+        return True
+
+    @staticmethod
+    def _read(path, limit, cancel):
+        buf = bytearray(PREFETCH_CHUNK)
+        done = 0
+        try:
+            with open(path, "rb", buffering=0) as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, limit, os.POSIX_FADV_SEQUENTIAL)
+                while done < limit and not cancel.is_set():
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    done += n
+        except OSError:
+            pass
+
+    def cancel(self):
+        self._cancel.set()
+        self.path = None
@@ -0,0 +1,239 @@
+# -*- coding:utf-8 -*-
+"""
+压缩遥测：逐任务 JSONL、历史吞吐汇总和 Prometheus textfile
+"""
+import os
+import json
+import threading
+import time
+
+from .jobqueue import JOB_STATES
+
+TELEMETRY_DIR = "telemetry"  # 每个任务一个 jobs/*.jsonl，汇总追加到 history.jsonl
+TELEMETRY_INTERVAL = 2.0  # 秒，采样并发出遥测信号的间隔
+PROMETHEUS_TEXTFILE = None  # 例如 /var/lib/node_exporter/textfile/videomanager.prom
+
+
+def format_secs(secs):
+    if secs is None:
+        return "--:--"
+    secs = int(secs)
+    return f"{secs // 3600}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+def video_preset(video_args):
+    """
+    从编码参数里取出速度档位，用于按 编码器/预设/分辨率 统计吞吐
+    """
+    parts = []
+    for key in ("-preset", "-deadline", "-cpu-used"):
+        if key in video_args:
+            parts.append(str(video_args[video_args.index(key) + 1]))
+    return "/".join(parts) or "default"
+
+
+def resolution_class(width, height):
+    short = min(width, height)
+    for limit, name in ((2000, "2160p"), (1400, "1440p"), (1000, "1080p"), (700, "720p")):
+        if short >= limit:
+            return name
+    return "sd"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0  # ffmpeg 在开头几行会输出 N/A
+
+
+class JobTelemetry:
+    """
+    一个压缩任务的遥测：定期采样 ffmpeg 的 fps/speed 和进程 CPU/内存，
+    逐行写入 jobs/<时间>_<任务id>.jsonl，结束时把汇总追加到 history.jsonl。
+    编码结束时调用 end()，输出校验完、状态确定后再 finish(state)；校验的耗时不计入
+    """
+
+    def __init__(self, job, encoder, crf, preset, width, height, out_dir=TELEMETRY_DIR):
+        self.job = job
+        self.out_dir = out_dir
+        self.started = time.monotonic()
+        self.ended = None
+        self.src_size = os.path.getsize(job.src)
+        self.last = {}
+        self.closed = False
+        self._lock = threading.Lock()  # 调度线程采样、任务线程收尾
+        self._procs = {}  # pid -> psutil.Process（cpu_percent 需要同一个对象才能算差值）
+        self._cpu = []
+        self._fps = []
+        self._peak_rss = 0
+        self.meta = {
+            "src": job.src,
+            "encoder": encoder,
+            "crf": crf,
+            "preset": preset,
+            "resolution": resolution_class(width, height),
+            "duration": job.duration,
+            "chunked": job.chunked,
+        }
+        os.makedirs(os.path.join(out_dir, "jobs"), exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{job.queued['id']}.jsonl"
+        self.path = os.path.join(out_dir, "jobs", name)
+        self._write(self.path, dict(self.meta, event="start", t=round(time.time(), 1)))
+
+    @staticmethod
+    def _write(path, record):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _usage(self):
+        import psutil  # 延迟导入，启动时不加载
+        cpu = 0.0
+        rss = 0
+        live = set(self.job.pids())
+        for pid in list(self._procs):
+            if pid not in live:
+                del self._procs[pid]
+        for pid in live:
+            try:
+                proc = self._procs.get(pid) or self._procs.setdefault(pid, psutil.Process(pid))
+                cpu += proc.cpu_percent(None)
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return cpu, rss
+
+    def sample(self):
+        with self._lock:
+            if not self.closed:
+                self._sample()
+            return self.last
+
+    def _sample(self):
+        job = self.job
+        elapsed = time.monotonic() - self.started
+        speed = job.done_secs / elapsed if elapsed > 0 else 0.0
+        cpu, rss = self._usage()
+        fps = sum(_to_float(s.get("fps")) for s in job.live_stats())
+        if job.done_secs > 0:
+            self._cpu.append(cpu)
+            self._fps.append(fps)
+        self._peak_rss = max(self._peak_rss, rss)
+        self.last = {
+            "t": round(time.time(), 1),
+            "elapsed": round(elapsed, 1),
+            "done_secs": round(job.done_secs, 1),
+            "percent": job.percent,
+            "fps": round(fps, 1),
+            "speed": round(speed, 3),  # 平均速度（媒体秒/墙钟秒），分段并行时为各段之和
+            "ffmpeg_speed": round(sum(_to_float(s.get("speed")) for s in job.live_stats()), 3),
+            "bitrate_kbps": round(job.out_bytes * 8 / job.done_secs / 1000) if job.done_secs else 0,
+            "total_size": job.out_bytes,
+            "cpu_pct": round(cpu, 1),
+            "rss_mb": round(rss / 1024 / 1024, 1),
+            "eta_secs": round((job.duration - job.done_secs) / speed) if speed > 0 else None,
+        }
+        self._write(self.path, self.last)
+
+    def end(self):
+        """
+        编码结束：停止采样，记下结束时间
+        """
+        with self._lock:
+            self.closed = True
+            if self.ended is None:
+                self.ended = time.monotonic()
+
+    def finish(self, state):
+        self.end()
+        wall = self.ended - self.started
+        out_size = os.path.getsize(self.job.dst) if state == "done" and os.path.exists(self.job.dst) else 0
+        summary = dict(
+            self.meta,
+            state=state,
+            t=round(time.time(), 1),
+            wall_secs=round(wall, 1),
+            media_secs=round(self.job.done_secs, 1),
+            speed=round(self.job.done_secs / wall, 3) if wall > 0 else 0.0,
+            fps=round(sum(self._fps) / len(self._fps), 1) if self._fps else 0.0,
+            cpu_pct=round(sum(self._cpu) / len(self._cpu), 1) if self._cpu else 0.0,
+            peak_rss_mb=round(self._peak_rss / 1024 / 1024, 1),
+            src_size=self.src_size,
+            out_size=out_size,
+        )
+        self._write(self.path, dict(summary, event="end"))
+        self._write(os.path.join(self.out_dir, "history.jsonl"), summary)
+        return summary
+
+
+def throughput_history(out_dir=TELEMETRY_DIR):
+    """
+    按 编码器/预设/分辨率 汇总已完成任务的吞吐，返回按编码器排序的 dict 列表
+    """
+    groups = {}
+    try:
+        with open(os.path.join(out_dir, "history.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("state") != "done":
+                    continue
+                key = (rec["encoder"], rec["preset"], rec["resolution"])
+                g = groups.setdefault(key, {"jobs": 0, "media_secs": 0.0, "wall_secs": 0.0,
+                                            "fps": 0.0, "cpu_pct": 0.0, "src_size": 0, "out_size": 0})
+                g["jobs"] += 1
+                for k in ("media_secs", "wall_secs", "fps", "cpu_pct", "src_size", "out_size"):
+                    g[k] += rec.get(k, 0)
+    except FileNotFoundError:
+        pass
+    rows = []
+    for (encoder, preset, resolution), g in sorted(groups.items()):
+        rows.append({
+            "encoder": encoder,
+            "preset": preset,
+            "resolution": resolution,
+            "jobs": g["jobs"],
+            "media_hours": round(g["media_secs"] / 3600, 2),
+            "speed": round(g["media_secs"] / g["wall_secs"], 3) if g["wall_secs"] else 0.0,
+            "fps": round(g["fps"] / g["jobs"], 1),
+            "cpu_pct": round(g["cpu_pct"] / g["jobs"], 1),
+            "save_pct": round((1 - g["out_size"] / g["src_size"]) * 100, 1) if g["src_size"] else 0.0,
+        })
+    return rows
+
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(path, batch, jobs, counts):
+    """
+    node_exporter textfile collector 格式；先写临时文件再替换，避免被读到一半
+    """
+    lines = [
+        "# TYPE videomanager_jobs_running gauge",
+        f"videomanager_jobs_running {batch['running']}",
+        "# TYPE videomanager_batch_eta_seconds gauge",
+        f"videomanager_batch_eta_seconds {batch['eta_secs'] if batch['eta_secs'] is not None else 'NaN'}",
+        "# TYPE videomanager_batch_progress_ratio gauge",
+        f"videomanager_batch_progress_ratio {batch['done_secs'] / batch['total_secs'] if batch['total_secs'] else 0:.4f}",
+        "# TYPE videomanager_queue_jobs gauge",
+    ]
+    lines += [f'videomanager_queue_jobs{{state="{s}"}} {counts.get(s, 0)}' for s in JOB_STATES]
+    gauges = (("fps", "fps"), ("speed", "speed"), ("cpu_percent", "cpu_pct"),
+              ("bitrate_kbps", "bitrate_kbps"), ("eta_seconds", "eta_secs"))
+    for metric, key in gauges:
+        lines.append(f"# TYPE videomanager_job_{metric} gauge")
+        for src, rec in jobs.items():
+            value = rec.get(key)
+            lines.append(f'videomanager_job_{metric}{{src="{_prom_label(src)}"}} '
+                         f'{value if value is not None else "NaN"}')
+    lines.append("# TYPE videomanager_job_rss_bytes gauge")
+    for src, rec in jobs.items():
+        lines.append(f'videomanager_job_rss_bytes{{src="{_prom_label(src)}"}} {int(rec["rss_mb"] * 1024 * 1024)}')
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+"""
+输出校验：删除源文件之前确认输出完整可用。
+源文件和输出各探测一次，比较时长、各类流的数量和章节数；
+可选再从输出里抽几段解码一遍（-xerror，遇到损坏的包立即失败）。
+压缩调度器在单独的线程里做校验，不占编码并发。
+"""
+import subprocess
+import time
+
+from .probe import _NO_WINDOW, probe_media
+
+VERIFY_DURATION_TOLERANCE = 1.0  # 秒，时长允许的差值（另加时长的 0.5%）
+VERIFY_SAMPLES = (0.1, 0.5, 0.9)  # 抽样解码的位置（占全片的比例）
+VERIFY_SAMPLE_SECS = 3  # 每段解码的秒数
+
+
+def _decode_sample(path, start, secs):
+    r = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-v", "error", "-xerror",
+         "-ss", f"{start:.3f}", "-i", path, "-t", str(secs),
+         "-map", "0:v:0", "-map", "0:a?", "-fps_mode", "passthrough", "-f", "null", "-"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        errors="ignore",
+        creationflags=_NO_WINDOW
+    )
+    # null 输出端对时间戳的抱怨（换封装的老容器常见）不算损坏
+    errors = [line for line in r.stderr.splitlines()
+              if line.strip() and not line.startswith("[null @") and "Last message repeated" not in line]
+    if r.returncode != 0 or errors:
+        return errors[-1].strip() if errors else f"返回码 {r.returncode}"
+    return None
+
+
+def verify_output(src, dst, decode=False):
+    """
+    返回 {"ok", "problems": [...], "duration": [源, 输出], "streams": {类型: [源, 输出]}, "chapters": [源, 输出],
+    "decoded": 抽样解码的段数, "secs": 校验耗时, "time"}
+    """
+    started = time.monotonic()
+    src_probe, dst_probe = probe_media(src), probe_media(dst)
+    problems = []
+    result = {"duration": [round(src_probe.duration, 3), round(dst_probe.duration, 3)], "streams": {},
+              "chapters": [src_probe.chapters, dst_probe.chapters], "decoded": 0}
+    if not dst_probe.ok:
+        problems.append("输出无法解析")
+    elif not src_probe.ok:
+        problems.append("源文件无法解析")
+    else:
+        tolerance = VERIFY_DURATION_TOLERANCE + src_probe.duration * 0.005
+        if abs(src_probe.duration - dst_probe.duration) > tolerance:
+            problems.append(f"时长 {dst_probe.duration:.1f} 秒，源文件 {src_probe.duration:.1f} 秒")
+        # 视频只映射第一路（0:v:0），音轨和字幕全部映射
+        expect = {"video": int(src_probe.video is not None), "audio": len(src_probe.audio),
+                  "subtitle": len(src_probe.subtitles)}
+        actual = {"video": int(dst_probe.video is not None), "audio": len(dst_probe.audio),
+                  "subtitle": len(dst_probe.subtitles)}
+        for kind, n in expect.items():
+            result["streams"][kind] = [n, actual[kind]]
+            if actual[kind] != n:
+                problems.append(f"{kind} 流 {actual[kind]} 路，源文件 {n} 路")
+        if dst_probe.chapters != src_probe.chapters:
+            problems.append(f"章节 {dst_probe.chapters} 个，源文件 {src_probe.chapters} 个")
+    if decode and not problems:
+        for ratio in VERIFY_SAMPLES:
+            start = max(dst_probe.duration * ratio - VERIFY_SAMPLE_SECS / 2, 0)
+            err = _decode_sample(dst, start, VERIFY_SAMPLE_SECS)
+            result["decoded"] += 1
+            if err:
+                problems.append(f"{start:.0f} 秒处解码出错: {err}")
+                break
+    result.update(ok=not problems, problems=problems, secs=round(time.monotonic() - started, 2), time=time.time())
+    return result
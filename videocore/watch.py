@@ -0,0 +1,315 @@
+# -*- coding:utf-8 -*-
+"""
+监视模式：inotify（Linux）或定时轮询，增量更新视频库
+"""
+import os
+import sys
+import time
+import select
+import struct
+
+from .cache import load_cache, save_cache
+from .probe import VIDEO_EXTS, analyze_video
+from .signals import Signal, Worker
+
+WATCH_DEBOUNCE_SECS = 10  # 文件最后一次变化后静默这么久才分析
+WATCH_POLL_INTERVAL = 60  # 秒，无 inotify 时的轮询间隔
+WATCH_REMOVE_DELAY = 2  # 秒，删除/移走的文件至少保留记录这么久（等同一次移动的另一半事件）
+WATCH_REMOVE_GRACE = 600  # 秒，一直有待分析的文件时，删除/移走的记录最多保留这么久
+
+
+class InotifyWatcher:
+    """
+    Linux inotify（ctypes 调用 libc），产出 (kind, path)：
+    kind = "changed" / "removed" / "removed_dir" / "overflow"
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+    def __init__(self, roots):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._wd = {}
+        self._buf = b""
+        try:
+            for root in roots:
+                self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            # ENOSPC：超过 fs.inotify.max_user_watches，交给调用方退回轮询
+            raise OSError(self._ctypes.get_errno(), f"inotify_add_watch 失败: {path}")
+        self._wd[wd] = path
+
+    def _add_tree(self, top):
+        """
+        监视整棵目录树，返回其中已存在的视频文件（新建/移入目录时需要补处理）
+        """
+        found = []
+        stack = [top]
+        while stack:
+            d = stack.pop()
+            self._add_watch(d)
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith(VIDEO_EXTS):
+                            found.append(os.path.abspath(entry.path))
+            except OSError:
+                continue
+        return found
+
+    def poll(self, timeout):
+        events = []
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return events
+        try:
+            self._buf += os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+        buf = self._buf
+        offset = 0
+        while offset + 16 <= len(buf):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", buf, offset)
+            if offset + 16 + length > len(buf):
+                break
+            name = buf[offset + 16:offset + 16 + length].rstrip(b"\0")
+            offset += 16 + length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.append(("overflow", None))
+                continue
+            if mask & self.IN_IGNORED:
+                self._wd.pop(wd, None)
+                continue
+            parent = self._wd.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.abspath(os.path.join(parent, os.fsdecode(name)))
+
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    try:
+                        events.extend(("changed", p) for p in self._add_tree(path))
+                    except OSError:
+                        events.append(("overflow", None))
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    events.append(("removed_dir", path))
+                continue
+            if not path.lower().endswith(VIDEO_EXTS):
+                continue
+            if mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                events.append(("removed", path))
+            else:
+                events.append(("changed", path))
+        self._buf = buf[offset:]
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def snapshot_videos(roots):
+    """
+    返回 {视频路径: (size, mtime_ns)}
+    """
+    snap = {}
+    stack = list(roots)
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith(VIDEO_EXTS):
+                            st = entry.stat()
+                            snap[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return snap
+
+
+class PollingWatcher:
+    """
+    轮询兜底：定期遍历并对比 (size, mtime)，产出与 InotifyWatcher 相同的事件
+    """
+
+    def __init__(self, roots, interval=WATCH_POLL_INTERVAL):
+        self.roots = list(roots)
+        self.interval = interval
+        self._snapshot = snapshot_videos(self.roots)
+        self._next = time.monotonic() + interval
+
+    def poll(self, timeout):
+        wait = self._next - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            return []
+        self._next = time.monotonic() + self.interval
+        snap = snapshot_videos(self.roots)
+        events = [("removed", p) for p in self._snapshot.keys() - snap.keys()]
+        events += [("changed", p) for p, sig in snap.items() if self._snapshot.get(p) != sig]
+        self._snapshot = snap
+        return events
+
+    def close(self):
+        pass
+
+
+def open_watcher(roots):
+    """
+    Linux 优先使用 inotify，不可用（非 Linux、监视数超限等）时退回轮询
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except OSError:
+            pass
+    return PollingWatcher(roots)
+
+
+class WatchThread(Worker):
+    videos_found = Signal(list)
+    videos_removed = Signal(list)
+    log = Signal(str)
+
+    def __init__(self, roots, debounce=WATCH_DEBOUNCE_SECS):
+        super().__init__()
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.debounce = debounce
+        self._stop = False
+        self._pending = {}  # path -> [最后一次事件时间, 上次看到的大小]
+        self._removed = {}  # 已删除/移走、缓存记录还没删的 path -> 事件时间
+
+    def stop(self):
+        self._stop = True
+
+    def _handle(self, cache, events):
+        for kind, path in events:
+            if kind == "overflow":
+                # 事件丢失：把所有根目录重新对一遍
+                self.log.emit("文件事件队列溢出，已安排重新校验")
+                self._resync(cache)
+            elif kind == "changed":
+                entry = self._pending.setdefault(path, [0, -1])
+                entry[0] = time.monotonic()
+                self._removed.pop(path, None)
+            elif kind == "removed":
+                self._pending.pop(path, None)
+                if path in cache:
+                    self._removed.setdefault(path, time.monotonic())
+            elif kind == "removed_dir":
+                for p in list(self._pending):
+                    if p.startswith(path + os.sep):
+                        del self._pending[p]
+                for p in cache.keys_under(path):
+                    self._removed.setdefault(p, time.monotonic())
+                cache.delete_dir_tree(path)
+
+    def _drop_removed(self, cache, force=False):
+        """
+        删除已删除/移走的文件的缓存记录。移动/改名后新路径要等 debounce 才分析，
+        旧记录留到那时，analyze_video 才能按内容指纹找回原来的分析结果（分类、预测、目标 crf 等）；
+        没有待分析的文件、或者等了 WATCH_REMOVE_GRACE 秒后再删
+        """
+        now = time.monotonic()
+        removed = []
+        for path, t in list(self._removed.items()):
+            age = now - t
+            if not force and (age < WATCH_REMOVE_DELAY or (self._pending and age < WATCH_REMOVE_GRACE)):
+                continue
+            del self._removed[path]
+            if path in cache and not os.path.exists(path):
+                del cache[path]
+                removed.append(path)
+        if removed:
+            save_cache(cache)
+            self.videos_removed.emit(removed)
+
+    def _resync(self, cache):
+        """
+        重新对账：快照中的文件全部重新排队（未变化的会直接命中缓存），缓存里已不存在的删除
+        """
+        snap = snapshot_videos(self.roots)
+        now = time.monotonic()
+        for path in snap:
+            self._pending.setdefault(path, [now, -1])
+        for root in self.roots:
+            for path in cache.keys_under(root):
+                if path not in snap:
+                    self._removed.setdefault(path, now)
+
+    def _flush_ready(self, cache):
+        """
+        文件在 debounce 秒内没有新事件、且大小不再变化时才分析，避免探测写了一半的文件
+        """
+        now = time.monotonic()
+        found = []
+        for path, entry in list(self._pending.items()):
+            if now - entry[0] < self.debounce:
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                del self._pending[path]
+                continue
+            if size != entry[1]:
+                entry[0] = now
+                entry[1] = size
+                continue
+            del self._pending[path]
+            info = analyze_video(path, cache)
+            if info:
+                found.append(info)
+        if found:
+            save_cache(cache)
+            self.videos_found.emit(found)
+
+    def run(self):
+        watcher = open_watcher(self.roots)
+        self.log.emit(f"监视模式: {'inotify' if isinstance(watcher, InotifyWatcher) else '轮询'}")
+        cache = load_cache()
+        try:
+            while not self._stop:
+                events = watcher.poll(1.0)
+                if events:
+                    self._handle(cache, events)
+                    save_cache(cache)
+                if self._pending:
+                    self._flush_ready(cache)
+                if self._removed:
+                    self._drop_removed(cache)
+        finally:
+            self._drop_removed(cache, force=True)
+            watcher.close()
+            cache.close()
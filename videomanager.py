@@ -1,353 +1,60 @@
 # -*- coding:utf-8 -*-
+"""
+图形界面：videocore 的薄客户端。扫描、分析、压缩都在 videocore 里，
+这里只负责显示，并把后台线程的回调转到界面线程。
+"""
 import sys
 import os
-import json
-import subprocess
-from PyQt6.QtCore import QThread, pyqtSignal, Qt
+from PyQt6.QtCore import QObject, pyqtSignal, Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QTimer
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton,
-    QFileDialog, QTableWidget, QTableWidgetItem,
+    QFileDialog, QTableView, QAbstractItemView, QTableWidget, QTableWidgetItem,
     QMessageBox, QHBoxLayout, QCheckBox, QComboBox, QLabel, QLineEdit,
-    QMenu, QProgressBar, QDialog, QTextEdit
+    QMenu, QProgressBar, QDialog, QTextEdit, QSpinBox
 )
-import psutil
-import re
 
-VIDEO_EXTS = (
-    ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", ".webm", ".m4v", ".ts", ".mts", ".m2ts", ".rm", ".rmvb", ".mpg",
-    ".mpeg", ".vob", ".3gp", ".f4v", ".asf", ".ogv", ".dv"
+from videocore.audio import AUDIO_ENCODERS, AUDIO_POLICY, audio_policy, audio_save_bytes
+from videocore.cache import load_cache
+from videocore.fingerprint import find_duplicates
+from videocore.probe import analyze_video
+from videocore.scan import SCAN_WORKERS, HistoryLoader, ScanThread, library_roots, add_library_root
+from videocore.watch import WatchThread
+from videocore.jobqueue import JOB_STATES, JOB_STATE_TEXT, JobQueue, output_path_for
+from videocore.defaults import (
+    CHUNK_MIN_SECS, CHUNK_PARALLEL, ABORT_BELOW_PCT, ABORT_WARMUP_SECS, ABORT_WARMUP_RATIO,
+    ACTION_TEXT, STREAM_COPY_ACTIONS, GOVERNOR_POLICY, encode_key, plan_action,
 )
-CONFIG_FILE = "config.json"
-TEXT_SUB_CODECS = {"subrip", "ass", "ssa", "webvtt"}
+from videocore.telemetry import format_secs, throughput_history
 
-def analyze_video(path, cache=None):
-    try:
-        stat = os.stat(path)
-    except:
-        return None
-
-    size = stat.st_size
-    mtime = stat.st_mtime
-
-    if cache is not None:
-        cached = cache.get(path)
-        if cached and cached["size"] == size and cached["mtime"] == mtime:
-            return cached
+# videocore.encode（压缩调度，连带调速/暂存/校验）和 videocore.predict（采样预测、CRF 搜索）
+# 在第一次用到时才导入，不拖慢启动
 
-    duration = get_video_duration(path)
-    if duration <= 0:
-        return None
 
-    size_mb = size / 1024 / 1024
-    mb_per_min = size_mb / (duration / 60)
-    audio_cnt, sub_cnt = probe_audio_sub_count(path)
-    codec, bitrate_kbps = probe_video_quality(path)
-    score, save_pct = evaluate_compress_value(codec, bitrate_kbps, mb_per_min)
-
-    info = {
-        "name": os.path.basename(path),
-        "path": path,
-        "size": size,
-        "mtime": mtime,
-        "duration": duration,
-        "size_mb": size_mb,
-        "mb_per_min": mb_per_min,
-        "audio_cnt": audio_cnt,
-        "sub_cnt": sub_cnt,
-        "codec": codec,
-        "bitrate_kbps": bitrate_kbps,
-        "compress_score": score,
-        "save_pct": save_pct
-    }
-
-    if cache is not None:
-        cache[path] = info
-
-    return info
-# =======================
-# cache
-# =======================
-def load_cache():
-    if not os.path.exists(CONFIG_FILE):
-        return {}
-    try:
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
-
-
-def save_cache(cache):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-
-
-# =======================
-# ffprobe
-# =======================
-def probe_streams_detail(path):
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-show_streams",
-        "-of", "json",
-        path
-    ]
-    try:
-        r = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding='utf-8',
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        data = json.loads(r.stdout)
-
-        audio = 0
-        sub_streams = []
-
-        for s in data.get("streams", []):
-            if s.get("codec_type") == "audio":
-                audio += 1
-            elif s.get("codec_type") == "subtitle":
-                sub_streams.append(s)
-
-        return audio, sub_streams
-    except:
-        return 1, []
-
-def probe_resolution(path):
-    """
-    返回 width, height
-    """
-    try:
-        r = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "json",
-                path
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        data = json.loads(r.stdout)
-        s = data["streams"][0]
-        return int(s["width"]), int(s["height"])
-    except:
-        return 1920, 1080  # fallback
-    
-def detect_animation(path, seconds=20):
+class MainThreadRelay(QObject):
     """
-    True = 动画
-    False = 实拍
+    videocore 的信号在后台线程里同步调用回调；经由这里排队转到界面线程执行
     """
-    try:
-        cmd = [
-            "ffmpeg", "-v", "error",
-            "-t", str(seconds),
-            "-i", path,
-            "-vf", "signalstats",
-            "-f", "null", "-"
-        ]
-        p = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            errors="ignore",
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-
-        entropy_vals = []
-        for line in p.stderr.splitlines():
-            if "entropy" in line:
-                m = re.search(r"entropy:\s*([0-9.]+)", line)
-                if m:
-                    entropy_vals.append(float(m.group(1)))
+    _call = pyqtSignal(object, tuple)
 
-        if not entropy_vals:
-            return False  # 默认实拍
-
-        avg_entropy = sum(entropy_vals) / len(entropy_vals)
-
-        return avg_entropy <= 2.5
-    except:
-        return False
-    
-def pick_ref_bframes(width, height):
-    pixels = width * height
-    if pixels <= 1280 * 720:
-        return 6, 8
-    elif pixels <= 1920 * 1080:
-        return 5, 8
-    elif pixels <= 2560 * 1440:
-        return 4, 6
-    else:
-        return 3, 4
-
-def probe_audio_sub_count(path):
-    """
-    返回：audio_count, subtitle_count
-    """
-    audio_cnt = 0
-    sub_cnt = 0
-    try:
-        audio_cnt, sub_streams = probe_streams_detail(path)
-        sub_cnt = len(sub_streams)
-    except:
-        pass
-    return audio_cnt, sub_cnt
-
-def probe_video_quality(path):
-    """
-    返回：
-    codec, bitrate_kbps
-    """
-    try:
-        r = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=codec_name,bit_rate",
-                "-of", "json",
-                path
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        data = json.loads(r.stdout)
-        s = data["streams"][0]
-        codec = s.get("codec_name", "unknown")
-        br = s.get("bit_rate")
-        bitrate_kbps = int(br) // 1000 if br and br.isdigit() else 0
-        return codec, bitrate_kbps
-    except:
-        return "unknown", 0
-
-def evaluate_compress_value(codec, bitrate_kbps, mb_per_min):
-    """
-    返回：
-    score (0-100), 预估节省百分比
-    """
-    score = 0
-
-    # 编码器权重
-    if codec in ("mpeg4", "xvid", "divx"):
-        score += 40
-    elif codec in ("h264", "avc"):
-        score += 25
-    elif codec in ("hevc", "h265", "av1", "vp9"):
-        score -= 30
-
-    # 码率权重
-    if bitrate_kbps > 6000:
-        score += 30
-    elif bitrate_kbps > 3500:
-        score += 15
-    elif bitrate_kbps < 2500:
-        score -= 20
-
-    # 体积权重
-    if mb_per_min > 80:
-        score += 30
-    elif mb_per_min > 50:
-        score += 15
-    elif mb_per_min < 40:
-        score -= 20
-
-    score = max(0, min(score, 100))
-
-    # 预估节省率
-    if score >= 70:
-        save_pct = 60
-    elif score >= 50:
-        save_pct = 40
-    elif score >= 30:
-        save_pct = 25
-    else:
-        save_pct = 10
-
-    return score, save_pct
-
-def get_video_duration(file_path):
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        file_path
-    ]
-    try:
-        r = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            encoding='utf-8',
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        return float(r.stdout.strip())
-    except:
-        return 0
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._call.connect(self._invoke, Qt.ConnectionType.QueuedConnection)
 
-# =======================
-# 扫描线程
-# =======================
-class ScanThread(QThread):
-    video_found = pyqtSignal(dict)
-    scan_finished = pyqtSignal()
+    def _invoke(self, slot, args):
+        slot(*args)
 
-    def __init__(self, folder):
-        super().__init__()
-        self.folder = folder
-        self.cache = load_cache()
-        self._stop = False   # ✅ 新增
+    def connect(self, signal, slot):
+        signal.connect(lambda *args: self._call.emit(slot, args))
 
-    def stop(self):
-        self._stop = True   # ✅ 新增
-    
-    def run(self):
-        for root, _, files in os.walk(self.folder):
-            if self._stop:
-                break
-            
-            for name in files:
-                if self._stop:
-                    break
-                
-                if not name.lower().endswith(VIDEO_EXTS):
-                    continue
-                path = os.path.abspath(os.path.join(root, name))
-                try:
-                    stat = os.stat(path)
-                except:
-                    continue
-                size = stat.st_size
-                mtime = stat.st_mtime
-                cached = self.cache.get(path)
-                if cached and cached["size"] == size and cached["mtime"] == mtime:
-                    self.video_found.emit(cached)
-                    continue
-                duration = get_video_duration(path)
-                if duration <= 0:
-                    continue
-                size_mb = size / 1024 / 1024
-                mb_per_min = size_mb / (duration / 60)
-                codec, bitrate_kbps = probe_video_quality(path)
-                info = analyze_video(path, self.cache)
-                if info:
-                    self.video_found.emit(info)
-        
-        if not self._stop:
-            save_cache(self.cache)
-        self.scan_finished.emit()
 
 class ConvertLogDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, compress_thread=None):
         super().__init__(parent)
         self.setWindowTitle("后台正在转换...")
-        self.resize(500, 400)
+        self.resize(640, 520)
+        self.compress_thread = compress_thread
+        self._job_rows = {}
+        self._batch_eta = ""
         layout = QVBoxLayout(self)
 
         self.label_file = QLabel("当前视频进度: 0%")
@@ -357,6 +64,21 @@ class ConvertLogDialog(QDialog):
         self.progress_file.setFormat("当前视频: %p%")
         self.progress_total.setFormat("总体进度: %p%")
 
+        self.table_jobs = QTableWidget(0, 5)
+        self.table_jobs.setHorizontalHeaderLabels(["文件", "进度", "状态", "速度", "剩余"])
+        self.table_jobs.setColumnWidth(0, 300)
+        self.table_jobs.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        job_btns = QHBoxLayout()
+        self.btn_job_pause = QPushButton("暂停所选")
+        self.btn_job_resume = QPushButton("继续所选")
+        self.btn_job_stop = QPushButton("停止所选")
+        self.btn_job_pause.clicked.connect(lambda: self._job_action("pause_job"))
+        self.btn_job_resume.clicked.connect(lambda: self._job_action("resume_job"))
+        self.btn_job_stop.clicked.connect(lambda: self._job_action("stop_job"))
+        job_btns.addWidget(self.btn_job_pause)
+        job_btns.addWidget(self.btn_job_resume)
+        job_btns.addWidget(self.btn_job_stop)
+
         self.text_log = QTextEdit()
         self.text_log.setReadOnly(True)
 
@@ -364,9 +86,52 @@ class ConvertLogDialog(QDialog):
         layout.addWidget(self.progress_file)
         layout.addWidget(self.label_total)
         layout.addWidget(self.progress_total)
+        layout.addWidget(QLabel("任务:"))
+        layout.addWidget(self.table_jobs)
+        layout.addLayout(job_btns)
         layout.addWidget(QLabel("后台日志:"))
         layout.addWidget(self.text_log)
 
+    def _job_action(self, method):
+        if not self.compress_thread:
+            return
+        srcs = {self.table_jobs.item(idx.row(), 0).data(Qt.ItemDataRole.UserRole)
+                for idx in self.table_jobs.selectionModel().selectedRows()}
+        for src in srcs:
+            getattr(self.compress_thread, method)(src)
+
+    def _job_row(self, src):
+        row = self._job_rows.get(src)
+        if row is None:
+            row = self.table_jobs.rowCount()
+            self.table_jobs.insertRow(row)
+            item = QTableWidgetItem(os.path.basename(src))
+            item.setData(Qt.ItemDataRole.UserRole, src)
+            self.table_jobs.setItem(row, 0, item)
+            self.table_jobs.setItem(row, 1, QTableWidgetItem("0%"))
+            for col in (2, 3, 4):
+                self.table_jobs.setItem(row, col, QTableWidgetItem(""))
+            self._job_rows[src] = row
+        return row
+
+    def update_job_progress(self, src: str, pct: int):
+        self.table_jobs.item(self._job_row(src), 1).setText(f"{pct}%")
+
+    def update_job_state(self, src: str, state: str):
+        self.table_jobs.item(self._job_row(src), 2).setText(JOB_STATE_TEXT.get(state, state))
+
+    def update_job_telemetry(self, src: str, rec: dict):
+        row = self._job_row(src)
+        speed = self.table_jobs.item(row, 3)
+        speed.setText(f"{rec['speed']:.2f}x  {rec['fps']:.0f} fps")
+        speed.setToolTip(f"CPU {rec['cpu_pct']:.0f}% | 内存 {rec['rss_mb']:.0f} MB | "
+                         f"码率 {rec['bitrate_kbps']} kbps | 已输出 {rec['total_size'] / 1024 / 1024:.1f} MB")
+        self.table_jobs.item(row, 4).setText(format_secs(rec["eta_secs"]))
+
+    def update_batch_telemetry(self, batch: dict):
+        self._batch_eta = f" | 剩余 {format_secs(batch['eta_secs'])} | {batch['speed']:.2f}x"
+        self.label_total.setText(f"总体进度: {self.progress_total.value()}%{self._batch_eta}")
+
     def append_log(self, msg: str):
         self.text_log.append(msg)
 
@@ -374,201 +139,398 @@ class ConvertLogDialog(QDialog):
         self.progress_file.setValue(file_pct)
         self.progress_total.setValue(total_pct)
         self.label_file.setText(f"当前视频进度: {file_pct}%")
-        self.label_total.setText(f"总体进度: {total_pct}%")
+        self.label_total.setText(f"总体进度: {total_pct}%{self._batch_eta}")
+
+
+class QueueDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("压缩任务队列")
+        self.resize(760, 420)
+        self.job_queue = JobQueue()
+        layout = QVBoxLayout(self)
+        self.label_counts = QLabel("")
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["文件", "编码器/CRF", "状态", "尝试次数", "错误"])
+        self.table.setColumnWidth(0, 300)
+        btns = QHBoxLayout()
+        btn_retry = QPushButton("重试失败任务")
+        btn_clear = QPushButton("清除已完成")
+        btn_retry.clicked.connect(self.retry_failed)
+        btn_clear.clicked.connect(self.clear_done)
+        btns.addWidget(btn_retry)
+        btns.addWidget(btn_clear)
+        layout.addWidget(self.label_counts)
+        layout.addWidget(self.table)
+        layout.addLayout(btns)
+        self.refresh()
+
+    def refresh(self):
+        counts = self.job_queue.counts()
+        self.label_counts.setText("  ".join(f"{JOB_STATE_TEXT.get(s, s)}: {counts.get(s, 0)}" for s in JOB_STATES))
+        jobs = self.job_queue.jobs()
+        self.table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            err = job["error"].strip().splitlines()
+            for col, text in enumerate([
+                job["src"],
+                f"{job['encoder']} / {job['crf']}",
+                JOB_STATE_TEXT.get(job["state"], job["state"]),
+                f"{job['attempts']}/{job['max_attempts']}",
+                err[-1] if err else "",
+            ]):
+                item = QTableWidgetItem(text)
+                if col == 4 and job["error"]:
+                    item.setToolTip(job["error"])
+                self.table.setItem(row, col, item)
+
+    def retry_failed(self):
+        self.job_queue.retry_failed()
+        self.refresh()
+
+    def clear_done(self):
+        self.job_queue.clear()
+        self.refresh()
+
+    def done(self, result):
+        self.job_queue.close()
+        super().done(result)
+
+
+class ThroughputDialog(QDialog):
+    """
+    历史吞吐：按 编码器/预设/分辨率 汇总 telemetry/history.jsonl
+    """
+    COLUMNS = [("encoder", "编码器"), ("preset", "预设"), ("resolution", "分辨率"), ("jobs", "任务数"),
+               ("media_hours", "视频时长(小时)"), ("speed", "速度(x)"), ("fps", "平均 fps"),
+               ("cpu_pct", "CPU%"), ("save_pct", "节省%")]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("吞吐统计")
+        self.resize(760, 360)
+        layout = QVBoxLayout(self)
+        rows = throughput_history()
+        table = QTableWidget(len(rows), len(self.COLUMNS))
+        table.setHorizontalHeaderLabels([title for _, title in self.COLUMNS])
+        for row, rec in enumerate(rows):
+            for col, (key, _) in enumerate(self.COLUMNS):
+                table.setItem(row, col, QTableWidgetItem(str(rec[key])))
+        layout.addWidget(table if rows else QLabel("还没有已完成任务的遥测记录"))
+
+
+class DuplicatesDialog(QDialog):
+    """
+    内容相同的重复文件（按内容指纹分组，可逐字节确认）
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("重复文件")
+        self.resize(760, 420)
+        layout = QVBoxLayout(self)
+        self.label_summary = QLabel("")
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["组", "大小(MB)", "路径"])
+        self.table.setColumnWidth(2, 520)
+        self.chk_verify = QCheckBox("逐字节确认（读取完整文件，较慢）")
+        btn_refresh = QPushButton("重新查找")
+        btn_refresh.clicked.connect(self.refresh)
+        btns = QHBoxLayout()
+        btns.addWidget(self.chk_verify)
+        btns.addWidget(btn_refresh)
+        layout.addWidget(self.label_summary)
+        layout.addWidget(self.table)
+        layout.addLayout(btns)
+        self.refresh()
+
+    def refresh(self):
+        with load_cache() as cache:
+            groups = find_duplicates(cache, verify=self.chk_verify.isChecked())
+            sizes = [cache.get(g[0], {}).get("size", 0) for g in groups]
+        rows = [(n, size, path) for n, (group, size) in enumerate(zip(groups, sizes), 1) for path in group]
+        self.table.setRowCount(len(rows))
+        for row, (n, size, path) in enumerate(rows):
+            for col, text in enumerate([str(n), f"{size / 1024 / 1024:.1f}", path]):
+                self.table.setItem(row, col, QTableWidgetItem(text))
+        wasted = sum(size * (len(g) - 1) for g, size in zip(groups, sizes))
+        self.label_summary.setText(
+            f"{len(groups)} 组重复文件，多占用 {wasted / 1024 / 1024 / 1024:.2f} GB" if groups else "没有发现重复文件"
+        )
+
+
 # =======================
-# 压缩线程
+# 表格模型
 # =======================
+class VideoRow:
+    """
+    表格中的一行：只保留显示/排序所需字段，不持有完整分析 dict
+    """
+    __slots__ = ("path", "name", "size", "size_mb", "minutes", "mb_per_min", "audio_cnt", "sub_cnt", "audio",
+                 "codec", "score", "save_pct", "prediction", "action", "output", "checked")
+
+    def __init__(self, v):
+        self.output = ""
+        self.checked = False
+        self.update(v)
+
+    def update(self, v):
+        self.path = v["path"]
+        self.name = v["name"]
+        self.size = v["size"]
+        self.size_mb = v["size_mb"]
+        self.minutes = v["duration"] / 60
+        self.mb_per_min = v["mb_per_min"]
+        self.audio_cnt = v.get("audio_cnt", 0)
+        self.sub_cnt = v.get("sub_cnt", 0)
+        self.audio = v.get("audio") or []  # 逐音轨信息，用于估算音轨转码的节省
+        self.codec = v.get("codec", "unknown")
+        self.score = v.get("compress_score", 0)
+        self.save_pct = v.get("save_pct", 0)
+        # 最近一次采样预测（任意编码器/crf），没有则显示静态估算
+        self.prediction = None
+        for key, pred in (v.get("predictions") or {}).items():
+            if self.prediction is None or pred["time"] > self.prediction[1]["time"]:
+                self.prediction = (key, pred)
+        # 处理过的按实际结果显示，否则显示建议的处理方式
+        output = v.get("output")
+        if output:
+            self.action = f"已{ACTION_TEXT[output['action']]}"
+            self.output = output["path"]
+        else:
+            self.action = ACTION_TEXT[plan_action(v)]
+
+    @property
+    def expected_save(self):
+        return self.prediction[1]["save_pct"] if self.prediction else self.save_pct
+
+
+class VideoTableModel(QAbstractTableModel):
+    HEADERS = [
+        "✔",
+        "文件名",
+        "大小(MB)",
+        "时长(分钟)",
+        "MB/分钟",
+        "音轨",
+        "字幕",
+        "编码",
+        "压缩价值",
+        "预计节省",
+        "路径",
+        "处理方式",
+        "输出文件",
+    ]
+    COL_CHECK = 0
+    COL_PATH = 10
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+    INSERT_CHUNK = 5000  # 每次 beginInsertRows 的最大行数
 
-class CompressThread(QThread):
-    progress = pyqtSignal(int, int)
-    log = pyqtSignal(str)
-    finished = pyqtSignal()
-    output_ready = pyqtSignal(str, str)
-    
-    def __init__(self, files, delete_source=False, encoder="libx264", crf=21):
-        super().__init__()
-        self.files = files
-        self.delete_source = delete_source
-        self.encoder = encoder
-        self.crf = int(crf)
-        self._pause = False
-        self._stop = False
-        self._process = None
-        self._current_output = None
-    
-    def pause(self):
-        if self._process and not self._pause:
-            try:
-                psutil.Process(self._process.pid).suspend()
-                self._pause = True
-            except psutil.NoSuchProcess:
-                pass
-    
-    def resume(self):
-        if self._process and self._pause:
-            try:
-                psutil.Process(self._process.pid).resume()
-                self._pause = False
-            except psutil.NoSuchProcess:
-                pass
-    
-    def stop(self):
-        self._stop = True
-        if self._process and self._process.stdin:
-            try:
-                self._process.stdin.write("q\n")
-                self._process.stdin.flush()
-            except Exception:
-                pass
-    
-    def run(self):
-        total = len(self.files)
-        
-        enc_tag = {
-            "libx264": "x264",
-            "libx265": "x265",
-            "libvpx-vp9": "vp9",
-            "libaom-av1": "av1",
-        }.get(self.encoder, self.encoder)
-        
-        for idx, src in enumerate(self.files, start=1):
-            if self._stop:
-                break
-            
-            duration_src = get_video_duration(src)
-            if duration_src <= 0:
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._index = {}  # path -> 行号
+        self.audio_policy = None  # 压缩选项里的音轨策略，None 为音轨全部复制
+        self.audio_only = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        f = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == self.COL_CHECK:
+            f |= Qt.ItemFlag.ItemIsUserCheckable
+        return f
+
+    def _display(self, r, col):
+        if col == 1:
+            return r.name
+        if col == 2:
+            return f"{r.size_mb:.2f}"
+        if col == 3:
+            return f"{r.minutes:.1f}"
+        if col == 4:
+            return f"{r.mb_per_min:.2f}"
+        if col == 5:
+            return str(r.audio_cnt)
+        if col == 6:
+            return str(r.sub_cnt)
+        if col == 7:
+            return r.codec
+        if col == 8:
+            # 星级显示（0-5 星）
+            return "⭐" * max(1, r.score // 20) if r.score > 0 else ""
+        if col == 9:
+            save = self._expected_save(r)
+            if r.prediction and not self.audio_only:
+                return f"{save:.0f}% ({r.prediction[1]['confidence']:.0%})"
+            return f"~{save:.0f}%"
+        if col == 10:
+            return r.path
+        if col == 11:
+            return r.action
+        if col == 12:
+            return r.output
+        return None
+
+    # 每列排序用的原始值（数字列按数值排序，而不是按显示文本）
+    SORT_ATTRS = ("checked", "name", "size_mb", "minutes", "mb_per_min", "audio_cnt", "sub_cnt",
+                  "codec", "score", "expected_save", "path", "action", "output")
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        r = self._rows[index.row()]
+        col = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._display(r, col)
+        if role == Qt.ItemDataRole.CheckStateRole and col == self.COL_CHECK:
+            return Qt.CheckState.Checked if r.checked else Qt.CheckState.Unchecked
+        if role == self.SORT_ROLE:
+            return self._expected_save(r) if col == 9 else getattr(r, self.SORT_ATTRS[col])
+        if role == Qt.ItemDataRole.ToolTipRole and col == 9:
+            audio = self._audio_save(r)
+            audio_tip = f"，其中音轨转码约 {audio:.0f}%" if audio >= 1 else ""
+            if self.audio_only:
+                return f"视频直接复制，音轨转码约省 {audio:.0f}%"
+            if r.prediction:
+                key, pred = r.prediction
+                eta = f"，预计编码 {pred['encode_secs'] / 60:.0f} 分钟" if pred.get("encode_secs") else ""
+                return f"采样实测（{key}，{pred['samples']} 段，置信度 {pred['confidence']:.0%}）{eta}{audio_tip}"
+            return f"按编码/码率估算{audio_tip}"
+        return None
+
+    def _audio_save(self, r):
+        if self.audio_policy is None or not r.size:
+            return 0.0
+        return min(audio_save_bytes(r.audio, r.minutes * 60, self.audio_policy) / r.size * 100, 100.0)
+
+    def _expected_save(self, r):
+        """
+        预计节省 = 视频部分（采样预测或静态估算）+ 按当前策略转码音轨省下的部分
+        """
+        video = 0.0 if self.audio_only else r.expected_save
+        return min(video + self._audio_save(r), 100.0)
+
+    def set_audio_policy(self, policy, audio_only=False):
+        self.audio_policy = policy
+        self.audio_only = audio_only
+        if self._rows:
+            self.dataChanged.emit(self.index(0, 9), self.index(len(self._rows) - 1, 9))
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role == Qt.ItemDataRole.CheckStateRole and index.column() == self.COL_CHECK:
+            self._rows[index.row()].checked = Qt.CheckState(value) == Qt.CheckState.Checked
+            self.dataChanged.emit(index, index, [role])
+            return True
+        return False
+
+    def row_at(self, row):
+        return self._rows[row]
+
+    def path_at(self, row):
+        return self._rows[row].path
+
+    def add_videos(self, videos, replace=True):
+        """
+        已存在的路径原地刷新（replace=False 时保留已有行），其余按块批量插入
+        """
+        new = []
+        for v in videos:
+            row = self._index.get(v["path"])
+            if row is None:
+                new.append(v)
                 continue
-            
-            base, _ = os.path.splitext(src)
-            dst = f"{base}_{enc_tag}.mkv"
-            self._current_output = dst
-            
-            width, height = probe_resolution(src)
-            ref, bframes = pick_ref_bframes(width, height)
-            is_animation = detect_animation(src)
-            tune_hint = "animation" if is_animation else "film"
-            
-            x264_params = (
-                f"ref={ref}:"
-                f"bframes={bframes}:b-adapt=2:"
-                    "me=umh:subme=10:"
-                    "rc-lookahead=50:"
-                    "trellis=2:"
-                    "aq-mode=3:aq-strength=1.1:"
-                    "psy-rd=1.0\:-0.15"
-                    "deblock=-1\:-1"
-            )
-            
-            self.log.emit(
-                f"参数: {width}x{height} | "
-                f"{'动画' if is_animation else '实拍'} | "
-                f"encoder={self.encoder} | crf={self.crf}"
-            )
-            
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", src,
-                "-map", "0:v:0",
-                "-map", "0:a?",
-                "-map", "0:s?",
-            ]
-            if self.encoder == "libx264":
-                cmd += [
-                    "-c:v", "libx264",
-                    "-crf", str(self.crf),
-                    "-preset", "slow",
-                    "-tune", tune_hint,
-                    "-x264-params", x264_params,
-                ]
-            elif self.encoder == "libx265":
-                cmd += ["-c:v", "libx265", "-crf", str(self.crf), "-preset", "slow"]
-                if is_animation:
-                    cmd += ["-tune", "animation"]  # 实拍就别加 tune 了
-                cmd += ["-x265-params", "log-level=error"]
-            elif self.encoder == "libvpx-vp9":
-                cmd += [
-                    "-c:v", "libvpx-vp9",
-                    "-crf", str(self.crf),
-                    "-b:v", "0",
-                    "-deadline", "good",
-                    "-cpu-used", "2",
-                    "-row-mt", "1",
-                ]
-            elif self.encoder == "libaom-av1":
-                cmd += [
-                    "-c:v", "libaom-av1",
-                    "-crf", str(self.crf),
-                    "-b:v", "0",
-                    "-cpu-used", "6",
-                    "-row-mt", "1",
-                    "-tiles", "2x2",
-                    "-strict", "-2",  # 启用实验性编码器
-                ]
-            else:
-                cmd += [
-                    "-c:v", self.encoder,
-                    "-crf", str(self.crf),
-                ]
-            cmd += [
-                "-c:a", "copy",
-                "-c:s", "copy",
-                "-map_metadata", "0",
-                "-map_chapters", "0",
-                "-progress", "pipe:1",
-                "-nostats",
-                dst
-            ]
-            
-            self.log.emit(f"开始压缩: {os.path.basename(src)}")
-            p = subprocess.Popen(cmd,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT,
-                                 stdin=subprocess.PIPE,
-                                 encoding="utf-8",
-                                 errors="ignore",
-                                 creationflags=subprocess.CREATE_NO_WINDOW
-                                 )
-            self._process = p
-            
-            for line in p.stdout:
-                if self._stop:
-                    p.terminate()
-                    break
-                if line.startswith("out_time_ms="):
-                    value = line.split("=", 1)[1].strip()
-                    if not value.isdigit():
-                        continue
-                    out_ms = int(value)
-                    percent = min(int(out_ms / (duration_src * 1_000_000) * 100), 100)
-                    total_percent = int(((idx - 1) + percent / 100) / total * 100)
-                    self.progress.emit(percent, total_percent)
-            
-            p.wait()
-            if p.returncode != 0:
-                err = ""  # 没有单独的 stderr 了，可以从 stdout 累积或者干脆不读
-                self.log.emit(f"ffmpeg 失败：{err}")
+            if not replace:
                 continue
-            if os.path.getsize(dst) == 0:
-                self.log.emit("输出文件为空，压缩失败")
+            self._rows[row].update(v)
+            self.dataChanged.emit(self.index(row, 1), self.index(row, len(self.HEADERS) - 1))
+
+        pending = {}
+        for v in new:
+            pending[v["path"]] = v  # 同一批里重复的路径只保留最后一条
+        new = list(pending.values())
+        for start in range(0, len(new), self.INSERT_CHUNK):
+            chunk = new[start:start + self.INSERT_CHUNK]
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(chunk) - 1)
+            for i, v in enumerate(chunk):
+                self._rows.append(VideoRow(v))
+                self._index[v["path"]] = first + i
+            self.endInsertRows()
+
+    def remove_paths(self, paths):
+        rows = sorted((self._index[p] for p in set(paths) if p in self._index), reverse=True)
+        if not rows:
+            return
+        # 连续的行合并成一次 beginRemoveRows
+        end = start = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == start - 1:
+                start = row
                 continue
-            self.output_ready.emit(src, dst)
-            if not self._stop and os.path.exists(dst):
-                self.output_ready.emit(src, dst)
-                if self.delete_source:
-                    try:
-                        os.remove(src)
-                    except Exception:
-                        pass
-        
-        if self._stop and self._current_output:
-            try:
-                if os.path.exists(self._current_output):
-                    os.remove(self._current_output)
-                    self.log.emit(f"已删除未完成文件: {os.path.basename(self._current_output)}")
-            except Exception:
-                self.log.emit(f"无法删除残留文件: {os.path.basename(self._current_output)}")
-        
-        self.finished.emit()
+            self.beginRemoveRows(QModelIndex(), start, end)
+            del self._rows[start:end + 1]
+            self.endRemoveRows()
+            if row is not None:
+                end = start = row
+        self._index = {r.path: i for i, r in enumerate(self._rows)}
+
+    def set_prediction(self, path, key, pred):
+        row = self._index.get(path)
+        if row is None:
+            return
+        self._rows[row].prediction = (key, pred)
+        idx = self.index(row, 9)
+        self.dataChanged.emit(idx, idx)
+
+    def set_output(self, path, dst):
+        row = self._index.get(path)
+        if row is None:
+            return
+        self._rows[row].output = dst
+        action = next((a for a in STREAM_COPY_ACTIONS if dst == output_path_for(path, a)), "encode")
+        self._rows[row].action = f"已{ACTION_TEXT[action]}"
+        self.dataChanged.emit(self.index(row, 11), self.index(row, 12))
+
+
+class VideoFilterProxy(QSortFilterProxyModel):
+    """
+    排序与筛选（压缩价值、编码、大小）直接读取源模型的行对象
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(VideoTableModel.SORT_ROLE)
+        self.min_score = 0
+        self.min_size_mb = 0
+        self.codec_text = ""
+
+    def set_filters(self, min_score=None, min_size_mb=None, codec_text=None):
+        if min_score is not None:
+            self.min_score = min_score
+        if min_size_mb is not None:
+            self.min_size_mb = min_size_mb
+        if codec_text is not None:
+            self.codec_text = codec_text.strip().lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        r = self.sourceModel().row_at(source_row)
+        if r.score < self.min_score or r.size_mb < self.min_size_mb:
+            return False
+        if self.codec_text and self.codec_text not in r.codec.lower():
+            return False
+        return True
+
 
 # =======================
 # GUI
@@ -582,6 +544,10 @@ class VideoScanner(QWidget):
         btn_layout = QHBoxLayout()
         self.btn_scan = QPushButton("扫描文件夹")
         self.btn_stop_scan = QPushButton("停止扫描")  # ✅ 新增
+        self.btn_resume_scan = QPushButton("继续扫描")
+        self.btn_resume_scan.setEnabled(False)
+        self.btn_resume_scan.clicked.connect(self.resume_scan)
+        self._resume_folder = None
         self.btn_import = QPushButton("导入视频文件")
         self.btn_import.clicked.connect(self.import_files)
         btn_layout.addWidget(self.btn_import)
@@ -598,6 +564,23 @@ class VideoScanner(QWidget):
         self.btn_compress.clicked.connect(self.compress_checked)
         btn_layout.addWidget(self.btn_scan)
         btn_layout.addWidget(self.btn_stop_scan)
+        btn_layout.addWidget(self.btn_resume_scan)
+        btn_layout.addWidget(QLabel("扫描并发"))
+        self.spin_scan_workers = QSpinBox()
+        self.spin_scan_workers.setRange(1, 64)
+        self.spin_scan_workers.setValue(SCAN_WORKERS)
+        btn_layout.addWidget(self.spin_scan_workers)
+        self.chk_watch = QCheckBox("监视模式")
+        self.chk_watch.setToolTip("持续监视已扫描过的文件夹，新增/修改/删除的视频自动更新")
+        self.chk_watch.toggled.connect(self.toggle_watch)
+        self.watch_thread = None
+        self.chk_full_verify = QCheckBox("完整校验")
+        self.chk_full_verify.setToolTip("忽略目录索引，逐个文件校验大小和修改时间")
+        btn_layout.addWidget(self.chk_full_verify)
+        btn_layout.addWidget(self.chk_watch)
+        self.chk_classify = QCheckBox("识别动画/实拍")
+        self.chk_classify.setToolTip("扫描时抽样识别动画/实拍并缓存，压缩时不再重复分析")
+        btn_layout.addWidget(self.chk_classify)
         btn_layout.addWidget(self.btn_compress)
         btn_layout.addWidget(self.combo_encoder)
         self.label_crf = QLabel("CRF")
@@ -612,6 +595,15 @@ class VideoScanner(QWidget):
         self.lineEdit_crf.setText(self.encoder_default_crf.get(self.combo_encoder.currentText(), "21"))
         self.combo_encoder.currentTextChanged.connect(self.on_encoder_changed)
         btn_layout.addWidget(self.lineEdit_crf)
+        self.combo_rate_mode = QComboBox()
+        self.rate_mode_metric = {"固定 CRF": None, "目标 VMAF": "vmaf", "目标 SSIM": "ssim", "目标 PSNR": "psnr"}
+        self.combo_rate_mode.addItems(list(self.rate_mode_metric))
+        self.combo_rate_mode.setToolTip("目标质量模式：压缩前在抽样片段上为每个视频搜索达到目标分数的最大 CRF")
+        self.combo_rate_mode.currentTextChanged.connect(self.on_rate_mode_changed)
+        btn_layout.addWidget(self.combo_rate_mode)
+        self.lineEdit_target = QLineEdit()
+        self.lineEdit_target.setEnabled(False)
+        btn_layout.addWidget(self.lineEdit_target)
         self.btn_pause = QPushButton("暂停")
         self.btn_resume = QPushButton("继续")
         self.btn_stop = QPushButton("停止")
@@ -619,6 +611,15 @@ class VideoScanner(QWidget):
         self.btn_resume.setEnabled(False)
         self.btn_stop.setEnabled(False)
 
+        self.btn_queue = QPushButton("任务队列")
+        self.btn_queue.clicked.connect(self.show_queue)
+        btn_layout.addWidget(self.btn_queue)
+        self.btn_throughput = QPushButton("吞吐统计")
+        self.btn_throughput.clicked.connect(lambda: ThroughputDialog(self).exec())
+        btn_layout.addWidget(self.btn_throughput)
+        self.btn_duplicates = QPushButton("重复文件")
+        self.btn_duplicates.clicked.connect(lambda: DuplicatesDialog(self).exec())
+        btn_layout.addWidget(self.btn_duplicates)
         btn_layout.addWidget(self.btn_pause)
         btn_layout.addWidget(self.btn_resume)
         btn_layout.addWidget(self.btn_stop)
@@ -626,23 +627,15 @@ class VideoScanner(QWidget):
         self.btn_stop_scan.clicked.connect(self.stop_scan)
         self.btn_resume.clicked.connect(self.resume_compress)
         self.btn_stop.clicked.connect(self.stop_compress)
-        self.table = QTableWidget(0, 12)
-        self.table.setHorizontalHeaderLabels(
-            [
-                "✔",
-                "文件名",
-                "大小(MB)",
-                "时长(分钟)",
-                "MB/分钟",
-                "音轨",
-                "字幕",
-                "编码",
-                "压缩价值",
-                "预计节省",
-                "路径",
-                "输出文件",
-            ]
-        )
+        self.model = VideoTableModel(self)
+        self.proxy = VideoFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)  # 初始保持插入顺序
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setDefaultSectionSize(22)
         self.table.setColumnWidth(0, 40)
         self.table.setColumnWidth(1, 200)
         self.table.setColumnWidth(5, 60)  # 音轨
@@ -651,13 +644,165 @@ class VideoScanner(QWidget):
         self.table.setColumnWidth(8, 80)  # 星级
         self.table.setColumnWidth(9, 80)  # 节省率
         self.table.setColumnWidth(10, 350)  # 路径
-        self.table.setColumnWidth(11, 350)
+        self.table.setColumnWidth(11, 80)  # 处理方式
+        self.table.setColumnWidth(12, 350)  # 输出文件
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("编码筛选"))
+        self.edit_filter_codec = QLineEdit()
+        self.edit_filter_codec.setPlaceholderText("如 h264")
+        self.edit_filter_codec.textChanged.connect(lambda t: self.proxy.set_filters(codec_text=t))
+        filter_layout.addWidget(self.edit_filter_codec)
+        filter_layout.addWidget(QLabel("最低压缩价值"))
+        self.spin_filter_score = QSpinBox()
+        self.spin_filter_score.setRange(0, 100)
+        self.spin_filter_score.valueChanged.connect(lambda v: self.proxy.set_filters(min_score=v))
+        filter_layout.addWidget(self.spin_filter_score)
+        filter_layout.addWidget(QLabel("最小体积(MB)"))
+        self.spin_filter_size = QSpinBox()
+        self.spin_filter_size.setRange(0, 10_000_000)
+        self.spin_filter_size.valueChanged.connect(lambda v: self.proxy.set_filters(min_size_mb=v))
+        filter_layout.addWidget(self.spin_filter_size)
+        filter_layout.addStretch()
+
+        compress_opts_layout = QHBoxLayout()
+        compress_opts_layout.addWidget(QLabel("并发压缩任务"))
+        self.spin_jobs = QSpinBox()
+        self.spin_jobs.setRange(1, max(1, os.cpu_count() or 1))
+        self.spin_jobs.setValue(1)
+        compress_opts_layout.addWidget(self.spin_jobs)
+        self.chk_adaptive_jobs = QCheckBox("按CPU占用自动增减")
+        self.chk_adaptive_jobs.setToolTip("CPU 有空闲时逐步增加并发任务（最多为 CPU 核数的 1/4 或上面的数值）")
+        compress_opts_layout.addWidget(self.chk_adaptive_jobs)
+        self.chk_pin_cpus = QCheckBox("绑定CPU核心")
+        self.chk_pin_cpus.setToolTip("每个任务绑定到不重叠的一组 CPU 核心")
+        compress_opts_layout.addWidget(self.chk_pin_cpus)
+        self.chk_chunked = QCheckBox("长视频分段并行")
+        self.chk_chunked.setToolTip(f"时长超过 {CHUNK_MIN_SECS // 60} 分钟的视频按关键帧切段并行编码，再无损拼接")
+        compress_opts_layout.addWidget(self.chk_chunked)
+        self.spin_chunk_parallel = QSpinBox()
+        self.spin_chunk_parallel.setRange(2, max(2, os.cpu_count() or 2))
+        self.spin_chunk_parallel.setValue(CHUNK_PARALLEL)
+        self.spin_chunk_parallel.setToolTip("同一视频同时编码的分段数")
+        compress_opts_layout.addWidget(self.spin_chunk_parallel)
+        compress_opts_layout.addWidget(QLabel("节省低于"))
+        self.spin_abort_pct = QSpinBox()
+        self.spin_abort_pct.setRange(-1, 90)
+        self.spin_abort_pct.setSpecialValueText("只防变大")
+        self.spin_abort_pct.setSuffix("% 时放弃")
+        self.spin_abort_pct.setValue(ABORT_BELOW_PCT)
+        self.spin_abort_pct.setToolTip(
+            f"编码 {ABORT_WARMUP_SECS} 秒（且不少于全片 {ABORT_WARMUP_RATIO:.0%}）后按输出大小外推，"
+            "预计节省不足时中止并删除输出；不论怎么设置，输出会比源文件大时总是放弃"
+        )
+        compress_opts_layout.addWidget(self.spin_abort_pct)
+        self.chk_remux = QCheckBox("高效编码只换封装")
+        self.chk_remux.setChecked(True)
+        self.chk_remux.setToolTip("视频已是 HEVC/AV1/VP9、只是容器老旧（avi/wmv/flv/ts 等）时，"
+                                  "直接复制各路流换成 MKV，不重新编码")
+        compress_opts_layout.addWidget(self.chk_remux)
+        compress_opts_layout.addStretch()
+
+        plan_opts_layout = QHBoxLayout()
+        self.chk_prioritize = QCheckBox("按性价比排序")
+        self.chk_prioritize.setToolTip("按预计节省字节 / CPU 秒从高到低排队（耗时按本机历史吞吐估算），"
+                                       "预算不够的不入队")
+        plan_opts_layout.addWidget(self.chk_prioritize)
+        plan_opts_layout.addWidget(QLabel("预算"))
+        self.spin_budget_hours = QSpinBox()
+        self.spin_budget_hours.setRange(0, 168)
+        self.spin_budget_hours.setSpecialValueText("不限时长")
+        self.spin_budget_hours.setSuffix(" 小时")
+        self.spin_budget_hours.setToolTip("运行这么多小时后停止，未完成的任务留在队列里")
+        plan_opts_layout.addWidget(self.spin_budget_hours)
+        self.spin_budget_gb = QSpinBox()
+        self.spin_budget_gb.setRange(0, 1024 * 1024)
+        self.spin_budget_gb.setSpecialValueText("不限节省")
+        self.spin_budget_gb.setSuffix(" GB")
+        self.spin_budget_gb.setToolTip("实际节省达到这么多 GB 后不再启动新任务")
+        plan_opts_layout.addWidget(self.spin_budget_gb)
+        self.chk_governor = QCheckBox("负载调速")
+        self.chk_governor.setToolTip(
+            "其它进程占用 CPU 或 iowait 偏高时降低编码优先级，继续升高（或下面的进程忙碌、不在允许时段）时挂起编码，"
+            f"负载回落 {GOVERNOR_POLICY['resume_secs']} 秒后恢复；每次调整记录在 telemetry/governor.jsonl"
+        )
+        plan_opts_layout.addWidget(self.chk_governor)
+        self.line_windows = QLineEdit()
+        self.line_windows.setPlaceholderText("允许时段，如 01:00-08:00")
+        self.line_windows.setMaximumWidth(180)
+        plan_opts_layout.addWidget(self.line_windows)
+        self.line_watch_procs = QLineEdit()
+        self.line_watch_procs.setPlaceholderText("让路进程，如 EmbyServer")
+        self.line_watch_procs.setToolTip("这些进程（逗号分隔）忙碌时挂起编码")
+        self.line_watch_procs.setMaximumWidth(200)
+        plan_opts_layout.addWidget(self.line_watch_procs)
+        self.spin_cpu_suspend = QSpinBox()
+        self.spin_cpu_suspend.setRange(10, 100)
+        self.spin_cpu_suspend.setPrefix("其它进程 CPU ≥ ")
+        self.spin_cpu_suspend.setSuffix("% 时挂起")
+        self.spin_cpu_suspend.setValue(GOVERNOR_POLICY["cpu_suspend"])
+        plan_opts_layout.addWidget(self.spin_cpu_suspend)
+        plan_opts_layout.addStretch()
+
+        io_opts_layout = QHBoxLayout()
+        io_opts_layout.addWidget(QLabel("临时目录"))
+        self.line_scratch_dir = QLineEdit()
+        self.line_scratch_dir.setPlaceholderText("留空则写在源文件旁边（<输出>.partial）")
+        self.line_scratch_dir.setToolTip("写入中的输出放在这里（本地 SSD/tmpfs），完成后移到源文件旁边；"
+                                         "空间不够时自动退回写在源文件旁边")
+        io_opts_layout.addWidget(self.line_scratch_dir)
+        self.btn_scratch_dir = QPushButton("选择...")
+        self.btn_scratch_dir.clicked.connect(self.choose_scratch_dir)
+        io_opts_layout.addWidget(self.btn_scratch_dir)
+        self.chk_prefetch = QCheckBox("预读下一个源文件")
+        self.chk_prefetch.setToolTip("编码时把队列里下一个源文件的开头读进内存（页缓存），机械盘上下一个任务开始得更快")
+        io_opts_layout.addWidget(self.chk_prefetch)
+        io_opts_layout.addStretch()
+
+        audio_opts_layout = QHBoxLayout()
+        self.chk_audio = QCheckBox("音轨转码")
+        self.chk_audio.setToolTip("无损音轨（TrueHD/DTS-HD MA/PCM/FLAC 等）和码率明显偏高的有损音轨按声道数转码，其余音轨直接复制")
+        audio_opts_layout.addWidget(self.chk_audio)
+        self.combo_audio_codec = QComboBox()
+        for codec, label in AUDIO_ENCODERS.items():
+            self.combo_audio_codec.addItem(label, codec)
+        audio_opts_layout.addWidget(self.combo_audio_codec)
+        self.spin_audio_kbps = QSpinBox()
+        self.spin_audio_kbps.setRange(16, 256)
+        self.spin_audio_kbps.setSuffix(" kbps/声道")
+        self.spin_audio_kbps.setValue(AUDIO_POLICY["kbps_per_channel"])
+        audio_opts_layout.addWidget(self.spin_audio_kbps)
+        self.spin_keep_lossless = QSpinBox()
+        self.spin_keep_lossless.setRange(0, 8)
+        self.spin_keep_lossless.setPrefix("保留 ")
+        self.spin_keep_lossless.setSuffix(" 条无损音轨")
+        self.spin_keep_lossless.setValue(AUDIO_POLICY["keep_lossless"])
+        audio_opts_layout.addWidget(self.spin_keep_lossless)
+        self.chk_audio_only = QCheckBox("只处理音轨")
+        self.chk_audio_only.setToolTip("视频直接复制，只按上面的策略转码音轨，输出为 <文件名>_audio.mkv")
+        audio_opts_layout.addWidget(self.chk_audio_only)
+        audio_opts_layout.addStretch()
+        for chk in (self.chk_audio, self.chk_audio_only):
+            chk.toggled.connect(self.apply_audio_policy)
+        self.combo_audio_codec.currentIndexChanged.connect(self.apply_audio_policy)
+        for spin in (self.spin_audio_kbps, self.spin_keep_lossless):
+            spin.valueChanged.connect(self.apply_audio_policy)
+
         layout.addLayout(btn_layout)
+        layout.addLayout(compress_opts_layout)
+        layout.addLayout(audio_opts_layout)
+        layout.addLayout(plan_opts_layout)
+        layout.addLayout(io_opts_layout)
+        layout.addLayout(filter_layout)
         layout.addWidget(self.table)
         self.thread = None
+        self.relay = MainThreadRelay(self)
         self.compress_thread = None
+        self.predict_thread = None
+        self.crf_thread = None
         self.log_dialog = None
-        self.load_history()
+        self.history_loader = None
+        QTimer.singleShot(0, self.load_history)  # 先把窗口画出来，历史记录在后台分批填充
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
         self.progress_file = QProgressBar()
@@ -667,13 +812,44 @@ class VideoScanner(QWidget):
 
         layout.addWidget(self.progress_file)
         layout.addWidget(self.progress_total)
+        self.label_status = QLabel("")
+        layout.addWidget(self.label_status)
         self.chk_delete_source = QCheckBox("转换成功后删除源文件")
         self.chk_delete_source.setChecked(False)
+        self.chk_delete_source.setToolTip("输出的时长、音轨/字幕数量和章节数与源文件一致才删除")
+        self.chk_verify_decode = QCheckBox("抽样解码校验")
+        self.chk_verify_decode.setToolTip("校验时再从输出里抽 3 段解码，确认没有损坏（每个文件多花几秒）")
 
         btn_layout.addWidget(self.chk_delete_source)
+        btn_layout.addWidget(self.chk_verify_decode)
+        QTimer.singleShot(0, self.resume_queue)
     
+    def closeEvent(self, event):
+        if self.history_loader:
+            self.history_loader.stop()
+            self.history_loader.wait()
+        if self.watch_thread:
+            self.watch_thread.stop()
+            self.watch_thread.wait()
+        for t in (self.predict_thread, self.crf_thread):
+            if t:
+                t.stop()
+                t.wait()
+        super().closeEvent(event)
+
     def on_encoder_changed(self, text: str):
         self.lineEdit_crf.setText(self.encoder_default_crf.get(text, "21"))
+
+    def on_rate_mode_changed(self, text: str):
+        from videocore.predict import QUALITY_DEFAULT_TARGET, resolve_metric
+        metric = self.rate_mode_metric.get(text)
+        if metric and resolve_metric(metric) != metric:
+            self.label_status.setText("本机 ffmpeg 没有编译 libvmaf，改用 SSIM")
+            self.combo_rate_mode.setCurrentText("目标 SSIM")
+            return
+        self.lineEdit_crf.setEnabled(metric is None)
+        self.lineEdit_target.setEnabled(metric is not None)
+        self.lineEdit_target.setText(f"{QUALITY_DEFAULT_TARGET[metric]:g}" if metric else "")
     
     def stop_scan(self):
         if self.thread:
@@ -707,10 +883,32 @@ class VideoScanner(QWidget):
         menu = QMenu(self)
 
         delete_action = menu.addAction("从列表中删除")
+        predict_action = menu.addAction("采样预测节省（当前编码器/CRF）")
         action = menu.exec(self.table.viewport().mapToGlobal(pos))
 
         if action == delete_action:
             self.delete_selected_rows()
+        elif action == predict_action:
+            self.predict_selected()
+
+    def predict_selected(self):
+        paths = self.selected_paths()
+        if not paths:
+            return
+        if self.predict_thread and self.predict_thread.isRunning():
+            QMessageBox.warning(self, "提示", "上一次采样预测还没有结束")
+            return
+        from videocore.predict import PredictThread
+        encoder, crf = self.current_encoder_crf()
+        self.predict_thread = PredictThread(paths, encoder, crf)
+        key = encode_key(encoder, crf)
+        self.relay.connect(self.predict_thread.predicted,
+                           lambda path, pred: self.model.set_prediction(path, key, pred))
+        self.relay.connect(self.predict_thread.log, self.label_status.setText)
+        self.relay.connect(self.predict_thread.all_done,
+                           lambda: self.label_status.setText(f"采样预测完成（{len(paths)} 个文件）"))
+        self.label_status.setText(f"正在采样预测 {len(paths)} 个文件...")
+        self.predict_thread.start()
 
 
     def import_files(self):
@@ -719,133 +917,240 @@ class VideoScanner(QWidget):
         if not files:
             return
         self.btn_scan.setEnabled(False)
-        cache = load_cache()
-        for path in files:
-            info = analyze_video(path, cache)
-            if info:
-                self.add_video(info)
-        save_cache(cache)
+        found = []
+        with load_cache() as cache:
+            for path in files:
+                info = analyze_video(path, cache)
+                if info:
+                    found.append(info)
+        self.add_videos(found)
         self.btn_scan.setEnabled(True)
     
     def update_progress(self, file_percent, total_percent):
         self.progress_file.setValue(file_percent)
         self.progress_total.setValue(total_percent)
 
+    def selected_paths(self):
+        rows = self.table.selectionModel().selectedRows()
+        return [self.model.path_at(self.proxy.mapToSource(idx).row()) for idx in rows]
+
     def delete_selected_rows(self):
-        rows = sorted(set(item.row() for item in self.table.selectedItems()), reverse=True)
-        if not rows:
+        paths = self.selected_paths()
+        if not paths:
             return
 
         reply = QMessageBox.question(
             self,
             "确认删除",
-            f"确定从列表中删除选中的 {len(rows)} 条记录？\n（不会删除视频文件）",
+            f"确定从列表中删除选中的 {len(paths)} 条记录？\n（不会删除视频文件）",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
 
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        cache = load_cache()
-        changed = False
+        # ✅ 从缓存中删除
+        with load_cache() as cache:
+            for path in paths:
+                if path in cache:
+                    del cache[path]
 
-        for row in rows:
-            path_item = self.table.item(row, 10)
-            if not path_item:
-                continue
-
-            path = path_item.text()
-
-            # ✅ 从缓存中删除
-            if path in cache:
-                del cache[path]
-                changed = True
-
-            # ✅ 从表格中删除
-            self.table.removeRow(row)
-
-        if changed:
-            save_cache(cache)
+        # ✅ 从表格中删除
+        self.model.remove_paths(paths)
 
     def load_history(self):
-        for v in load_cache().values():
-            self.add_video(v)
+        """
+        后台分批读出缓存里的全部记录；期间扫描/导入进来的新结果不会被旧记录覆盖
+        """
+        self.label_status.setText("正在加载历史记录...")
+        self.history_loader = HistoryLoader()
+        self.relay.connect(self.history_loader.videos_loaded,
+                           lambda videos: self.model.add_videos(videos, replace=False))
+        self.relay.connect(self.history_loader.loaded, self.history_loaded)
+        self.history_loader.start()
+
+    def history_loaded(self, stats):
+        self.history_loader = None
+        self.set_resume_folder(stats["scan_cursor"])
+        if not stats["stopped"]:
+            self.label_status.setText(f"已加载 {stats['videos']} 条历史记录（{stats['seconds']:.1f} 秒）")
+
+    def set_resume_folder(self, saved_cursor):
+        self._resume_folder = saved_cursor["root"] if saved_cursor else None
+        self.btn_resume_scan.setEnabled(bool(self._resume_folder))
+        if self._resume_folder:
+            self.btn_resume_scan.setToolTip(f"从上次中断处继续扫描: {self._resume_folder}")
     
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择视频目录")
         if not folder:
             return
-        
+        self.start_scan(folder)
+
+    def toggle_watch(self, enabled):
+        if not enabled:
+            if self.watch_thread:
+                self.watch_thread.stop()
+                self.watch_thread.wait()
+                self.watch_thread = None
+            return
+        roots = library_roots()
+        if not roots:
+            QMessageBox.warning(self, "提示", "请先扫描至少一个视频文件夹")
+            self.chk_watch.setChecked(False)
+            return
+        self.watch_thread = WatchThread(roots)
+        self.relay.connect(self.watch_thread.videos_found, self.add_videos)
+        self.relay.connect(self.watch_thread.videos_removed, self.remove_videos)
+        self.relay.connect(self.watch_thread.log, self.label_status.setText)
+        self.watch_thread.start()
+
+    def resume_scan(self):
+        if self._resume_folder:
+            self.start_scan(self._resume_folder, resume=True)
+
+    def start_scan(self, folder, resume=False):
+        folder = add_library_root(folder)
         self.btn_scan.setEnabled(False)
         self.btn_import.setEnabled(False)
+        self.btn_resume_scan.setEnabled(False)
         self.btn_stop_scan.setEnabled(True)
         self.btn_compress.setEnabled(False)
         
-        self.thread = ScanThread(folder)
-        self.thread.video_found.connect(self.add_video)
-        self.thread.scan_finished.connect(self.scan_done)
+        self.thread = ScanThread(
+            folder,
+            workers=self.spin_scan_workers.value(),
+            full_verify=self.chk_full_verify.isChecked(),
+            resume=resume,
+            classify=self.chk_classify.isChecked()
+        )
+        self.relay.connect(self.thread.videos_found, self.add_videos)
+        self.relay.connect(self.thread.videos_removed, self.remove_videos)
+        self.relay.connect(self.thread.scan_finished, self.scan_done)
+        self.label_status.setText("正在扫描...")
         self.thread.start()
     
-    def scan_done(self):
+    def scan_done(self, stats):
         self.btn_scan.setEnabled(True)
         self.btn_import.setEnabled(True)
         self.btn_stop_scan.setEnabled(False)
         self.btn_compress.setEnabled(True)
+        self.set_resume_folder({"root": stats["folder"]} if stats["stopped"] else None)
+        self.label_status.setText(
+            f"{'扫描已停止' if stats['stopped'] else '扫描完成'}: "
+            f"{stats['files']} 个文件 / {stats['seconds']:.1f} 秒，"
+            f"{stats['files_per_sec']:.1f} 文件/秒（并发 {stats['workers']}）"
+            + (f"，清理 {stats['orphans']} 条已不存在的记录" if stats["orphans"] else "")
+        )
     
     def update_output_path(self, src_path, dst_path):
-        for row in range(self.table.rowCount()):
-            path_item = self.table.item(row, 10)  # 源文件路径列
-            if path_item and path_item.text() == src_path:
-                self.table.setItem(row, 11, QTableWidgetItem(dst_path))
-                break
+        self.model.set_output(src_path, dst_path)
+
+    def add_videos(self, videos):
+        self.model.add_videos(videos)
+
+    def remove_videos(self, paths):
+        self.model.remove_paths(paths)
 
     def add_video(self, v):
-        for row in range(self.table.rowCount()):
-            if self.table.item(row, 10).text() == v["path"]:
-                return
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        check_item = QTableWidgetItem()
-        check_item.setFlags(check_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        check_item.setCheckState(Qt.CheckState.Unchecked)
-        self.table.setItem(row, 0, check_item)
-        self.table.setItem(row, 1, QTableWidgetItem(v["name"]))
-        self.table.setItem(row, 2, QTableWidgetItem(f"{v['size_mb']:.2f}"))
-        self.table.setItem(row, 3, QTableWidgetItem(f"{v['duration'] / 60:.1f}"))
-        self.table.setItem(row, 4, QTableWidgetItem(f"{v['mb_per_min']:.2f}"))
-        self.table.setItem(row, 5, QTableWidgetItem(str(v.get("audio_cnt", 0))))
-        self.table.setItem(row, 6, QTableWidgetItem(str(v.get("sub_cnt", 0))))
-
-        # ===== 新增展示 =====
-        codec = v.get("codec", "unknown")
-        score = v.get("compress_score", 0)
-        save_pct = v.get("save_pct", 0)
-
-        # 星级显示（0-5 星）
-        stars = "⭐" * max(1, score // 20) if score > 0 else ""
-
-        self.table.setItem(row, 7, QTableWidgetItem(codec))
-        self.table.setItem(row, 8, QTableWidgetItem(stars))
-        self.table.setItem(row, 9, QTableWidgetItem(f"~{save_pct}%"))
-
-        # 路径
-        self.table.setItem(row, 10, QTableWidgetItem(v["path"]))
-        # 输出文件（初始为空）
-        self.table.setItem(row, 11, QTableWidgetItem(""))
+        self.model.add_videos([v])
 
     def compress_checked(self):
+        # 按当前排序/筛选后的显示顺序
         files = []
-        for row in range(self.table.rowCount()):
-            item = self.table.item(row, 0)
-            if item.checkState() == Qt.CheckState.Checked:
-                files.append(self.table.item(row, 10).text())
+        for row in range(self.proxy.rowCount()):
+            r = self.model.row_at(self.proxy.mapToSource(self.proxy.index(row, 0)).row())
+            if r.checked:
+                files.append(r.path)
         if not files:
             QMessageBox.warning(self, "提示", "未选择任何视频")
             return
+        encoder, crf = self.current_encoder_crf()
+        metric = self.rate_mode_metric.get(self.combo_rate_mode.currentText())
+        if metric:
+            try:
+                target = float(self.lineEdit_target.text().strip())
+            except ValueError:
+                target = None
+            limit = {"vmaf": 100, "ssim": 1}.get(metric)
+            if target is None or target <= 0 or (limit is not None and target > limit):
+                QMessageBox.warning(
+                    self, "提示",
+                    f"目标 {metric.upper()} 需要是大于 0 的数字" + (f"，且不超过 {limit}" if limit else "")
+                )
+                return
+            self.search_crf_then_compress(files, encoder, crf, metric, target)
+            return
+        self.queue_compress(files, encoder, crf)
+
+    def queue_compress(self, files, encoder, crf, crfs=None):
+        from videocore.encode import drop_aborted, drop_duplicates
+        # 此前在同一编码器/crf 下提前放弃过的不再排队
+        files, aborted = drop_aborted(files, encoder, crf, crfs)
+        # 内容相同的文件只压缩一份（批内重复的、和队列里任务重复的）
+        job_queue = JobQueue()
+        files, duplicates = drop_duplicates(files, encoder, job_queue)
+        job_queue.close()
+        skipped = []
+        if aborted:
+            skipped.append(f"{len(aborted)} 个此前提前放弃的视频（{encoder}）")
+        if duplicates:
+            skipped.append(f"{len(duplicates)} 个内容重复的视频")
+        priorities = None
+        if self.chk_prioritize.isChecked() and files:
+            files, priorities, deferred = self.plan_files(files, encoder, crf, crfs)
+            if deferred:
+                skipped.append(f"{deferred} 个超出预算的视频")
+        if skipped:
+            self.label_status.setText(f"跳过 {'、'.join(skipped)}")
+            if not files:
+                return
+        self.start_compress(files, encoder, crf, crfs, priorities)
+
+    def plan_files(self, files, encoder, crf, crfs=None):
+        """
+        按节省字节/CPU 秒排序并按预算截取，返回 (入选文件, 优先级, 超出预算的个数)
+        """
+        from videocore.planner import plan_compress
+        options = self.compress_options()
+        with load_cache() as cache:
+            infos = [cache.get(path) or analyze_video(path, cache) for path in files]
+        selected, deferred, _ = plan_compress(
+            infos, encoder, crf, crfs, audio=options["audio"], remux=options["remux"],
+            audio_only=options["audio_only"], budget_secs=options["budget_secs"],
+            budget_bytes=options["budget_bytes"]
+        )
+        return ([item["path"] for item in selected], {item["path"]: item["priority"] for item in selected},
+                len(deferred))
+
+    def search_crf_then_compress(self, files, encoder, crf, metric, target):
+        """
+        目标质量模式：先并行搜索每个文件的 crf（结果有缓存），再按各自的 crf 排队压缩
+        """
+        from videocore.predict import CrfSearchThread
         self.btn_compress.setEnabled(False)
-        self.btn_scan.setEnabled(False)
-        self.btn_import.setEnabled(False)
-        self.btn_stop_scan.setEnabled(False)
+        self.crf_thread = CrfSearchThread(files, encoder, metric, target)
+        done = []
+
+        def on_searched(path, found):
+            done.append(path)
+            score = f"{found['score']:g}" if found["score"] is not None else "未达标"
+            self.label_status.setText(
+                f"CRF 搜索 {len(done)}/{len(files)}: {os.path.basename(path)} -> crf {found['crf']}"
+                f"（{metric.upper()} {score}）"
+            )
+
+        def on_ready(crfs):
+            self.btn_compress.setEnabled(True)
+            self.queue_compress(files, encoder, crf, crfs)
+
+        self.relay.connect(self.crf_thread.searched, on_searched)
+        self.relay.connect(self.crf_thread.log, self.label_status.setText)
+        self.relay.connect(self.crf_thread.crf_ready, on_ready)
+        self.label_status.setText(f"正在为 {len(files)} 个视频搜索 {metric.upper()} ≥ {target:g} 的 CRF...")
+        self.crf_thread.start()
+
+    def current_encoder_crf(self):
         encoder_map = {
             "libx264 (H.264)": "libx264",
             "libx265 (H.265/HEVC)": "libx265",
@@ -855,21 +1160,95 @@ class VideoScanner(QWidget):
         selected_text = self.combo_encoder.currentText()
         encoder = encoder_map.get(selected_text, "libx264")
         crf = int(self.lineEdit_crf.text().strip() or 0)
+        return encoder, crf
+
+    def compress_options(self):
+        jobs = self.spin_jobs.value()
+        return {
+            "jobs": jobs,
+            "adaptive": self.chk_adaptive_jobs.isChecked(),
+            "max_jobs": max(jobs, (os.cpu_count() or 1) // 4),
+            "pin_cpus": self.chk_pin_cpus.isChecked(),
+            "chunked": self.chk_chunked.isChecked(),
+            "chunk_parallel": self.spin_chunk_parallel.value(),
+            "abort_below_pct": self.spin_abort_pct.value() if self.spin_abort_pct.value() >= 0 else None,
+            "remux": self.chk_remux.isChecked(),
+            "audio": self.audio_policy(),
+            "audio_only": self.chk_audio_only.isChecked(),
+            "verify_decode": self.chk_verify_decode.isChecked(),
+            "budget_secs": self.spin_budget_hours.value() * 3600 or None,
+            "budget_bytes": self.spin_budget_gb.value() * 1024 ** 3 or None,
+            "governor": self.governor_policy(),
+            "scratch_dir": self.line_scratch_dir.text().strip() or None,
+            "prefetch": self.chk_prefetch.isChecked(),
+        }
+
+    def choose_scratch_dir(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择临时目录", self.line_scratch_dir.text())
+        if folder:
+            self.line_scratch_dir.setText(folder)
+
+    def governor_policy(self):
+        if not self.chk_governor.isChecked():
+            return None
+        from videocore.governor import parse_windows
+        windows = self.line_windows.text().strip()
+        try:
+            parse_windows(windows)
+        except ValueError as e:
+            self.label_status.setText(f"{e}，忽略允许时段")
+            windows = ""
+        return {
+            "windows": windows,
+            "processes": tuple(n.strip() for n in self.line_watch_procs.text().replace("，", ",").split(",")
+                               if n.strip()),
+            "cpu_suspend": self.spin_cpu_suspend.value(),
+            "cpu_nice": min(GOVERNOR_POLICY["cpu_nice"], self.spin_cpu_suspend.value()),
+        }
+
+    def audio_policy(self):
+        if not (self.chk_audio.isChecked() or self.chk_audio_only.isChecked()):
+            return None
+        return {
+            "codec": self.combo_audio_codec.currentData(),
+            "kbps_per_channel": self.spin_audio_kbps.value(),
+            "keep_lossless": self.spin_keep_lossless.value(),
+        }
+
+    def apply_audio_policy(self):
+        """
+        音轨选项变化时刷新"预计节省"列
+        """
+        self.model.set_audio_policy(audio_policy(self.audio_policy()), self.chk_audio_only.isChecked())
+
+    def start_compress(self, files, encoder, crf, crfs=None, priorities=None):
+        from videocore.encode import CompressThread
+        self.btn_compress.setEnabled(False)
+        self.btn_scan.setEnabled(False)
+        self.btn_import.setEnabled(False)
+        self.btn_stop_scan.setEnabled(False)
         self.compress_thread = CompressThread(
             files,
             delete_source=self.chk_delete_source.isChecked(),
             encoder=encoder,
-            crf=crf
+            crf=crf,
+            crfs=crfs,
+            priorities=priorities,
+            **self.compress_options()
         )
-        self.compress_thread.finished.connect(self.compress_done)
-        self.compress_thread.progress.connect(self.update_progress)
-        self.compress_thread.output_ready.connect(self.update_output_path)
+        self.relay.connect(self.compress_thread.finished, self.compress_done)
+        self.relay.connect(self.compress_thread.progress, self.update_progress)
+        self.relay.connect(self.compress_thread.output_ready, self.update_output_path)
 
         # === 新增：弹出日志对话框 ===
-        self.log_dialog = ConvertLogDialog(self)
-        self.compress_thread.log.connect(self.log_dialog.append_log)
-        self.compress_thread.progress.connect(self.log_dialog.update_progress)
-        self.compress_thread.finished.connect(self.log_dialog.accept)
+        self.log_dialog = ConvertLogDialog(self, self.compress_thread)
+        self.relay.connect(self.compress_thread.log, self.log_dialog.append_log)
+        self.relay.connect(self.compress_thread.progress, self.log_dialog.update_progress)
+        self.relay.connect(self.compress_thread.job_progress, self.log_dialog.update_job_progress)
+        self.relay.connect(self.compress_thread.job_state, self.log_dialog.update_job_state)
+        self.relay.connect(self.compress_thread.telemetry, self.log_dialog.update_job_telemetry)
+        self.relay.connect(self.compress_thread.batch_telemetry, self.log_dialog.update_batch_telemetry)
+        self.relay.connect(self.compress_thread.finished, self.log_dialog.accept)
         self.log_dialog.show()
 
         self.compress_thread.start()
@@ -877,6 +1256,23 @@ class VideoScanner(QWidget):
         self.btn_stop.setEnabled(True)
         self.btn_resume.setEnabled(False)
 
+    def resume_queue(self):
+        """
+        启动时：清理上次中断留下的半成品，队列里还有任务就自动继续
+        """
+        job_queue = JobQueue()
+        cleaned = job_queue.recover()
+        pending = job_queue.counts().get("pending", 0)
+        job_queue.close()
+        if pending and not self.compress_thread:
+            self.start_compress((), None, 0)
+            for dst in cleaned:
+                self.log_dialog.append_log(f"已清理上次中断的输出: {dst}")
+            self.log_dialog.append_log(f"继续上次未完成的压缩队列（{pending} 个任务）")
+
+    def show_queue(self):
+        QueueDialog(self).exec()
+
     def compress_done(self):
         self.btn_compress.setEnabled(True)
         self.btn_scan.setEnabled(True)
@@ -897,4 +1293,4 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     win = VideoScanner()
     win.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())